@@ -5,4 +5,63 @@ const service = axios.create({
     timeout: 40000,
 })
 
-export default service
\ No newline at end of file
+// 所有面板共用一次 myApp/dashboard/ 请求, 各组件只取自己的那一部分
+let dashboardRequest = null
+export function getDashboard(refresh = false) {
+    if (!dashboardRequest || refresh) {
+        dashboardRequest = service.get('myApp/dashboard/')
+            .then(res => res.data)
+            .catch(err => {
+                dashboardRequest = null
+                throw err
+            })
+    }
+    return dashboardRequest
+}
+
+// 数据变化时用新的面板数据回调各组件; 后端开启推送 (ASGI) 时整个页面只开一个 EventSource,
+// 否则每 pollInterval 秒查询一次 myApp/dashboard/status/ 的数据版本, 版本变化时重新取面板
+const listeners = []
+let watching = false
+
+function notify(request) {
+    dashboardRequest = request
+    request.then(data => listeners.forEach(fn => fn(data)))
+}
+
+function getStatus() {
+    return service.get('myApp/dashboard/status/').then(res => res.data)
+}
+
+function watchDashboard(status) {
+    if (status.stream && window.EventSource) {
+        const eventSource = new EventSource(service.defaults.baseURL + 'myApp/dashboard/stream/')
+        eventSource.addEventListener('delta', event => {
+            const delta = JSON.parse(event.data)
+            notify(getDashboard().then(data => Object.assign({}, data, delta.panels)))
+        })
+        return
+    }
+    let version = status.version
+    setInterval(() => {
+        getStatus().then(latest => {
+            if (latest.version !== version) {
+                version = latest.version
+                notify(getDashboard(true))
+            }
+        }).catch(() => {})
+    }, status.pollInterval * 1000)
+}
+
+export function onDashboard(callback) {
+    listeners.push(callback)
+    getDashboard().then(callback)
+    if (!watching) {
+        watching = true
+        getStatus().then(watchDashboard).catch(() => {
+            watching = false
+        })
+    }
+}
+
+export default service
@@ -13,7 +13,7 @@ import 'vue-awesome/icons/chart-pie.js';
 import 'vue-awesome/icons/chart-line.js';
 import 'vue-awesome/icons/align-left.js';
 
-import $http from '@/api/index.js';
+import $http, { getDashboard, onDashboard } from '@/api/index.js';
 
 //引入echart
 import echarts from 'echarts'
@@ -23,6 +23,8 @@ Vue.config.productionTip = false;
 
 // 修复这里：直接赋值，不要调用函数
 Vue.prototype.$http = $http
+Vue.prototype.$dashboard = getDashboard
+Vue.prototype.$onDashboard = onDashboard
 
 // 全局注册
 Vue.component('icon', Icon);
@@ -1,3 +1,11 @@
 from django.contrib import admin
 
+from myApp.models import CarInfomation
+
+
 # Register your models here.
+@admin.register(CarInfomation)
+class CarInfomationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'rank', 'brand', 'carName', 'sale_volume', 'min_price', 'max_price', 'energyType')
+    search_fields = ('brand', 'carName', 'manufacturer')
+    list_filter = ('energyType',)
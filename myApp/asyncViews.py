@@ -0,0 +1,103 @@
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .utils import getBottomRightData
+from .utils.asyncData import agetDashboardMeta, agetPanel, agetPanels, agetRankPage, aiterRankData
+from .utils.dashboardSnapshot import panelSource, representationEtag
+from .utils.responseCache import cacheResponse
+from .views import intParam, panelResponse, priceHistogramData
+
+# 与 views.py 中同名视图返回相同的数据, 但全程不占用工作线程; 在 ASGI 下使用
+
+
+def asyncDashboardCondition(view):
+    """django 4.2 的 condition() 只支持同步视图, 这里按快照版本做同样的 ETag / Last-Modified 处理"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await view(request, *args, **kwargs)
+        meta = await agetDashboardMeta(request)
+        etag = quote_etag(representationEtag(request, meta['version']))
+        lastModified = int(meta['updateTime'].timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=lastModified)
+        if response is None:
+            response = await view(request, *args, **kwargs)
+        if response is not None and request.method in ('GET', 'HEAD'):
+            if not response.has_header('ETag'):
+                response['ETag'] = etag
+            if not response.has_header('Last-Modified'):
+                response['Last-Modified'] = http_date(lastModified)
+            patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+        return response
+    return wrapper
+
+
+@asyncDashboardCondition
+@cacheResponse()
+async def dashboard(request):
+    return panelResponse(request, (await agetPanels())[1])
+
+
+@asyncDashboardCondition
+@cacheResponse()
+async def center(request):
+    return panelResponse(request, await agetPanel('center'))
+
+
+@asyncDashboardCondition
+@cacheResponse()
+async def centerLeft(request):
+    return panelResponse(request, await agetPanel('centerLeft'))
+
+
+@asyncDashboardCondition
+@cacheResponse()
+async def bottomLeft(request):
+    return panelResponse(request, await agetPanel('bottomLeft'))
+
+
+@asyncDashboardCondition
+@cacheResponse()
+async def centerRight(request):
+    if 'bins' in request.GET or 'mode' in request.GET:
+        try:
+            realData = await sync_to_async(priceHistogramData)(request)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return panelResponse(request, {'realData': realData})
+    return panelResponse(request, await agetPanel('centerRight'))
+
+
+@asyncDashboardCondition
+@cacheResponse()
+async def centerRightChange(request, energyType):
+    panels = await agetPanel('centerRightChange')
+    return panelResponse(request, panels['oil'] if energyType == 1 else panels['electric'])
+
+
+@asyncDashboardCondition
+@cacheResponse()
+async def bottomRight(request):
+    if not any(name in request.GET for name in ('after', 'afterId', 'limit')) and request.GET.get('format') != 'ndjson':
+        return panelResponse(request, {'carData': await sync_to_async(panelSource().getRankData)()})
+    try:
+        after = intParam(request, 'after')
+        afterId = intParam(request, 'afterId')
+        limit = intParam(request, 'limit', getBottomRightData.DEFAULT_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'after / afterId / limit 必须是整数'}, status=400)
+    if request.GET.get('format') == 'ndjson':
+        async def rows():
+            async for car in aiterRankData(after, afterId):
+                yield json.dumps(car, ensure_ascii=False) + '\n'
+        return StreamingHttpResponse(rows(), content_type='application/x-ndjson; charset=utf-8')
+    carData, nextCursor = await agetRankPage(after, afterId, limit)
+    return panelResponse(request, {
+        'carData': carData,
+        'next': nextCursor,
+    })
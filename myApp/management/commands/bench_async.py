@@ -0,0 +1,87 @@
+import asyncio
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+
+
+def summary(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'seconds': round(elapsed, 4),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = '对比 /myApp/sync/ (WSGI 同步视图) 与 /myApp/async/ (ASGI 异步视图) 在不同并发下的吞吐和延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='center/', help='面板路由, 例如 center/ 或 bottomRight/?limit=200')
+        parser.add_argument('--requests', type=int, default=200, help='每个并发档位的请求总数')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 64])
+        parser.add_argument('--bust-cache', action='store_true', help='每个请求带不同的查询参数, 绕过响应缓存')
+        parser.add_argument('--json', dest='jsonOutput', action='store_true', help='以 JSON 输出结果')
+
+    def url(self, prefix, path, index, bustCache):
+        url = '/myApp/%s/%s' % (prefix, path)
+        if bustCache:
+            url += ('&' if '?' in url else '?') + '_=%d' % index
+        return url
+
+    def runWsgi(self, path, total, concurrency, bustCache):
+        def one(index):
+            start = time.perf_counter()
+            Client().get(self.url('sync', path, index, bustCache))
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(one, range(total)))
+        return summary(latencies, time.perf_counter() - start)
+
+    async def runAsgi(self, path, total, concurrency, bustCache):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(index):
+            async with semaphore:
+                start = time.perf_counter()
+                await client.get(self.url('async', path, index, bustCache))
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one(i) for i in range(total)))
+        return summary(latencies, time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        path = options['path'].lstrip('/')
+        total = options['requests']
+        bustCache = options['bust_cache']
+        # 先各请求一次, 让快照和缓存就绪
+        Client().get(self.url('sync', path, -1, bustCache))
+        results = []
+        for concurrency in options['concurrency']:
+            results.append({
+                'concurrency': concurrency,
+                'wsgi': self.runWsgi(path, total, concurrency, bustCache),
+                'asgi': asyncio.run(self.runAsgi(path, total, concurrency, bustCache)),
+            })
+
+        if options['jsonOutput']:
+            self.stdout.write(json.dumps({'path': path, 'results': results}, indent=2))
+            return
+        self.stdout.write('路由: /myApp/{sync,async}/%s  每档请求数: %d' % (path, total))
+        self.stdout.write('%6s | %10s %10s %10s | %10s %10s %10s' % (
+            '并发', 'wsgi rps', 'p50 ms', 'p95 ms', 'asgi rps', 'p50 ms', 'p95 ms'))
+        for row in results:
+            wsgi, asgi = row['wsgi'], row['asgi']
+            self.stdout.write('%6d | %10s %10s %10s | %10s %10s %10s' % (
+                row['concurrency'], wsgi['rps'], wsgi['p50_ms'], wsgi['p95_ms'],
+                asgi['rps'], asgi['p50_ms'], asgi['p95_ms']))
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import time
+import tracemalloc
+import zlib
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from lxml import etree
+
+from myApp.utils.carExtractors import ANCHOR_NAMES, extractDetail, extractFromDom, extractFromState
+
+FIXTURE_DIR = os.path.join(settings.BASE_DIR, 'myApp', 'testdata', 'detailPages')
+# 从详情页缓存中保存下来的真实页面 (--save), 测试会逐页比较内嵌状态数据与参数表的解析结果
+REAL_PAGE_DIR = os.path.join(FIXTURE_DIR, 'real')
+LEGACY_PATHS = ['//div[@data-row-anchor="%s"]/div[2]/div/text()' % anchor for anchor in ANCHOR_NAMES]
+
+
+def legacyExtract(html):
+    """改造前 spider.main 的做法: 整页建 DOM 后逐个参数执行字符串 xpath"""
+    tree = etree.HTML(html)
+    return [tree.xpath(path)[0] for path in LEGACY_PATHS]
+
+
+METHODS = {
+    'legacy': legacyExtract,
+    'dom': extractFromDom,
+    'auto': extractDetail,
+}
+
+
+def fixturePages(directory):
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.html'):
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                yield f.read()
+
+
+def cachedPages(directory):
+    """详情页缓存 (PageCache) 中保存的全部页面"""
+    for root, _, names in os.walk(os.path.join(directory, 'objects')):
+        for name in names:
+            if not name.endswith('.tmp'):
+                with open(os.path.join(root, name), 'rb') as f:
+                    yield zlib.decompress(f.read()).decode('utf-8')
+
+
+def extractable(pages):
+    """去掉三种方法中任何一种解析失败的页面, 并确认其余页面的结果一致"""
+    result = []
+    for html in pages:
+        try:
+            values = [method(html) for method in METHODS.values()]
+        except (ValueError, IndexError):
+            continue
+        if any(value != values[0] for value in values):
+            raise CommandError('解析结果不一致: %r' % values)
+        result.append(html)
+    return result
+
+
+def savePages(pages, directory):
+    """把页面按内容的 sha1 命名保存为 .html, 返回新保存的页面数"""
+    os.makedirs(directory, exist_ok=True)
+    saved = 0
+    for html in pages:
+        path = os.path.join(directory, hashlib.sha1(html.encode('utf-8')).hexdigest()[:16] + '.html')
+        if not os.path.exists(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(html)
+            saved += 1
+    return saved
+
+
+def throughput(method, pages, seconds):
+    """反复解析全部页面至少 seconds 秒, 返回每秒页数"""
+    count = 0
+    start = time.perf_counter()
+    while True:
+        for html in pages:
+            method(html)
+        count += len(pages)
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return count / elapsed
+
+
+def peakAllocation(method, pages):
+    """解析每页时 Python 堆上分配的峰值 KB 的平均值 (tracemalloc; libxml2 内部的内存不计入)"""
+    peak = 0
+    tracemalloc.start()
+    try:
+        for html in pages:
+            tracemalloc.clear_traces()
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            method(html)
+            peak += tracemalloc.get_traced_memory()[1] - start
+    finally:
+        tracemalloc.stop()
+    return peak / len(pages) / 1024
+
+
+class Command(BaseCommand):
+    help = ('测量详情页解析的速度 (页/秒) 和每页在 Python 堆上的分配峰值: 改造前的逐个 xpath (legacy)、'
+            '预编译 XPath 单次遍历 (dom)、优先读内嵌状态数据 (auto)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', default=FIXTURE_DIR, help='存放 .html 详情页的目录, 默认为测试用的样例页面')
+        parser.add_argument('--cache', help='改用详情页缓存目录中的页面, 例如 spiderMan/pageCache')
+        parser.add_argument('--save', nargs='?', const=REAL_PAGE_DIR,
+                            help='不测量, 把带内嵌状态数据的页面保存到目录中作为测试用的真实页面, 默认为 %s' % REAL_PAGE_DIR)
+        parser.add_argument('--seconds', type=float, default=1.0, help='每种方法至少运行的秒数')
+        parser.add_argument('--json', dest='jsonOutput', action='store_true', help='以 JSON 输出结果')
+
+    def handle(self, *args, **options):
+        pages = cachedPages(options['cache']) if options['cache'] else fixturePages(options['pages'])
+        pages = extractable(pages)
+        if not pages:
+            raise CommandError('没有可以解析的页面')
+        if options['save']:
+            pages = [html for html in pages if extractFromState(html) is not None]
+            self.stdout.write('保存了 %d 个页面到 %s' % (savePages(pages, options['save']), options['save']))
+            return
+        result = {'pages': len(pages), 'avgKb': round(sum(map(len, pages)) / len(pages) / 1024, 1), 'methods': {}}
+        for name, method in METHODS.items():
+            result['methods'][name] = {
+                'pagesPerSecond': round(throughput(method, pages, options['seconds']), 1),
+                'peakKbPerPage': round(peakAllocation(method, pages), 1),
+            }
+        if options['jsonOutput']:
+            self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
+            return
+        self.stdout.write('%d 个页面, 平均 %.1f KB' % (result['pages'], result['avgKb']))
+        self.stdout.write('%-8s %12s %14s' % ('方法', '页/秒', '分配峰值 KB/页'))
+        for name, stats in result['methods'].items():
+            self.stdout.write('%-8s %12.1f %14.1f' % (name, stats['pagesPerSecond'], stats['peakKbPerPage']))
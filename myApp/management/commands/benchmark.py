@@ -0,0 +1,300 @@
+import gc
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, redirect_stdout
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+from django.test import Client
+
+from myApp.urls import PANEL_ROUTES
+from myApp.utils.dashboardSnapshot import rebuildDashboard
+from myApp.utils.responseCache import getCache
+from myApp.utils.syntheticCars import clearCars, generateCars, loadCars, writeCsv
+
+try:
+    import resource
+except ImportError:  # Windows 上没有 resource 模块, 不统计内存
+    resource = None
+
+# 除 PANEL_ROUTES 外额外测量的带参数请求
+EXTRA_ROUTES = [
+    ('bottomRight?limit', 'bottomRight/?limit=50'),
+    ('centerRight?bins', 'centerRight/?bins=3,6,9,12,15,20,25,30,40,50&mode=avg'),
+    ('aggregate?sum', 'aggregate/?group_by=manufacturer&metric=sum:saleVolume&top=10'),
+    ('aggregate?filter', 'aggregate/?group_by=carModel&metric=avg:price&filter=energyType:纯电动'),
+]
+
+# 启动耗时测量: 在新进程中运行数据清洗脚本, 输出 JSON (耗时、内存峰值、已加载模块数)
+# 参数为 run_name 和脚本路径, 其余是传给脚本的参数; run_name 不是 __main__ 时只测量导入
+STARTUP_SCRIPT = """
+import json, os, runpy, sys, time
+start = time.perf_counter()
+runName, sys.argv = sys.argv[1], sys.argv[2:]
+with open(os.devnull, 'w') as devnull:
+    stdout, sys.stdout = sys.stdout, devnull
+    runpy.run_path(sys.argv[0], run_name=runName)
+    sys.stdout = stdout
+try:
+    import resource
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+except ImportError:
+    maxRss = None
+print(json.dumps({'seconds': time.perf_counter() - start, 'maxRss': maxRss, 'modules': len(sys.modules)}))
+"""
+# 只做解析、不需要 sklearn / tensorflow 的步骤
+CLEANER_LIGHT_STAGES = 'price,warranty,save'
+
+
+class CountingCursor(CursorWrapper):
+    """统计执行的 SQL 条数和取回的行数"""
+
+    def __init__(self, cursor, db, stats):
+        super().__init__(cursor, db)
+        self.stats = stats
+
+    def execute(self, sql, params=None):
+        self.stats['queries'] += 1
+        return super().execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        self.stats['queries'] += 1
+        return super().executemany(sql, param_list)
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.stats['rows'] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self.cursor.fetchmany() if size is None else self.cursor.fetchmany(size)
+        self.stats['rows'] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.stats['rows'] += len(rows)
+        return rows
+
+
+@contextmanager
+def countQueries():
+    stats = {'queries': 0, 'rows': 0}
+    connection.make_cursor = connection.make_debug_cursor = lambda cursor: CountingCursor(cursor, connection, stats)
+    try:
+        yield stats
+    finally:
+        del connection.make_cursor, connection.make_debug_cursor
+
+
+def peakRssMb(peak=None):
+    """进程至今的内存峰值 (MB); peak 为 ru_maxrss 的原始值"""
+    if peak is None:
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB, macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def measure(func, repeat=1, before=None):
+    """执行 repeat 次 func, 返回耗时中位数 / 最小值和平均每次的 SQL 条数、取回行数"""
+    times = []
+    queries = rows = 0
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        gc.collect()
+        with countQueries() as stats:
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        queries += stats['queries']
+        rows += stats['rows']
+    return {
+        'ms': round(statistics.median(times) * 1000, 3),
+        'minMs': round(min(times) * 1000, 3),
+        'queries': queries // repeat,
+        'rows': rows // repeat,
+        'peakRssMb': peakRssMb(),
+    }
+
+
+def loadModule(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@contextmanager
+def workingDirectory(path):
+    """切换工作目录; 被测脚本的 print 输出转到 stderr, 以免混进 JSON 结果"""
+    old = os.getcwd()
+    os.chdir(path)
+    try:
+        with redirect_stdout(sys.stderr):
+            yield
+    finally:
+        os.chdir(old)
+
+
+def gitCommit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('在 SQLite 上生成不同规模的合成数据, 测量各接口、入库 (spiders.save_to_sql) 和数据清洗'
+            ' (CarDataCleaner.run_complete_cleaning) 的耗时、SQL 条数、取回行数和内存峰值, 以 JSON 输出')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000],
+                            help='测量接口时的数据规模, 例如 --rows 10000 100000 1000000')
+        parser.add_argument('--repeat', type=int, default=5, help='每个接口测量的次数, 取中位数')
+        parser.add_argument('--load-rows', type=int, default=10000, help='测量 save_to_sql 和数据清洗时的行数, 0 为跳过')
+        parser.add_argument('--skip-cleaner', action='store_true', help='不测量数据清洗 (完整流程依赖 tensorflow 等)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='结果写入的 JSON 文件, 默认输出到终端')
+        parser.add_argument('--compare', help='与之前保存的 JSON 结果对比耗时')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('基准测试会清空数据表, 请使用 --settings=车辆大屏可视化.settings_bench 在 SQLite 上运行')
+        call_command('migrate', verbosity=0)
+        result = {
+            'commit': gitCommit(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'sizes': [self.benchSize(rows, options['repeat'], options['seed']) for rows in options['rows']],
+        }
+        if options['load_rows']:
+            with tempfile.TemporaryDirectory() as workDir:
+                writeCsv(os.path.join(workDir, 'temp.csv'), generateCars(options['load_rows'], options['seed']))
+                result['saveToSql'] = self.benchSaveToSql(workDir, options['load_rows'])
+                if not options['skip_cleaner']:
+                    result['cleanerStartup'] = self.benchCleanerStartup(workDir, options['repeat'])
+                    result['cleaner'] = self.benchCleaner(workDir, options['load_rows'])
+
+        output = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                self.compare(json.load(f), result)
+
+    def benchSize(self, rows, repeat, seed):
+        self.stderr.write('生成 %d 行数据...' % rows)
+        clearCars()
+        start = time.perf_counter()
+        loadCars(generateCars(rows, seed))
+        result = {'rows': rows, 'loadSeconds': round(time.perf_counter() - start, 2)}
+        result['rebuildDashboard'] = measure(lambda: rebuildDashboard(force=True))
+
+        client = Client()
+        views = {}
+        for name, url in self.routes():
+            self.stderr.write('  %s' % url)
+            get = lambda: client.get(url)  # noqa: E731
+            response = get()
+            if response.status_code != 200:
+                raise CommandError('%s 返回 %d' % (url, response.status_code))
+            views[name] = {
+                'uncached': measure(get, repeat, before=getCache().clear),
+                'cached': measure(get, repeat),
+                'bytes': len(response.content),
+            }
+        result['views'] = views
+        return result
+
+    def routes(self):
+        for route, name in PANEL_ROUTES:
+            yield name, '/myApp/sync/' + route.replace('<int:energyType>', '1')
+        for name, route in EXTRA_ROUTES:
+            yield name, ('/myApp/sync/' if not route.startswith('aggregate') else '/myApp/') + route
+
+    def benchSaveToSql(self, workDir, rows):
+        self.stderr.write('测量 save_to_sql (%d 行)...' % rows)
+        clearCars()
+        spiders = loadModule('spiders', os.path.join(settings.BASE_DIR, 'spiderMan', 'spiders.py'))
+        with workingDirectory(workDir):
+            stats = measure(spiders.spider().save_to_sql)
+        stats['rowsPerSecond'] = round(rows / (stats['ms'] / 1000), 1)
+        return stats
+
+    def benchCleaner(self, workDir, rows):
+        self.stderr.write('测量数据清洗 (%d 行)...' % rows)
+        os.environ.setdefault('MPLBACKEND', 'Agg')
+        cleaner = loadModule('date_clearn', os.path.join(settings.BASE_DIR, 'spiderMan', 'date_clearn.py'))
+        with workingDirectory(workDir):
+            try:
+                stats = measure(cleaner.CarDataCleaner('temp.csv').run_complete_cleaning)
+            except ImportError as e:
+                # 完整流程需要 sklearn / tensorflow / matplotlib
+                return {'skipped': str(e)}
+        stats['rowsPerSecond'] = round(rows / (stats['ms'] / 1000), 1)
+        return stats
+
+    def benchCleanerStartup(self, workDir, repeat):
+        """数据清洗脚本的启动开销: 只导入, 以及只运行解析步骤的命令行 (含解释器启动), 各取中位数"""
+        self.stderr.write('测量数据清洗脚本启动耗时...')
+        path = os.path.join(settings.BASE_DIR, 'spiderMan', 'date_clearn.py')
+        runs = {
+            'interpreter': [sys.executable, '-c', 'pass'],
+            'import': [sys.executable, '-c', STARTUP_SCRIPT, 'date_clearn', path],
+            'lightStages': [sys.executable, '-c', STARTUP_SCRIPT, '__main__', path, 'temp.csv',
+                            '--stages', CLEANER_LIGHT_STAGES],
+        }
+        result = {}
+        for name, command in runs.items():
+            times, reports = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                output = subprocess.run(command, cwd=workDir, check=True, stdout=subprocess.PIPE).stdout
+                times.append(time.perf_counter() - start)
+                if output.strip():
+                    reports.append(json.loads(output.decode().strip().splitlines()[-1]))
+            stats = {'wallMs': round(statistics.median(times) * 1000, 3)}
+            if reports:
+                stats['scriptMs'] = round(statistics.median(report['seconds'] for report in reports) * 1000, 3)
+                stats['peakRssMb'] = peakRssMb(reports[-1]['maxRss']) if reports[-1]['maxRss'] is not None else None
+                stats['modules'] = reports[-1]['modules']
+            result[name] = stats
+        return result
+
+    def compare(self, old, new):
+        oldSizes = {size['rows']: size for size in old.get('sizes', [])}
+        self.stderr.write('与 %s 对比 (未缓存耗时 ms):' % (old.get('commit') or '旧结果'))
+        for size in new['sizes']:
+            before = oldSizes.get(size['rows'])
+            if before is None:
+                continue
+            for name, stats in size['views'].items():
+                if name not in before['views']:
+                    continue
+                oldMs, newMs = before['views'][name]['uncached']['ms'], stats['uncached']['ms']
+                self.stderr.write('%9d %-22s %10.3f -> %10.3f  (%+.1f%%)' % (
+                    size['rows'], name, oldMs, newMs, (newMs - oldMs) / oldMs * 100 if oldMs else 0))
+        for name, stats in new.get('cleanerStartup', {}).items():
+            before = old.get('cleanerStartup', {}).get(name)
+            if before is None:
+                continue
+            oldMs, newMs = before['wallMs'], stats['wallMs']
+            self.stderr.write('%9s %-22s %10.3f -> %10.3f  (%+.1f%%)' % (
+                'startup', name, oldMs, newMs, (newMs - oldMs) / oldMs * 100 if oldMs else 0))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from myApp.utils.analytics import exportParquet
+
+
+class Command(BaseCommand):
+    help = '把车辆数据全量导出为 Parquet, 供 DASHBOARD_ANALYTICS_BACKEND = "duckdb" 时查询'
+
+    def handle(self, *args, **options):
+        manifest = exportParquet()
+        self.stdout.write(self.style.SUCCESS('已导出 %s, 共 %d 个分片, 版本 %d'
+                                             % (manifest['directory'], len(manifest['parts']), manifest['version'])))
@@ -0,0 +1,37 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myApp.utils.carLoader import upsertCars
+from myApp.utils.dashboardSnapshot import rebuildDashboard
+
+
+def csvRows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            # 与 spider.clear_csv 一样跳过有空值的行
+            if len(row) == 11 and all(row):
+                yield row
+
+
+class Command(BaseCommand):
+    help = '把爬虫输出的 CSV (temp.csv 的格式) 按 (车名, 排行月份) 批量写入, 输出每秒写入的行数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV 文件, 例如 spiderMan/temp.csv')
+        parser.add_argument('--month', help='排行榜月份 YYYY-MM, 默认为当月')
+        parser.add_argument('--batch-size', type=int, help='每批写入的行数, 默认为 CAR_LOADER_BATCH_SIZE')
+        parser.add_argument('--infile', action='store_true', default=None,
+                            help='使用 LOAD DATA LOCAL INFILE (MySQL, 连接需开启 local_infile); 默认按连接配置自动选择')
+        parser.add_argument('--no-infile', dest='infile', action='store_false', help='不使用 LOAD DATA LOCAL INFILE')
+
+    def handle(self, *args, **options):
+        try:
+            result = upsertCars(csvRows(options['path']), rankMonth=options['month'],
+                                batchSize=options['batch_size'], infile=options['infile'])
+        except FileNotFoundError as e:
+            raise CommandError(e)
+        rebuildDashboard()
+        self.stdout.write(self.style.SUCCESS(str(result)))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myApp.utils.profiling import SORT_COLUMNS, UTILS_PATTERN, listProfiles, loadStats, functionRows
+
+
+class Command(BaseCommand):
+    help = ('列出 ProfilingMiddleware 保存的请求剖析结果; 给出 id (或 --all) 时合并这些结果,'
+            ' 汇总 myApp/utils 中各函数的调用次数和耗时')
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', help='要汇总的 profile id, 见 X-Profile-Id 响应头')
+        parser.add_argument('--all', action='store_true', help='汇总全部已保存的结果')
+        parser.add_argument('--view', help='与 --all 一起使用, 只汇总该视图的结果')
+        parser.add_argument('--sort', choices=sorted(SORT_COLUMNS), default='cumulative')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--every-function', action='store_true', help='不只看 myApp/utils, 列出所有函数')
+
+    def handle(self, *args, **options):
+        profiles = listProfiles()
+        ids = options['ids']
+        if options['all']:
+            ids = [meta['id'] for meta in profiles if not options['view'] or meta['view'] == options['view']]
+        if not ids:
+            self.listProfiles(profiles)
+            return
+        try:
+            stats = loadStats(ids)
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+        pattern = None if options['every_function'] else UTILS_PATTERN
+        self.stdout.write('合并 %d 个结果, 按 %s 排序:' % (len(ids), options['sort']))
+        self.stdout.write('%10s %12s %12s  %s' % ('calls', 'tottime(s)', 'cumtime(s)', 'function'))
+        for calls, tottime, cumtime, name in functionRows(stats, pattern, options['sort'], options['limit']):
+            self.stdout.write('%10d %12.4f %12.4f  %s' % (calls, tottime, cumtime, name))
+
+    def listProfiles(self, profiles):
+        if not profiles:
+            self.stdout.write('还没有剖析结果; 打开 DASHBOARD_PROFILING 后给请求加上 X-Profile 头或 ?_profile=1')
+            return
+        self.stdout.write('%-26s %-20s %-20s %6s %10s  %s' % ('id', 'time', 'view', 'status', 'ms', 'path'))
+        for meta in profiles:
+            self.stdout.write('%-26s %-20s %-20s %6s %10s  %s' % (
+                meta['id'], meta['time'], meta['view'], meta['status'], meta['ms'], meta['path']))
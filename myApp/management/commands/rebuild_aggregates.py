@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myApp.utils.carAggregates import checkAggregates, rebuildAggregates
+from myApp.utils.dataVersion import batchUpdate
+
+
+class Command(BaseCommand):
+    help = '全量重建分组统计 (CarAggregate); 加 --check 只检查增量维护的结果是否与全量计算一致'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='只检查, 不重建; 不一致时以非零状态退出')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            mismatches = checkAggregates()
+            for group, stored, expected in mismatches:
+                self.stdout.write('%s: 当前 %s, 应为 %s' % (group, stored, expected))
+            if mismatches:
+                raise CommandError('%d 个分组统计不一致, 可运行 rebuild_aggregates 重建' % len(mismatches))
+            self.stdout.write(self.style.SUCCESS('分组统计一致'))
+            return
+        # 重建后递增数据版本, 按旧版本缓存的响应和快照随之失效
+        with batchUpdate():
+            count = rebuildAggregates()
+        self.stdout.write(self.style.SUCCESS('分组统计已重建, 共 %d 组' % count))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from myApp.utils.dashboardSnapshot import rebuildDashboard
+
+
+class Command(BaseCommand):
+    help = '重新计算大屏面板快照 (DashboardSnapshot)'
+
+    def handle(self, *args, **options):
+        snapshot = rebuildDashboard(force=True)
+        self.stdout.write(self.style.SUCCESS('面板快照已重建, 版本 %d' % snapshot.version))
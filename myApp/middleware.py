@@ -0,0 +1,143 @@
+import cProfile
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .utils.metrics import RequestStats, currentStats, registry, trackQueries
+from .utils.profiling import newProfileId, saveProfile
+
+
+def viewName(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match._func_path
+
+
+class MetricsMiddleware(object):
+    """记录每个视图的耗时、SQL 条数和耗时、响应大小以及响应缓存命中情况
+
+    结果汇总到 /metrics (Prometheus 文本格式), 并通过 Server-Timing 头返回给浏览器开发者工具
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.isAsync = iscoroutinefunction(get_response)
+        if self.isAsync:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.isAsync:
+            return self.__acall__(request)
+        trackQueries(connection)
+        stats = RequestStats()
+        token = currentStats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            currentStats.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = currentStats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            currentStats.reset(token)
+        return self.finish(request, response, stats)
+
+    def finish(self, request, response, stats):
+        seconds = time.perf_counter() - stats.start
+        size = None if response.streaming else len(response.content)
+        cacheResult = response.get('X-Cache')
+        registry.record(viewName(request), response.status_code, seconds, stats, size, cacheResult)
+        timing = [
+            'sql;desc="%d queries";dur=%.2f' % (stats.sqlCount, stats.sqlSeconds * 1000),
+            'total;dur=%.2f' % (seconds * 1000),
+        ]
+        if cacheResult:
+            timing.append('cache;desc="%s"' % cacheResult)
+        response['Server-Timing'] = ', '.join(timing)
+        return response
+
+
+class ProfilingMiddleware(object):
+    """按需用 cProfile 剖析单个请求
+
+    需要 DASHBOARD_PROFILING 为真, 且请求带 X-Profile 头或 ?_profile= 参数;
+    设置了 DASHBOARD_PROFILE_TOKEN 时两者的值必须与之相同。结果写到 DASHBOARD_PROFILE_DIR,
+    id 通过 X-Profile-Id 响应头返回, 用 python manage.py profiles 查看。
+    异步视图在事件循环线程上剖析, 同一时间其他请求的协程也会计入。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'DASHBOARD_PROFILING', False):
+            # 关闭时整个中间件从调用链中移除, 没有额外开销
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.isAsync = iscoroutinefunction(get_response)
+        if self.isAsync:
+            markcoroutinefunction(self)
+
+    def wanted(self, request):
+        value = request.headers.get('X-Profile') or request.GET.get('_profile')
+        if not value:
+            return False
+        token = getattr(settings, 'DASHBOARD_PROFILE_TOKEN', None)
+        return not token or value == token
+
+    def startProfiler(self, request):
+        if not self.wanted(request):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12 起同一时间只能有一个 cProfile 在运行, 此时不剖析这个请求
+            return None
+        return profiler
+
+    def __call__(self, request):
+        if self.isAsync:
+            return self.__acall__(request)
+        profiler = self.startProfiler(request)
+        if profiler is None:
+            return self.get_response(request)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        return self.finish(request, response, profiler, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        profiler = self.startProfiler(request)
+        if profiler is None:
+            return await self.get_response(request)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+        return self.finish(request, response, profiler, time.perf_counter() - start)
+
+    def finish(self, request, response, profiler, seconds):
+        profileId = newProfileId()
+        saveProfile(profileId, profiler, {
+            'path': request.get_full_path(),
+            'method': request.method,
+            'view': viewName(request),
+            'status': response.status_code,
+            'ms': round(seconds * 1000, 2),
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        response['X-Profile-Id'] = profileId
+        return response
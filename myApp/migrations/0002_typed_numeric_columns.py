@@ -0,0 +1,91 @@
+# Generated by Django 4.2.25 on 2025-10-20 09:31
+
+import re
+from decimal import Decimal
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def parse_price(price):
+    prices = re.findall(r"\d+(?:\.\d+)?", str(price))
+    if not prices:
+        return None, None
+    return Decimal(prices[0]), Decimal(prices[-1])
+
+
+def parse_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def backfill_numeric_columns(apps, schema_editor):
+    """从 saleVolume / price / rank 文本批量回填数值列, 并把 rank 规整成纯数字以便改为整数列"""
+    CarInfomation = apps.get_model("myApp", "CarInfomation")
+    db_alias = schema_editor.connection.alias
+    cars = (
+        CarInfomation.objects.using(db_alias)
+        .only("id", "saleVolume", "price", "rank")
+        .order_by("id")
+    )
+    batch = []
+    for car in cars.iterator(chunk_size=BATCH_SIZE):
+        car.sale_volume = parse_int(car.saleVolume)
+        car.min_price, car.max_price = parse_price(car.price)
+        car.rank = str(parse_int(car.rank))
+        batch.append(car)
+        if len(batch) >= BATCH_SIZE:
+            CarInfomation.objects.using(db_alias).bulk_update(
+                batch, ["sale_volume", "min_price", "max_price", "rank"]
+            )
+            batch = []
+    if batch:
+        CarInfomation.objects.using(db_alias).bulk_update(
+            batch, ["sale_volume", "min_price", "max_price", "rank"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myApp", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="carinfomation",
+            name="sale_volume",
+            field=models.IntegerField(default=0, verbose_name="销量(数值)"),
+        ),
+        migrations.AddField(
+            model_name="carinfomation",
+            name="min_price",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                max_digits=10,
+                null=True,
+                verbose_name="最低价(万元)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="carinfomation",
+            name="max_price",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                max_digits=10,
+                null=True,
+                verbose_name="最高价(万元)",
+            ),
+        ),
+        migrations.RunPython(backfill_numeric_columns, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="carinfomation",
+            name="rank",
+            field=models.IntegerField(default=0, verbose_name="排名"),
+        ),
+    ]
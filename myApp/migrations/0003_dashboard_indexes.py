@@ -0,0 +1,29 @@
+# Generated by Django 4.2.25 on 2025-10-20 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myApp", "0002_typed_numeric_columns"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="carinfomation",
+            index=models.Index(fields=["brand"], name="car_brand_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="carinfomation",
+            index=models.Index(fields=["carModel"], name="car_model_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="carinfomation",
+            index=models.Index(fields=["energyType"], name="car_energy_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="carinfomation",
+            index=models.Index(fields=["energyType", "sale_volume"], name="car_energy_volume_idx"),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.25 on 2025-10-21 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myApp", "0003_dashboard_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DashboardSnapshot",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False, verbose_name="id")),
+                ("version", models.IntegerField(default=0, verbose_name="版本")),
+                ("payload", models.JSONField(default=dict, verbose_name="面板数据")),
+                ("updateTime", models.DateTimeField(auto_now=True, verbose_name="更新时间")),
+            ],
+            options={
+                "db_table": "DashboardSnapshot",
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.25 on 2025-10-22 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myApp", "0004_dashboard_snapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataVersion",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False, verbose_name="id")),
+                ("version", models.BigIntegerField(default=0, verbose_name="版本")),
+                ("updateTime", models.DateTimeField(auto_now=True, verbose_name="更新时间")),
+            ],
+            options={
+                "db_table": "DataVersion",
+            },
+        ),
+    ]
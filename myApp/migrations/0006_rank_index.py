@@ -0,0 +1,17 @@
+# Generated by Django 4.2.25 on 2025-10-23 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myApp", "0005_data_version"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="carinfomation",
+            index=models.Index(fields=["rank", "id"], name="car_rank_idx"),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.25 on 2025-10-24 15:18
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_aggregates(apps, schema_editor):
+    """用现有数据生成初始的分组统计, 之后由信号增量维护"""
+    CarInfomation = apps.get_model("myApp", "CarInfomation")
+    CarAggregate = apps.get_model("myApp", "CarAggregate")
+    db_alias = schema_editor.connection.alias
+    cars = CarInfomation.objects.using(db_alias)
+    stats = dict(
+        count=Count("id"),
+        volumeSum=Coalesce(Sum("sale_volume"), 0),
+        minSum=Sum("min_price"),
+        maxSum=Sum("max_price"),
+        firstId=Coalesce(Min("id"), 0),
+    )
+
+    def make(dimension, key, row):
+        return CarAggregate(
+            dimension=dimension,
+            key=key,
+            count=row["count"],
+            volumeSum=row["volumeSum"],
+            priceSum=(Decimal(row["minSum"] or 0) + Decimal(row["maxSum"] or 0)).quantize(
+                Decimal("0.01")
+            ),
+            firstId=row["firstId"],
+        )
+
+    aggregates = [make("total", "", cars.aggregate(**stats))]
+    for dimension in ("brand", "carModel", "energyType"):
+        for row in cars.values(dimension).annotate(**stats).order_by():
+            aggregates.append(make(dimension, row[dimension], row))
+    CarAggregate.objects.using(db_alias).bulk_create(aggregates, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myApp", "0006_rank_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CarAggregate",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False, verbose_name="id")),
+                ("dimension", models.CharField(max_length=32, verbose_name="维度")),
+                ("key", models.CharField(default="", max_length=255, verbose_name="取值")),
+                ("count", models.BigIntegerField(default=0, verbose_name="数量")),
+                ("volumeSum", models.BigIntegerField(default=0, verbose_name="销量合计")),
+                ("priceSum", models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name="最低价与最高价合计")),
+                ("firstId", models.IntegerField(default=0, verbose_name="最早出现的id")),
+            ],
+            options={
+                "db_table": "CarAggregate",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="caraggregate",
+            constraint=models.UniqueConstraint(fields=("dimension", "key"), name="car_aggregate_unique"),
+        ),
+        migrations.RunPython(populate_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.25 on 2025-10-30 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myApp", "0007_car_aggregates"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="carinfomation",
+            name="rankMonth",
+            field=models.CharField(
+                blank=True, max_length=7, null=True, verbose_name="排行月份"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="carinfomation",
+            constraint=models.UniqueConstraint(
+                fields=("carName", "rankMonth"), name="car_series_month_unique"
+            ),
+        ),
+    ]
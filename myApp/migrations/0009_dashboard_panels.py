@@ -0,0 +1,46 @@
+# Generated by Django 4.2.25 on 2025-11-03 09:41
+
+from django.db import migrations, models
+
+
+def reset_snapshot(apps, schema_editor):
+    """旧快照的面板数据随 payload 列删除, 清掉版本记录, 下次请求时按面板重建"""
+    DashboardSnapshot = apps.get_model("myApp", "DashboardSnapshot")
+    DashboardSnapshot.objects.using(schema_editor.connection.alias).all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myApp", "0008_car_rank_month"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DashboardPanel",
+            fields=[
+                (
+                    "name",
+                    models.CharField(
+                        max_length=32,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="面板",
+                    ),
+                ),
+                ("version", models.IntegerField(default=0, verbose_name="版本")),
+                (
+                    "payload",
+                    models.JSONField(default=dict, verbose_name="面板数据"),
+                ),
+            ],
+            options={
+                "db_table": "DashboardPanel",
+            },
+        ),
+        migrations.RemoveField(
+            model_name="dashboardsnapshot",
+            name="payload",
+        ),
+        migrations.RunPython(reset_snapshot, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,42 @@
 from django.db import models
 
+from myApp.utils.parseData import parseInt, parsePrice
+
+
+def typedColumns(values):
+    """由 saleVolume / price 文本解析出的数值列; 只处理给出了非空文本的字段, 表达式 (F() 等) 无法解析, 跳过"""
+    typed = {}
+    saleVolume = values.get('saleVolume')
+    if saleVolume not in (None, '') and not hasattr(saleVolume, 'resolve_expression'):
+        typed['sale_volume'] = parseInt(saleVolume)
+    price = values.get('price')
+    if price not in (None, '') and not hasattr(price, 'resolve_expression'):
+        typed['min_price'], typed['max_price'] = parsePrice(price)
+    return typed
+
+
+class CarQuerySet(models.QuerySet):
+    """批量修改、删除的受支持方式: 分组统计随之更新, 数据版本在结束时只递增一次
+
+    update() 不触发 save 信号, 这里按更新前后的值增量维护 CarAggregate; delete() 逐行触发 post_delete,
+    在 batchUpdate 内合并成一次写入。bulk_create / bulk_update 和直接执行的 SQL 不经过这里,
+    之后需要运行 python manage.py rebuild_aggregates 并递增数据版本 (见 README)。
+    """
+
+    def update(self, **kwargs):
+        from myApp.utils.carAggregates import trackedUpdate
+
+        for field, value in typedColumns(kwargs).items():
+            kwargs.setdefault(field, value)
+        with trackedUpdate(self):
+            return super().update(**kwargs)
+
+    def delete(self):
+        from myApp.utils.dataVersion import batchUpdate
+
+        with batchUpdate():
+            return super().delete()
+
 
 # Create your models here.
 class CarInfomation(models.Model):
@@ -10,15 +47,93 @@ class CarInfomation(models.Model):
     saleVolume = models.CharField('销量', max_length=255, default='')
     price = models.CharField('价格', max_length=255, default='')
     manufacturer = models.CharField('厂商', max_length=255, default='')
-    rank = models.CharField('排名', max_length=255, default='')
+    rank = models.IntegerField('排名', default=0)
     carModel = models.CharField('车型', max_length=255, default='')
     energyType = models.CharField('能源类型', max_length=255, default='')
     marketTime = models.CharField('上市时间', max_length=255, default='')
     insure = models.CharField('保修期时间', max_length=255, default='')
     creteTime = models.DateTimeField('创建时间', auto_now_add=True)
+    # 由 saleVolume / price 解析出的数值列, 供数据库端聚合使用
+    sale_volume = models.IntegerField('销量(数值)', default=0)
+    min_price = models.DecimalField('最低价(万元)', max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField('最高价(万元)', max_digits=10, decimal_places=2, null=True, blank=True)
+    # 排行榜月份 (YYYY-MM), 与车名一起作为入库时的自然键; 之前逐行写入的旧数据为空, 不参与唯一约束
+    rankMonth = models.CharField('排行月份', max_length=7, null=True, blank=True)
+
+    objects = CarQuerySet.as_manager()
 
     class Meta:
         db_table = 'CarInfomation'
+        constraints = [
+            models.UniqueConstraint(fields=['carName', 'rankMonth'], name='car_series_month_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['brand'], name='car_brand_idx'),
+            models.Index(fields=['carModel'], name='car_model_idx'),
+            models.Index(fields=['energyType'], name='car_energy_idx'),
+            models.Index(fields=['energyType', 'sale_volume'], name='car_energy_volume_idx'),
+            models.Index(fields=['rank', 'id'], name='car_rank_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # 数值列总是与文本一致, 调用方只给出 saleVolume / price 时也能正确统计
+        typed = typedColumns({'saleVolume': self.saleVolume, 'price': self.price})
+        for field, value in typed.items():
+            setattr(self, field, value)
+        updateFields = kwargs.get('update_fields')
+        if updateFields is not None:
+            sources = {'sale_volume': 'saleVolume', 'min_price': 'price', 'max_price': 'price'}
+            kwargs['update_fields'] = set(updateFields) | {
+                field for field in typed if sources[field] in updateFields}
+        super().save(*args, **kwargs)
+
+
+class CarAggregate(models.Model):
+    # 按品牌/车型/能源类型分组的计数和销量、价格合计, 随 CarInfomation 的增删改增量维护
+    # dimension 为 'total' 的一行是全表合计
+    id = models.AutoField('id', primary_key=True)
+    dimension = models.CharField('维度', max_length=32)
+    key = models.CharField('取值', max_length=255, default='')
+    count = models.BigIntegerField('数量', default=0)
+    volumeSum = models.BigIntegerField('销量合计', default=0)
+    priceSum = models.DecimalField('最低价与最高价合计', max_digits=20, decimal_places=2, default=0)
+    firstId = models.IntegerField('最早出现的id', default=0)
+
+    class Meta:
+        db_table = 'CarAggregate'
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key'], name='car_aggregate_unique'),
+        ]
+
+
+class DataVersion(models.Model):
+    # 全局数据版本号, CarInfomation 有任何写入都会递增, 缓存和快照都以它为准
+    id = models.AutoField('id', primary_key=True)
+    version = models.BigIntegerField('版本', default=0)
+    updateTime = models.DateTimeField('更新时间', auto_now=True)
+
+    class Meta:
+        db_table = 'DataVersion'
+
+
+class DashboardSnapshot(models.Model):
+    # 大屏面板快照的版本记录, 重建时锁住这一行; 各面板的数据在 DashboardPanel 中
+    id = models.AutoField('id', primary_key=True)
+    version = models.IntegerField('版本', default=0)
+    updateTime = models.DateTimeField('更新时间', auto_now=True)
+
+    class Meta:
+        db_table = 'DashboardSnapshot'
+
+
+class DashboardPanel(models.Model):
+    # 每个面板的预计算结果单独一行, 面板接口只按主键读取自己的那一行
+    name = models.CharField('面板', max_length=32, primary_key=True)
+    version = models.IntegerField('版本', default=0)
+    payload = models.JSONField('面板数据', default=dict)
+
+    class Meta:
+        db_table = 'DashboardPanel'
 
 
 class User(models.Model):
@@ -0,0 +1,93 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils import timezone
+
+from myApp.models import DataVersion
+from myApp.utils.dataVersion import VERSION_ID
+
+# 大屏读取的模型, 可以走从库; User 等其他模型始终读主库。
+# 面板按数据版本校验, 版本和面板要从同一个库读取, 否则从库稍有落后时每个请求都会进入重建
+READ_MODELS = {'carinfomation', 'caraggregate', 'dashboardsnapshot', 'dashboardpanel', 'dataversion'}
+
+
+def replicaLag(alias, primary=DEFAULT_DB_ALIAS):
+    """从库落后主库的秒数, 以数据版本判断: 从库已有主库的最新版本时为 0"""
+    primaryRow = DataVersion.objects.using(primary).filter(pk=VERSION_ID).values('version', 'updateTime').first()
+    if primaryRow is None:
+        return 0.0
+    replicaVersion = DataVersion.objects.using(alias).filter(pk=VERSION_ID).values_list('version', flat=True).first()
+    if replicaVersion is not None and replicaVersion >= primaryRow['version']:
+        return 0.0
+    # 从库还没有主库最近一次更新, 至少落后了这么久
+    return max((timezone.now() - primaryRow['updateTime']).total_seconds(), 0.0)
+
+
+class ReplicaStatus(object):
+    """缓存从库是否可用的检查结果, 每隔 DASHBOARD_REPLICA_CHECK_INTERVAL 秒重新检查一次"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = {}
+
+    def usable(self, alias):
+        interval = getattr(settings, 'DASHBOARD_REPLICA_CHECK_INTERVAL', 1)
+        now = time.monotonic()
+        checked = self.results.get(alias)
+        if checked is not None and now - checked[0] < interval:
+            return checked[1]
+        with self.lock:
+            checked = self.results.get(alias)
+            if checked is None or now - checked[0] >= interval:
+                checked = self.results[alias] = (now, self.check(alias))
+        return checked[1]
+
+    def check(self, alias):
+        try:
+            lag = replicaLag(alias)
+        except DatabaseError:
+            # 从库连不上时读主库
+            return False
+        return lag <= getattr(settings, 'DASHBOARD_REPLICA_MAX_LAG', 5)
+
+    def reset(self):
+        with self.lock:
+            self.results.clear()
+
+
+replicaStatus = ReplicaStatus()
+
+
+class DashboardRouter(object):
+    """大屏的读请求走 DASHBOARD_READ_DATABASE 指定的从库, 所有写入走主库
+
+    从库连不上或落后超过 DASHBOARD_REPLICA_MAX_LAG 秒时退回主库;
+    主库上已经开启事务 (入库、重建快照等) 时, 事务内的读也走主库, 保证读到自己的写入。
+    """
+
+    def isDashboardModel(self, model):
+        return model._meta.app_label == 'myApp' and model._meta.model_name in READ_MODELS
+
+    def db_for_read(self, model, **hints):
+        if not self.isDashboardModel(model):
+            return None
+        alias = getattr(settings, 'DASHBOARD_READ_DATABASE', None)
+        if not alias or alias == DEFAULT_DB_ALIAS or alias not in settings.DATABASES:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias if replicaStatus.usable(alias) else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == 'myApp':
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 主从是同一份数据
+        aliases = {DEFAULT_DB_ALIAS, getattr(settings, 'DASHBOARD_READ_DATABASE', None)}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
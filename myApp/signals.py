@@ -0,0 +1,74 @@
+import threading
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from myApp.models import CarInfomation
+from myApp.utils.carAggregates import AGGREGATE_FIELDS, AggregateDelta
+from myApp.utils.dataVersion import batchDepth, bumpDataVersion, inBatchUpdate, registerBatchHook
+
+# batchUpdate 期间累积的分组统计增量, 每层一个; 内层正常结束时并入外层, 最外层结束时一次写入, 出错的一层直接丢弃
+_pending = threading.local()
+
+
+def pendingDeltas():
+    deltas = getattr(_pending, 'deltas', None)
+    if deltas is None:
+        deltas = _pending.deltas = []
+    return deltas
+
+
+def pendingDelta():
+    deltas = pendingDeltas()
+    while len(deltas) < batchDepth():
+        deltas.append(AggregateDelta())
+    return deltas[batchDepth() - 1]
+
+
+def finishPendingDelta(depth, ok):
+    deltas = pendingDeltas()
+    if len(deltas) <= depth:
+        return
+    delta = deltas.pop()
+    if not ok:
+        return
+    if depth == 0:
+        delta.apply()
+    else:
+        pendingDelta().merge(delta)
+
+
+registerBatchHook(finishPendingDelta)
+
+
+def carWritten(delta):
+    # 后台修改、删除单条数据时立即更新统计并递增数据版本; 批量入库由 batchUpdate 统一处理
+    if not inBatchUpdate():
+        delta.apply()
+        bumpDataVersion()
+
+
+@receiver(pre_save, sender=CarInfomation)
+def carSaving(sender, instance, raw=False, using=None, **kwargs):
+    # 修改已有数据时记下旧值, 保存后先减旧值再加新值; 旧值从写入的库读, 不走从库
+    instance._aggregateOld = None
+    if instance.pk is not None and not raw:
+        instance._aggregateOld = (CarInfomation.objects.using(using).filter(pk=instance.pk)
+                                  .values(*AGGREGATE_FIELDS).first())
+
+
+@receiver(post_save, sender=CarInfomation)
+def carSaved(sender, instance, **kwargs):
+    delta = pendingDelta() if inBatchUpdate() else AggregateDelta()
+    old = getattr(instance, '_aggregateOld', None)
+    if old is not None:
+        delta.remove(old)
+    delta.add(instance)
+    carWritten(delta)
+
+
+@receiver(post_delete, sender=CarInfomation)
+def carDeleted(sender, instance, **kwargs):
+    delta = pendingDelta() if inBatchUpdate() else AggregateDelta()
+    delta.remove(instance)
+    carWritten(delta)
@@ -1,3 +1,1489 @@
-from django.test import TestCase
+import csv
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import runpy
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import requests
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, router, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models.signals import post_delete
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from myApp.models import CarAggregate, CarInfomation, DashboardPanel, DashboardSnapshot, DataVersion, User
+from myApp.routers import replicaStatus
+from myApp.urls import PANEL_ROUTES
+from myApp.utils import (aggregateEngine, analytics, carSnapshot, getBottomLeftData, getBottomRightData,
+                          getCenterChangeData, getCenterData, getCenterLeftData)
+from myApp.management.commands.bench_extract import FIXTURE_DIR, REAL_PAGE_DIR, fixturePages, legacyExtract
+from myApp.management.commands.benchmark import EXTRA_ROUTES
+from myApp.utils.carAggregates import checkAggregates
+from myApp.utils.carExtractors import extractDetail, extractFromDom, extractFromState
+from myApp.utils.crawlCheckpoint import STORED, CheckpointStore
+from myApp.utils.carLoader import syncParquet, upsertCars
+from myApp.utils.crawler import Fetcher, RateLimiter
+from myApp.utils.pageCache import PageCache
+from myApp.utils.pipeline import Pipeline, batched, dedupe
+from myApp.utils.responseCache import getCache
+from myApp.utils.dashboardSnapshot import ORM_SOURCE, PANEL_NAMES, buildPanels, getPanels
+from myApp.utils.dataVersion import VERSION_ID, batchUpdate, getDataVersion
+from myApp.utils.fastResponse import chooseEncoding
+from myApp.utils.getCenterRightData import getPriceSortDate
+from myApp.utils.parseData import formatPrice, parseInt, parsePrice
+from myApp.utils.profiling import listProfiles
+from myApp.utils.syntheticCars import BRANDS, generateCars, loadCars, writeCsv
+
+
+@skipUnless('replica' in settings.DATABASES, '需要 replica 数据库: python manage.py test myApp --settings=车辆大屏可视化.settings_local')
+@override_settings(DASHBOARD_READ_DATABASE='replica', DASHBOARD_REPLICA_CHECK_INTERVAL=0, DASHBOARD_REPLICA_MAX_LAG=5)
+class DashboardRouterTests(TransactionTestCase):
+    # 没有 replica 时整个类会跳过, 但测试框架仍会按这里准备数据库
+    databases = {'default', 'replica'} if 'replica' in settings.DATABASES else {'default'}
+
+    def setUp(self):
+        replicaStatus.reset()
+
+    def setVersion(self, alias, version, secondsAgo=0):
+        DataVersion.objects.using(alias).update_or_create(pk=VERSION_ID, defaults={'version': version})
+        DataVersion.objects.using(alias).filter(pk=VERSION_ID).update(
+            updateTime=timezone.now() - timedelta(seconds=secondsAgo))
+
+    def addCar(self, alias, carName):
+        # bulk_create 不触发信号, 只写入指定的库
+        CarInfomation.objects.using(alias).bulk_create([CarInfomation(carName=carName, brand='测试')])
+
+    def test_reads_use_replica_when_in_sync(self):
+        self.setVersion('default', 3)
+        self.setVersion('replica', 3)
+        self.addCar('replica', '只在从库')
+        self.assertEqual(router.db_for_read(CarInfomation), 'replica')
+        self.assertEqual(list(CarInfomation.objects.values_list('carName', flat=True)), ['只在从库'])
+
+    def test_writes_go_to_primary(self):
+        self.setVersion('default', 3)
+        self.setVersion('replica', 3)
+        CarInfomation.objects.create(carName='新车', brand='测试', sale_volume=1)
+        self.assertEqual(CarInfomation.objects.using('default').count(), 1)
+        self.assertEqual(CarInfomation.objects.using('replica').count(), 0)
+        # 写入递增的是主库的版本
+        self.assertEqual(DataVersion.objects.using('default').get(pk=VERSION_ID).version, 4)
+
+    def test_small_lag_stays_on_replica(self):
+        self.setVersion('default', 4)
+        self.setVersion('replica', 3)
+        self.assertEqual(router.db_for_read(CarInfomation), 'replica')
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        self.setVersion('default', 4, secondsAgo=60)
+        self.setVersion('replica', 3)
+        self.addCar('default', '只在主库')
+        self.assertEqual(router.db_for_read(CarInfomation), 'default')
+        self.assertEqual(list(CarInfomation.objects.values_list('carName', flat=True)), ['只在主库'])
+
+    def setPanels(self, alias, version):
+        DashboardPanel.objects.using(alias).all().delete()
+        DashboardPanel.objects.using(alias).bulk_create([
+            DashboardPanel(name=name, version=version, payload={'alias': alias}) for name in PANEL_NAMES])
+
+    def test_slightly_lagging_replica_serves_its_own_panels(self):
+        # 主库已重建到版本 4, 从库的版本和面板都还是 3: 两者都从从库读取, 不重建
+        self.setVersion('default', 4)
+        self.setPanels('default', 4)
+        self.setVersion('replica', 3)
+        self.setPanels('replica', 3)
+        self.assertEqual(router.db_for_read(DashboardPanel), 'replica')
+        with mock.patch('myApp.utils.dashboardSnapshot.rebuildDashboard') as rebuild:
+            version, panels = getPanels()
+        rebuild.assert_not_called()
+        self.assertEqual(version, 3)
+        self.assertEqual({panel['alias'] for panel in panels.values()}, {'replica'})
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        with mock.patch('myApp.routers.replicaLag', side_effect=OperationalError):
+            self.assertEqual(router.db_for_read(CarInfomation), 'default')
+
+    def test_reads_inside_primary_transaction_use_primary(self):
+        self.setVersion('default', 3)
+        self.setVersion('replica', 3)
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(CarInfomation), 'default')
+
+    def test_other_models_read_primary(self):
+        self.assertEqual(router.db_for_read(User), 'default')
+
+
+class NoReplicaRouterTests(TestCase):
+
+    @override_settings(DASHBOARD_READ_DATABASE='missing')
+    def test_unknown_read_alias_reads_primary(self):
+        self.assertEqual(router.db_for_read(CarInfomation), 'default')
+
+
+def legacyCars():
+    """原来各面板函数的输入: 按 id 顺序的整表, 价格和销量都是文本"""
+    return list(CarInfomation.objects.order_by('id').values_list(
+        'brand', 'carName', 'saleVolume', 'price', 'rank', 'carModel', 'energyType'))
+
+
+def legacyPanels():
+    """按原来逐行遍历的写法计算各面板, 作为快照实现的对照"""
+    cars = legacyCars()
+    models, brands, volumes, nameVolumes, types = {}, {}, {}, {}, {}
+    for brand, carName, saleVolume, price, rank, carModel, energyType in cars:
+        models[carModel] = models.get(carModel, 0) + 1
+        brands[brand] = brands.get(brand, 0) + 1
+        volumes[brand] = volumes.get(brand, 0) + int(saleVolume)
+        nameVolumes[carName] = nameVolumes.get(carName, 0) + int(saleVolume)
+        types[energyType] = types.get(energyType, 0) + 1
+    sumCar = len(cars)
+    sumPrice = sum(json.loads(car[3])[0] + json.loads(car[3])[1] for car in cars)
+    priceSort = {'0-5w': 0, '5-10w': 0, '10-20w': 0, '20-30w': 0, '30w以上': 0}
+    for car in cars:
+        low = json.loads(car[3])[0]
+        name = '0-5w' if low < 5 else '5-10w' if low < 10 else '10-20w' if low < 20 else '20-30w' if low < 30 else '30w以上'
+        priceSort[name] += 1
+    return {
+        'baseData': (sumCar, cars[0][2], cars[0][1], sorted(models.items(), key=lambda x: x[1], reverse=True)[0][0],
+                     max(brands.items(), key=lambda x: x[1])[0], round(sumPrice / (sumCar * 2), 2)),
+        'rollData': [{'name': k, 'value': v} for v, k in sorted([(v, k) for k, v in brands.items()], reverse=True)[:10]],
+        'pieBrand': [{'name': k, 'value': v} for v, k in sorted(zip(volumes.values(), volumes.keys()), reverse=True)[:10]],
+        'squareData': ([k for k, _ in sorted(nameVolumes.items(), key=lambda x: x[1], reverse=True)[:20]],
+                       [v for _, v in sorted(nameVolumes.items(), key=lambda x: x[1], reverse=True)[:20]],
+                       [float(re.findall(r'\d+\.\d', car[3])[0]) for car in cars[:20]]),
+        'circleData': ([[car[1], car[2], car[6]] for car in cars if car[6] == '汽油'][:10],
+                       [[car[1], car[2], car[6]] for car in cars if car[6] == '纯电动'][:10]),
+        'priceSort': [{'name': k, 'value': v} for k, v in priceSort.items()],
+        'rank': [(str(car[4]), car[2]) for car in cars],
+    }
+
+
+class LegacyParityTests(TestCase):
+    """共享快照上的各面板函数与原来逐行遍历整表的结果相同"""
+
+    def setUp(self):
+        carSnapshot.invalidate()
+        loadCars(generateCars(400, seed=4))
+
+    def test_panels_match_row_by_row_results(self):
+        legacy = legacyPanels()
+        self.assertEqual(getCenterData.getBaseData(), legacy['baseData'])
+        self.assertEqual(getCenterData.getRollData(), legacy['rollData'])
+        self.assertEqual(getCenterLeftData.getPieBrand(), legacy['pieBrand'])
+        self.assertEqual(getBottomLeftData.getSquareData(), legacy['squareData'])
+        self.assertEqual(getCenterChangeData.getCircleData(), legacy['circleData'])
+        self.assertEqual(getPriceSortDate(), legacy['priceSort'])
+        self.assertEqual([(car['rank'], car['saleVolume']) for car in getBottomRightData.getRankData()], legacy['rank'])
+
+    def test_snapshot_is_shared_until_version_changes(self):
+        snapshot = carSnapshot.getSnapshot()
+        self.assertIs(carSnapshot.getSnapshot(), snapshot)
+        CarInfomation.objects.create(carName='新车', brand='测试', saleVolume='1', price='[1.0, 2.0]')
+        self.assertIsNot(carSnapshot.getSnapshot(), snapshot)
+        self.assertEqual(carSnapshot.getSnapshot().size, 401)
+
+
+def tiedRows():
+    """品牌、车型的数量和品牌销量都并列, 检查并列时的顺序"""
+    rows = []
+    for i, (brand, carModel, volume) in enumerate([('乙', '中型车', 30), ('甲', '紧凑型车', 10), ('丙', '中型车', 20),
+                                                   ('甲', '紧凑型车', 20), ('乙', '小型车', 0), ('丙', '小型车', 10)]):
+        rows.append([brand, '%s%d' % (brand, i), '', volume, '[%d.5, %d.8]' % (i + 3, i + 4), '厂商', i + 1, carModel,
+                     '汽油' if i % 2 else '纯电动', '2025.01', '3年或10万公里'])
+    return rows
+
+
+class GroupedPanelTests(TestCase):
+    """中间几个面板的分组统计在数据库中完成: 并列时的顺序与原来相同, 查询次数与总行数无关"""
+
+    def setUp(self):
+        carSnapshot.invalidate()
+
+    def panels(self):
+        return (getCenterData.getBaseData(), getCenterData.getRollData(), getCenterData.getTypeRate(),
+                getCenterLeftData.getPieBrand())
+
+    def test_ties_keep_the_original_order(self):
+        loadCars(tiedRows())
+        legacy = legacyPanels()
+        self.assertEqual(getCenterData.getBaseData(), legacy['baseData'])
+        self.assertEqual(getCenterData.getRollData(), legacy['rollData'])
+        self.assertEqual(getCenterLeftData.getPieBrand(), legacy['pieBrand'])
+
+    def test_query_count_does_not_grow_with_rows(self):
+        loadCars(generateCars(50, seed=5))
+        with CaptureQueriesContext(connection) as small:
+            self.panels()
+        loadCars(generateCars(2000, seed=6))
+        with CaptureQueriesContext(connection) as large:
+            self.panels()
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(len(getCenterData.getRollData()), 10)
+
+
+class TypedColumnTests(SimpleTestCase):
+
+    def test_parse_helpers(self):
+        self.assertEqual(parsePrice('[3.58, 4.68]'), (Decimal('3.58'), Decimal('4.68')))
+        # 整数价格原来的正则会漏掉
+        self.assertEqual(parsePrice('[19, 20.8]'), (Decimal('19'), Decimal('20.8')))
+        self.assertEqual(parsePrice('暂无报价'), (None, None))
+        self.assertEqual((parseInt('51743'), parseInt(51743.0), parseInt(''), parseInt(None, -1)), (51743, 51743, 0, -1))
+        self.assertEqual(formatPrice(Decimal('19.00'), Decimal('20.80')), '19-20.8')
+        self.assertEqual(formatPrice(None, None), '')
+
+
+class BackfillMigrationTests(TransactionTestCase):
+    """0002 从文本回填数值列, rank 改为整数列"""
+
+    def migrate(self, target=None):
+        # target 为 None 时迁移到最新
+        executor = MigrationExecutor(connection)
+        targets = executor.loader.graph.leaf_nodes('myApp') if target is None else [('myApp', target)]
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def test_backfill_typed_columns(self):
+        self.addCleanup(self.migrate)
+        apps = self.migrate('0001_initial')
+        apps.get_model('myApp', 'CarInfomation').objects.bulk_create([
+            apps.get_model('myApp', 'CarInfomation')(carName=name, saleVolume=volume, price=price, rank=rank)
+            for name, volume, price, rank in [('甲', '51743', '[3.58, 4.68]', '1'), ('乙', '12.0', '[19, 20.8]', '2.0'),
+                                              ('丙', '', '暂无报价', '')]])
+        apps = self.migrate('0002_typed_numeric_columns')
+        cars = apps.get_model('myApp', 'CarInfomation').objects.order_by('id').values_list(
+            'sale_volume', 'min_price', 'max_price', 'rank')
+        self.assertEqual([(volume, low and str(low), high and str(high), rank) for volume, low, high, rank in cars],
+                         [(51743, '3.58', '4.68', 1), (12, '19.00', '20.80', 2), (0, None, None, 0)])
+
+
+class EmptyTableTests(TestCase):
+    """没有任何车辆数据时各接口仍返回 200"""
+
+    def setUp(self):
+        getCache().clear()
+        carSnapshot.invalidate()
+
+    def test_panels_on_empty_table(self):
+        for url in ('/myApp/dashboard/', '/myApp/center/', '/myApp/centerLeft/', '/myApp/bottomLeft/',
+                    '/myApp/centerRight/', '/myApp/centerRightChange/1', '/myApp/bottomRight/',
+                    '/myApp/bottomRight/?limit=10', '/myApp/aggregate/?group_by=brand'):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+        center = self.client.get('/myApp/center/').json()
+        self.assertEqual((center['sumCar'], center['topCar'], center['averagePrices']), (0, '', 0))
+        self.assertEqual(self.client.get('/myApp/centerLeft/').json(), {'lastPeiList': []})
+
+
+class DashboardPanelTests(TestCase):
+
+    def setUp(self):
+        getCache().clear()
+        carSnapshot.invalidate()
+        loadCars(generateCars(60))
+
+    def test_each_panel_is_stored_in_its_own_row(self):
+        center = self.client.get('/myApp/center/').json()
+        self.assertEqual(center['sumCar'], 60)
+        self.assertEqual(set(DashboardPanel.objects.values_list('name', flat=True)), set(PANEL_NAMES))
+        self.assertEqual(set(self.client.get('/myApp/dashboard/').json()), set(PANEL_NAMES))
+        # 排行榜整表不进快照, 直接返回
+        self.assertEqual(len(self.client.get('/myApp/bottomRight/').json()['carData']), 60)
+
+    def test_cars_without_price_are_stored(self):
+        # 没有报价的车在 priceList 中是 null, 面板可以写入 JSON 列
+        CarInfomation.objects.filter(pk=CarInfomation.objects.order_by('id')[0].pk).update(price='暂无报价')
+        priceList = self.client.get('/myApp/bottomLeft/').json()['priceList']
+        self.assertIsNone(priceList[0])
+        self.assertEqual(len(priceList), 20)
+
+    def test_stale_panels_are_rebuilt_once(self):
+        self.client.get('/myApp/center/')
+        CarInfomation.objects.create(carName='新车', brand='测试', saleVolume='1', price='[1.0, 2.0]')
+        self.assertEqual(self.client.get('/myApp/center/').json()['sumCar'], 61)
+        self.assertEqual(set(DashboardPanel.objects.values_list('version', flat=True)), {getDataVersion()})
+
+
+class CarWriteTests(TestCase):
+    """逐行保存、批量修改和删除都保持分组统计与全量计算一致, 并递增数据版本"""
+
+    def setUp(self):
+        loadCars(generateCars(40))
+
+    def test_save_derives_typed_columns(self):
+        car = CarInfomation.objects.create(carName='新车', brand='测试', saleVolume='1234', price='[3.58, 4.68]')
+        car.refresh_from_db()
+        self.assertEqual((car.sale_volume, str(car.min_price), str(car.max_price)), (1234, '3.58', '4.68'))
+        car.price = '暂无报价'
+        car.save(update_fields=['price'])
+        car.refresh_from_db()
+        self.assertEqual((car.min_price, car.max_price), (None, None))
+        self.assertEqual(checkAggregates(), [])
+
+    def test_queryset_update_keeps_aggregates(self):
+        before = getDataVersion()
+        updated = CarInfomation.objects.filter(energyType='汽油').update(
+            energyType='纯电动', brand='测试', saleVolume='10', price='[1, 2]')
+        self.assertGreater(updated, 0)
+        self.assertEqual(getDataVersion(), before + 1)
+        self.assertEqual(checkAggregates(), [])
+        car = CarInfomation.objects.filter(brand='测试').first()
+        self.assertEqual((car.sale_volume, str(car.min_price)), (10, '1.00'))
+
+    def test_queryset_delete_bumps_version_once(self):
+        before = getDataVersion()
+        CarInfomation.objects.filter(carModel='中型车').delete()
+        self.assertEqual(getDataVersion(), before + 1)
+        self.assertEqual(checkAggregates(), [])
+
+
+class ResponseCacheTests(TestCase):
+    """响应按数据版本缓存, 写入后版本递增, 旧的缓存不再命中"""
+
+    def setUp(self):
+        getCache().clear()
+        carSnapshot.invalidate()
+        loadCars(generateCars(50))
+
+    def test_hit_until_version_changes(self):
+        self.assertEqual(self.client.get('/myApp/center/')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/myApp/center/')['X-Cache'], 'HIT')
+        CarInfomation.objects.create(carName='新车', brand='测试', saleVolume='1', price='[1.0, 2.0]')
+        response = self.client.get('/myApp/center/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['sumCar'], 51)
+
+    def test_load_command_invalidates(self):
+        self.client.get('/myApp/bottomRight/?limit=5')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'temp.csv')
+        writeCsv(path, generateCars(10, seed=7))
+        call_command('load_cars', path, stdout=StringIO())
+        self.assertEqual(self.client.get('/myApp/bottomRight/?limit=5')['X-Cache'], 'MISS')
+
+    def test_keys_include_query_and_errors_are_not_cached(self):
+        self.client.get('/myApp/bottomRight/?limit=5')
+        self.assertEqual(self.client.get('/myApp/bottomRight/?limit=6')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/myApp/bottomRight/?limit=5')['X-Cache'], 'HIT')
+        for _ in range(2):
+            response = self.client.get('/myApp/bottomRight/?limit=x')
+            self.assertEqual(response.status_code, 400)
+            self.assertNotEqual(response.get('X-Cache'), 'HIT')
+
+
+class RankPaginationTests(TestCase):
+
+    def setUp(self):
+        getCache().clear()
+        carSnapshot.invalidate()
+        loadCars(generateCars(120))
+        # 并列的排名靠 id 区分先后
+        CarInfomation.objects.filter(rank__lte=10).update(rank=1)
+
+    def expected(self):
+        cars = CarInfomation.objects.order_by('rank', 'id').values(*getBottomRightData.RANK_FIELDS)
+        return [getBottomRightData.rankRow(car) for car in cars]
+
+    def test_cursor_pages_cover_every_row_once(self):
+        rows, params = [], {'limit': 7}
+        while True:
+            page = self.client.get('/myApp/bottomRight/', params).json()
+            self.assertLessEqual(len(page['carData']), 7)
+            rows += page['carData']
+            if page['next'] is None:
+                break
+            params = dict(page['next'], limit=7)
+        self.assertEqual(rows, self.expected())
+
+    def test_ndjson_streams_every_row(self):
+        response = self.client.get('/myApp/bottomRight/', {'format': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.expected())
+
+    def test_limit_is_clamped_and_bad_params_rejected(self):
+        self.assertEqual(len(self.client.get('/myApp/bottomRight/', {'limit': 0}).json()['carData']), 1)
+        self.assertEqual(len(self.client.get('/myApp/bottomRight/', {'limit': 10 ** 6}).json()['carData']), 120)
+        for params in ({'limit': 'x'}, {'after': '1.5'}, {'after': 1, 'afterId': 'abc'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/myApp/bottomRight/', params).status_code, 400)
+
+
+class AggregateSignalTests(TestCase):
+    """单条新增、修改、删除后 CarAggregate 与全量计算一致, 每次写入数据版本加一"""
+
+    def setUp(self):
+        loadCars(tiedRows())
+
+    def test_create_save_and_delete(self):
+        before = getDataVersion()
+        car = CarInfomation.objects.create(carName='新车', brand='丁', carModel='中型车', energyType='汽油',
+                                           saleVolume='50', price='[8.5, 9.5]')
+        self.assertEqual(checkAggregates(), [])
+        # 改品牌: 从 丁 组移到 甲 组, 丁 组没有车后删除
+        car.brand = '甲'
+        car.saleVolume = '70'
+        car.save()
+        self.assertEqual(checkAggregates(), [])
+        self.assertFalse(CarAggregate.objects.filter(dimension='brand', key='丁').exists())
+        self.assertEqual(CarAggregate.objects.get(dimension='brand', key='甲').volumeSum, 100)
+        car.delete()
+        self.assertEqual(checkAggregates(), [])
+        self.assertEqual(getDataVersion(), before + 3)
+
+    def test_deleting_first_car_moves_first_id(self):
+        # 车型并列时按 firstId 取最先出现的, 删掉第一辆后换成下一组
+        self.assertEqual(getCenterData.getBaseData()[3], '中型车')
+        CarInfomation.objects.order_by('id').first().delete()
+        self.assertEqual(checkAggregates(), [])
+        self.assertEqual(getCenterData.getBaseData()[3], '紧凑型车')
+
+    def test_failed_batch_leaves_aggregates_unchanged(self):
+        before = getDataVersion()
+        with self.assertRaises(RuntimeError):
+            with batchUpdate():
+                CarInfomation.objects.create(carName='新车', brand='丁', saleVolume='50', price='[8.5, 9.5]')
+                CarInfomation.objects.filter(brand='乙').first().delete()
+                raise RuntimeError
+        self.assertEqual(getDataVersion(), before)
+        self.assertEqual(checkAggregates(), [])
+        self.assertFalse(CarInfomation.objects.filter(brand='丁').exists())
+
+    def test_failed_inner_batch_is_dropped(self):
+        before = getDataVersion()
+        with batchUpdate():
+            CarInfomation.objects.create(carName='外层', brand='丁', saleVolume='5', price='[1, 2]')
+            with self.assertRaises(RuntimeError):
+                with batchUpdate():
+                    CarInfomation.objects.create(carName='内层', brand='戊', saleVolume='7', price='[3, 4]')
+                    raise RuntimeError
+            with batchUpdate():
+                CarInfomation.objects.filter(brand='甲').update(brand='丁')
+        self.assertEqual(getDataVersion(), before + 1)
+        self.assertEqual(checkAggregates(), [])
+        self.assertEqual(CarAggregate.objects.get(dimension='brand', key='丁').count, 3)
+
+    def test_failed_queryset_delete_rolls_back(self):
+        deleted = []
+
+        def failOnSecond(sender, instance, **kwargs):
+            deleted.append(instance.pk)
+            if len(deleted) == 2:
+                raise RuntimeError
+
+        post_delete.connect(failOnSecond, sender=CarInfomation)
+        self.addCleanup(post_delete.disconnect, failOnSecond, sender=CarInfomation)
+        with self.assertRaises(RuntimeError):
+            CarInfomation.objects.filter(brand='乙').delete()
+        self.assertEqual(CarInfomation.objects.filter(brand='乙').count(), 2)
+        self.assertEqual(checkAggregates(), [])
+
+    def test_batch_update_applies_once(self):
+        before = getDataVersion()
+        with batchUpdate():
+            for car in CarInfomation.objects.filter(brand='乙'):
+                car.energyType = '增程式'
+                car.save()
+        self.assertEqual(getDataVersion(), before + 1)
+        self.assertEqual(checkAggregates(), [])
+
+
+class AggregateApiTests(TestCase):
+
+    def setUp(self):
+        getCache().clear()
+        carSnapshot.invalidate()
+        loadCars(edgeRows(0) + list(generateCars(300, seed=8)))
+
+    def get(self, **params):
+        return self.client.get('/myApp/aggregate/', params)
+
+    def test_matches_existing_panels(self):
+        self.assertEqual(self.get(group_by='brand').json(), getCenterData.getRollData())
+        self.assertEqual(self.get(group_by='brand', metric='sum:saleVolume').json(), getCenterLeftData.getPieBrand())
+
+    def test_counters_match_snapshot(self):
+        for groupBy in ('brand', 'carModel', 'energyType'):
+            for metric in ('count', 'sum:saleVolume'):
+                plan = aggregateEngine.compilePlan(groupBy, metric, (), 100)
+                self.assertEqual(plan.source, 'aggregate')
+                with self.subTest(plan=plan):
+                    self.assertEqual(aggregateEngine.runPlan(plan),
+                                     aggregateEngine.runPlan(plan._replace(source='snapshot')))
+
+    def test_filters(self):
+        counts = {}
+        cars = CarInfomation.objects.filter(energyType__in=['汽油', '纯电动'], carModel='中型车')
+        for brand in cars.values_list('brand', flat=True):
+            counts[brand] = counts.get(brand, 0) + 1
+        expected = [{'name': k, 'value': v} for v, k in sorted(((v, k) for k, v in counts.items()), reverse=True)[:5]]
+        response = self.client.get('/myApp/aggregate/?group_by=brand&top=5&filter=energyType:汽油,energyType:纯电动'
+                                   '&filter=carModel:中型车')
+        self.assertEqual(response.json(), expected)
+
+    def test_filter_without_matches_is_empty(self):
+        for metric in ('count', 'sum:saleVolume', 'avg:price'):
+            with self.subTest(metric=metric):
+                self.assertEqual(self.get(group_by='carModel', metric=metric, filter='brand:没有这个').json(), [])
+
+    def test_invalid_params_are_rejected(self):
+        for params in ({}, {'group_by': 'carName'}, {'group_by': 'brand', 'metric': 'max:price'},
+                       {'group_by': 'brand', 'metric': 'count:price'}, {'group_by': 'brand', 'metric': 'sum:rank'},
+                       {'group_by': 'brand', 'filter': 'brand'}, {'group_by': 'brand', 'filter': 'rank:1'},
+                       {'group_by': 'brand', 'top': 0}, {'group_by': 'brand', 'top': 101},
+                       {'group_by': 'brand', 'top': 'x'}):
+            with self.subTest(params=params):
+                response = self.get(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+
+class BenchmarkTests(TestCase):
+
+    def test_generator_is_deterministic(self):
+        rows = list(generateCars(2000, seed=3))
+        self.assertEqual(rows, list(generateCars(2000, seed=3)))
+        self.assertNotEqual(rows, list(generateCars(2000, seed=4)))
+        self.assertEqual([row[6] for row in rows], list(range(1, 2001)))
+        volumes = [row[3] for row in rows]
+        self.assertEqual(volumes, sorted(volumes, reverse=True))
+        self.assertEqual(len({row[1] for row in rows}), 2000)
+        # 品牌只取自 BRANDS, 越靠前的品牌车型越多
+        brands = [brand for brand, _ in BRANDS]
+        counts = [sum(row[0] == brand for row in rows) for brand in brands]
+        self.assertEqual(sum(counts), 2000)
+        self.assertGreater(counts[0], counts[9])
+        self.assertGreater(counts[9], counts[-1])
+
+    def test_benchmark_command(self):
+        output = StringIO()
+        call_command('benchmark', rows=[40], repeat=1, load_rows=0, stdout=output, stderr=StringIO())
+        result = json.loads(output.getvalue())
+        views = result['sizes'][0]['views']
+        self.assertEqual(result['sizes'][0]['rows'], 40)
+        self.assertEqual(set(views), {name for _, name in PANEL_ROUTES} | {name for name, _ in EXTRA_ROUTES})
+        self.assertTrue(all(stats['bytes'] > 0 for stats in views.values()))
+
+
+def metricValue(text, sample):
+    """Prometheus 文本中某个样本的值, 没有时为 0"""
+    for line in text.splitlines():
+        if line.startswith(sample + ' '):
+            return float(line.rpartition(' ')[2])
+    return 0
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        getCache().clear()
+        carSnapshot.invalidate()
+        loadCars(generateCars(30))
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode('utf-8')
+
+    def test_server_timing_and_counters(self):
+        before = self.scrape()
+        first = self.client.get('/myApp/center/')
+        second = self.client.get('/myApp/center/')
+        self.assertRegex(first['Server-Timing'], r'^sql;desc="\d+ queries";dur=[\d.]+, total;dur=[\d.]+, cache;desc="MISS"$')
+        self.assertIn('cache;desc="HIT"', second['Server-Timing'])
+        after = self.scrape()
+        for sample, delta in (('dashboard_requests_total{view="center",status="200"}', 2),
+                              ('dashboard_cache_total{view="center",result="hit"}', 1),
+                              ('dashboard_cache_total{view="center",result="miss"}', 1),
+                              ('dashboard_request_duration_seconds_count{view="center"}', 2),
+                              ('dashboard_response_bytes_total{view="center"}', len(first.content) + len(second.content))):
+            with self.subTest(sample=sample):
+                self.assertEqual(metricValue(after, sample) - metricValue(before, sample), delta)
+        self.assertGreater(metricValue(after, 'dashboard_sql_queries_total{view="center"}'),
+                           metricValue(before, 'dashboard_sql_queries_total{view="center"}'))
+
+    def test_metrics_only_for_allowed_addresses(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.8').status_code, 403)
+        with override_settings(DASHBOARD_METRICS_ALLOWED_IPS=None):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.8').status_code, 200)
+
+
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # 中间件在第一次请求时加载, 设置要在请求之前生效
+        override = override_settings(DASHBOARD_PROFILING=True, DASHBOARD_PROFILE_TOKEN='secret',
+                                     DASHBOARD_PROFILE_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        getCache().clear()
+        carSnapshot.invalidate()
+        loadCars(generateCars(30))
+
+    def test_only_requests_with_the_token_are_profiled(self):
+        self.assertNotIn('X-Profile-Id', self.client.get('/myApp/center/'))
+        self.assertNotIn('X-Profile-Id', self.client.get('/myApp/center/', HTTP_X_PROFILE='wrong'))
+        profileId = self.client.get('/myApp/centerLeft/', HTTP_X_PROFILE='secret')['X-Profile-Id']
+        self.assertEqual(self.client.get('/myApp/center/?_profile=secret').status_code, 200)
+        profiles = {meta['id']: meta for meta in listProfiles()}
+        self.assertEqual(len(profiles), 2)
+        self.assertEqual((profiles[profileId]['view'], profiles[profileId]['status']), ('centerLeft', 200))
+
+        output = StringIO()
+        call_command('profiles', stdout=output)
+        self.assertIn(profileId, output.getvalue())
+        output = StringIO()
+        call_command('profiles', all=True, every_function=True, stdout=output)
+        self.assertIn('合并 2 个结果', output.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('profiles', '../settings', stdout=StringIO())
+
+    def test_disabled_by_default(self):
+        with override_settings(DASHBOARD_PROFILING=False):
+            client = Client()
+            self.assertNotIn('X-Profile-Id', client.get('/myApp/center/', HTTP_X_PROFILE='secret'))
+        self.assertEqual(listProfiles(), [])
+
+
+class DashboardStreamSettingTests(TestCase):
+
+    @override_settings(DASHBOARD_STREAM_ENABLED=False, DASHBOARD_POLL_INTERVAL=30)
+    def test_stream_disabled_falls_back_to_polling(self):
+        self.assertEqual(self.client.get('/myApp/dashboard/stream/').status_code, 404)
+        status = self.client.get('/myApp/dashboard/status/').json()
+        self.assertEqual(status, {'version': getDataVersion(), 'stream': False, 'pollInterval': 30})
+
+    @override_settings(DASHBOARD_STREAM_ENABLED=True)
+    def test_status_reports_stream(self):
+        self.assertTrue(self.client.get('/myApp/dashboard/status/').json()['stream'])
+
+
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        getCache().clear()
+        carSnapshot.invalidate()
+        loadCars(generateCars(30))
+
+    def test_async_views_match_sync_views(self):
+        for route in ('dashboard/', 'center/', 'centerLeft/', 'centerRightChange/1', 'bottomRight/',
+                      'bottomRight/?limit=7'):
+            with self.subTest(route=route):
+                sync = self.client.get('/myApp/sync/' + route)
+                getCache().clear()
+                DashboardPanel.objects.all().delete()
+                DashboardSnapshot.objects.all().delete()
+                self.assertEqual(self.client.get('/myApp/async/' + route).json(), sync.json())
+
+
+class ConditionalRequestTests(TestCase):
+
+    def setUp(self):
+        getCache().clear()
+        carSnapshot.invalidate()
+        loadCars(generateCars(300))
+
+    def test_not_modified_until_version_changes(self):
+        response = self.client.get('/myApp/center/')
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/myApp/center/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        CarInfomation.objects.create(carName='新车', brand='测试', saleVolume='1', price='[1.0, 2.0]')
+        response = self.client.get('/myApp/center/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['sumCar'], 301)
+
+    def test_etag_differs_per_representation(self):
+        url = '/myApp/bottomRight/'
+        plain = self.client.get(url)
+        gzipped = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        columnar = self.client.get(url, HTTP_ACCEPT='application/vnd.columnar+json')
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertEqual(len({plain['ETag'], gzipped['ETag'], columnar['ETag']}), 3)
+        for response in (plain, gzipped, columnar):
+            self.assertIn('Accept', response['Vary'])
+            self.assertIn('Accept-Encoding', response['Vary'])
+        # 拿 gzip 表示的 ETag 请求未压缩的表示, 不能得到 304
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=gzipped['ETag']).status_code, 200)
+        notModified = self.client.get(url, HTTP_IF_NONE_MATCH=gzipped['ETag'], HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(notModified.status_code, 304)
+        self.assertIn('Accept-Encoding', notModified['Vary'])
+
+    def test_async_views_use_the_same_etags(self):
+        for headers in ({}, {'HTTP_ACCEPT_ENCODING': 'gzip'}):
+            self.assertEqual(self.client.get('/myApp/async/bottomLeft/', **headers)['ETag'],
+                             self.client.get('/myApp/sync/bottomLeft/', **headers)['ETag'])
+
+
+class EncodingTests(SimpleTestCase):
+
+    def encoding(self, header):
+        return chooseEncoding(RequestFactory().get('/', HTTP_ACCEPT_ENCODING=header))
+
+    def test_q_values(self):
+        with mock.patch('myApp.utils.fastResponse.brotli', object()):
+            for header, expected in (('gzip, deflate, br', 'br'), ('br;q=0, gzip;q=0.5', 'gzip'),
+                                     ('br;q=0.5, gzip', 'gzip'), ('gzip;q=0.8, br;q=0.9', 'br'),
+                                     ('br;q=0, gzip;q=0', None), ('*;q=0.5, br;q=0', 'gzip'), ('*', 'br'),
+                                     ('GZIP; Q=0.3', 'gzip'), ('gzip;q=abc, br;q=2', None),
+                                     ('gzip;q=0.5, identity', None), ('', None)):
+                with self.subTest(header=header):
+                    self.assertEqual(self.encoding(header), expected)
+
+    def test_br_needs_brotli(self):
+        with mock.patch('myApp.utils.fastResponse.brotli', None):
+            self.assertEqual(self.encoding('br, gzip;q=0.1'), 'gzip')
+            self.assertIsNone(self.encoding('br'))
+
+
+class PriceHistogramTests(TestCase):
+
+    def setUp(self):
+        getCache().clear()
+        carSnapshot.invalidate()
+        loadCars(edgeRows(0) + list(generateCars(200)))
+
+    def test_custom_bins(self):
+        realData = self.client.get('/myApp/centerRight/?bins=10,30').json()['realData']
+        self.assertEqual([i['name'] for i in realData], ['0-10w', '10-30w', '30w以上'])
+        self.assertEqual(sum(i['value'] for i in realData), 203)
+        # 默认分界与不带参数的结果相同
+        self.assertEqual(self.client.get('/myApp/centerRight/?bins=5,10,20,30').json(),
+                         self.client.get('/myApp/centerRight/').json())
+
+    def test_invalid_bins_are_rejected(self):
+        for bins in ('nan', '5,inf', '-inf,5', 'abc', '10,5', '0,5', ','.join(['1'] * 2)):
+            with self.subTest(bins=bins):
+                self.assertEqual(self.client.get('/myApp/centerRight/', {'bins': bins}).status_code, 400)
+        self.assertEqual(self.client.get('/myApp/centerRight/?mode=max').status_code, 400)
+
+
+def edgeRows(start):
+    """没有价格、价格在分界上、并列销量等边界数据"""
+    return [
+        ['测试品牌', '无报价%d' % start, '', 100, '暂无报价', '测试厂商', start, '紧凑型SUV', '汽油', '2025.01', '3年或10万公里'],
+        ['测试品牌', '分界价%d' % start, '', 100, '[10.0, 10.0]', '测试厂商', start + 1, '中型车', '纯电动', '2025.01', '3年或10万公里'],
+        ['特斯拉', '分界价%d' % (start + 2), '', 5, '[30, 40.01]', '特斯拉中国', start + 2, '中型车', '纯电动', '2025.02', '3年或10万公里'],
+    ]
+
+
+@skipUnless(analytics.duckdb is not None, '需要 pip install duckdb')
+class AnalyticsParityTests(TransactionTestCase):
+    """DuckDB 后端与默认 ORM / 快照计算的结果必须完全相同"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # 只比较两种计算方式, 读写都用主库
+        override = override_settings(DASHBOARD_ANALYTICS_DIR=directory.name, DASHBOARD_READ_DATABASE=None)
+        override.enable()
+        self.addCleanup(override.disable)
+        carSnapshot.invalidate()
+        loadCars(edgeRows(0) + list(generateCars(3000, seed=1)) + edgeRows(5000))
+
+    def assertPanelsEqual(self):
+        carSnapshot.invalidate()
+        # 比较序列化后的结果, 不受浮点和 Decimal 类型差异影响
+        self.assertEqual(json.dumps(buildPanels(source=analytics), sort_keys=True),
+                         json.dumps(buildPanels(source=ORM_SOURCE), sort_keys=True))
+        self.assertEqual(analytics.getRankData(), ORM_SOURCE.getRankData())
+
+    def test_panels(self):
+        self.assertPanelsEqual()
+
+    def test_price_histogram(self):
+        for edges in (None, (5, 10, 30, 40.01), (0.5,)):
+            for mode in ('min', 'avg'):
+                with self.subTest(edges=edges, mode=mode):
+                    self.assertEqual(analytics.getPriceSortDate(edges, mode), getPriceSortDate(edges, mode))
+
+    def test_aggregate_plans(self):
+        filters = [(), ('energyType:纯电动',), ('energyType:汽油,energyType:纯电动', 'carModel:中型车'), ('brand:没有这个',)]
+        for groupBy in aggregateEngine.GROUP_FIELDS:
+            for metric in ('count', 'sum:saleVolume', 'avg:saleVolume', 'sum:price', 'avg:price'):
+                for items in filters:
+                    plan = aggregateEngine.compilePlan(groupBy, metric, items, 7)._replace(source='snapshot')
+                    with self.subTest(plan=plan):
+                        self.assertEqual(analytics.runPlan(plan), aggregateEngine.runPlan(plan))
+
+    def test_append_matches_full_export(self):
+        analytics.exportParquet()
+        before = getDataVersion()
+        with batchUpdate():
+            for car in edgeRows(9000):
+                CarInfomation.objects.create(brand=car[0], carName=car[1], sale_volume=car[3], price=car[4],
+                                             min_price=None, max_price=None, energyType=car[8], carModel=car[7])
+        manifest = analytics.appendParquet(before)
+        self.assertEqual(len(manifest['parts']), 2)
+        self.assertEqual(manifest['version'], getDataVersion())
+        self.assertPanelsEqual()
+        appended = analytics.getRankData()
+        analytics.exportParquet()
+        self.assertEqual(analytics.getRankData(), appended)
+
+    @override_settings(DASHBOARD_ANALYTICS_BACKEND='duckdb')
+    def test_several_loads_append_once(self):
+        analytics.exportParquet()
+        before = getDataVersion()
+        rows = list(generateCars(600, seed=3))
+        for start in range(0, 600, 200):
+            upsertCars(rows[start:start + 200], rankMonth='2025-11', syncAnalytics=False)
+        manifest = syncParquet(before, loads=3)
+        self.assertEqual(len(manifest['parts']), 2)
+        self.assertEqual(manifest['version'], getDataVersion())
+        self.assertPanelsEqual()
+
+    def test_concurrent_requests_export_once(self):
+        analytics.exportParquet()
+        CarInfomation.objects.create(carName='新车', brand='测试', saleVolume='1', price='[1.0, 2.0]')
+        barrier = threading.Barrier(4)
+        errors = []
+
+        def query():
+            try:
+                barrier.wait()
+                analytics.getRollData()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        with mock.patch.object(analytics, 'exportParquet', wraps=analytics.exportParquet) as export:
+            threads = [threading.Thread(target=query) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(export.call_count, 1)
+        self.assertEqual(analytics.readManifest()['version'], getDataVersion())
+
+    def test_exports_are_swapped_in_whole(self):
+        os.makedirs(os.path.join(analytics.analyticsDir(), analytics.TEMP_PREFIX + 'crashed'))
+        analytics.exportParquet()
+        first = analytics.readManifest()['directory']
+        CarInfomation.objects.create(carName='新车', brand='测试', saleVolume='1', price='[1.0, 2.0]')
+        analytics.exportParquet()
+        CarInfomation.objects.create(carName='新车2', brand='测试', saleVolume='1', price='[1.0, 2.0]')
+        manifest = analytics.exportParquet()
+        # 只保留当前和上一份导出, 没有残留的临时目录
+        names = sorted(name for name in os.listdir(analytics.analyticsDir()) if not name.startswith(('manifest', '.export')))
+        self.assertEqual(len(names), 2)
+        self.assertIn(manifest['directory'], names)
+        self.assertNotIn(first, names)
+
+    def test_pinned_version_skips_version_queries(self):
+        version = analytics.exportParquet()['version']
+        with CaptureQueriesContext(connection) as queries, analytics.pinVersion(version):
+            buildPanels(source=analytics)
+        self.assertEqual(len(queries), 0)
+
+    def test_stale_export_is_refreshed(self):
+        analytics.exportParquet()
+        CarInfomation.objects.filter(brand='特斯拉').delete()
+        self.assertPanelsEqual()
+
+
+
+class CarLoaderTests(TestCase):
+    """按 (车名, 排行月份) 批量 upsert"""
+
+    def setUp(self):
+        self.rows = edgeRows(0) + list(generateCars(500, seed=2))
+
+    def assertAggregatesConsistent(self):
+        self.assertEqual(checkAggregates(), [])
+
+    def test_reload_updates_instead_of_duplicating(self):
+        first = upsertCars(self.rows, rankMonth='2025-09', batchSize=64)
+        self.assertEqual((first.rows, first.inserted, first.updated), (503, 503, 0))
+        created = dict(CarInfomation.objects.values_list('carName', 'creteTime'))
+        rows = [row[:3] + [row[3] * 2] + row[4:] for row in self.rows]
+        version = getDataVersion()
+        second = upsertCars(rows, rankMonth='2025-09', batchSize=64)
+        self.assertEqual((second.rows, second.inserted, second.updated), (503, 0, 503))
+        self.assertEqual(getDataVersion(), version + 1)
+        self.assertEqual(CarInfomation.objects.count(), 503)
+        car = CarInfomation.objects.get(carName=rows[5][1])
+        self.assertEqual((car.saleVolume, car.sale_volume), (str(rows[5][3]), rows[5][3]))
+        self.assertEqual(dict(CarInfomation.objects.values_list('carName', 'creteTime')), created)
+        self.assertAggregatesConsistent()
+
+    def test_months_are_separate(self):
+        upsertCars(self.rows[:100], rankMonth='2025-09')
+        result = upsertCars(self.rows[50:150], rankMonth='2025-10')
+        self.assertEqual(result.inserted, 100)
+        self.assertEqual(CarInfomation.objects.count(), 200)
+        self.assertAggregatesConsistent()
+
+    def test_duplicate_and_moved_rows(self):
+        upsertCars(self.rows[:100], rankMonth='2025-09')
+        # 同一批中重复的车名保留最后一行; 换了品牌 / 能源类型的车系从原来的分组移到新分组
+        moved = self.rows[10][:]
+        moved[0], moved[8] = '新品牌', '增程式'
+        result = upsertCars([self.rows[10], moved, ['品牌', '列表价格', '', '7', [3.5, 4], '厂商', '3', '紧凑型车',
+                                                     '汽油', '2025.01', '3年或10万公里']], rankMonth='2025-09')
+        self.assertEqual((result.rows, result.inserted, result.updated), (2, 1, 1))
+        self.assertEqual(CarInfomation.objects.get(carName=moved[1]).brand, '新品牌')
+        car = CarInfomation.objects.get(carName='列表价格')
+        self.assertEqual((car.price, car.min_price, car.max_price, car.rank), ('[3.5, 4]', 3.5, 4, 3))
+        self.assertAggregatesConsistent()
+
+    def test_save_to_sql_is_idempotent(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        writeCsv(os.path.join(directory.name, 'temp.csv'), self.rows)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+        spiderObj = loadSpiders().spider()
+        spiderObj.rankMonth = '2025-09'
+        with mock.patch('builtins.print'):
+            spiderObj.save_to_sql()
+            # clear_csv 会去掉有空值的行 (没有图片的边界数据)
+            self.assertEqual(CarInfomation.objects.count(), 500)
+            spiderObj.save_to_sql()
+        self.assertEqual(CarInfomation.objects.count(), 500)
+        self.assertAggregatesConsistent()
+
+    def test_load_cars_command(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'temp.csv')
+        writeCsv(path, self.rows)
+        output = StringIO()
+        call_command('load_cars', path, month='2025-09', batch_size=100, stdout=output)
+        self.assertIn('新增 500', output.getvalue())
+        call_command('load_cars', path, month='2025-09', stdout=output)
+        self.assertIn('更新 500', output.getvalue())
+        self.assertEqual(CarInfomation.objects.filter(rankMonth='2025-09').count(), 500)
+
+def detailPage(seriesId, carModel='紧凑型SUV', energyType='汽油'):
+    rows = [('jb', carModel), ('fuel_form', energyType), ('market_time', '2025.01'), ('period', '3年或10万公里')]
+    return '<html><body>%s</body></html>' % ''.join(
+        '<div data-row-anchor="%s"><div>名称</div><div><div>%s</div></div></div>' % row for row in rows)
+
+
+def rankCar(seriesId):
+    return {'brand_name': '品牌%d' % seriesId, 'series_name': '车型%d' % seriesId, 'image': '', 'count': 1000 - seriesId,
+            'min_price': 10, 'max_price': 12, 'sub_brand_name': '厂商', 'rank': seriesId, 'series_id': seriesId}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 才能复用连接
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        status, body = self.server.respond(self.path)
+        data = body.encode('utf-8')
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            status, data = 304, b''
+        self.server.record(self.path, self.client_address, status)
+        self.send_response(status)
+        if status in (200, 304):
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """本地的排行榜 / 详情页桩服务; failures 为 {路径: 先返回几次 503}"""
+    daemon_threads = True
+
+    def __init__(self, pageSize=10, cars=25, missing=(), failures=None, delay=0):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.pageSize = pageSize
+        self.cars = cars
+        self.missing = set(missing)
+        self.failures = dict(failures or {})
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.hits = []
+        self.connections = set()
+        self.active = self.maxActive = 0
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+    def record(self, path, clientAddress, status):
+        with self.lock:
+            self.hits.append((time.monotonic(), path, status))
+            self.connections.add(clientAddress)
+
+    def respond(self, path):
+        with self.lock:
+            if self.failures.get(path):
+                self.failures[path] -= 1
+                return 503, ''
+            self.active += 1
+            self.maxActive = max(self.maxActive, self.active)
+        try:
+            time.sleep(self.delay)
+            if path.startswith('/rank'):
+                offset = int(path.rpartition('offset=')[2])
+                ids = range(offset + 1, min(offset + self.pageSize, self.cars) + 1)
+                return 200, json.dumps({'data': {'list': [rankCar(i) for i in ids]}})
+            seriesId = int(path.rpartition('-')[2])
+            if seriesId in self.missing:
+                return 404, ''
+            return 200, detailPage(seriesId)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def loadSpiders():
+    spec = importlib.util.spec_from_file_location('spiders', os.path.join(settings.BASE_DIR, 'spiderMan', 'spiders.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class CrawlerTests(SimpleTestCase):
+
+    def test_retries_transient_errors(self):
+        with StubServer(failures={'/auto/params-carIds-x-1': 2}) as server:
+            with Fetcher(retries=3, backoff=0.01, rate=0) as fetcher:
+                self.assertIn('紧凑型SUV', fetcher.get(server.url + '/auto/params-carIds-x-1').text)
+                self.assertEqual(fetcher.stats, {'requests': 3, 'retries': 2})
+
+    def test_gives_up_after_retries(self):
+        with StubServer(failures={'/auto/params-carIds-x-1': 5}) as server:
+            with Fetcher(retries=2, backoff=0.01, rate=0) as fetcher:
+                with self.assertRaises(requests.HTTPError):
+                    fetcher.get(server.url + '/auto/params-carIds-x-1')
+                self.assertEqual(fetcher.stats['requests'], 3)
+
+    def test_rate_limit_per_host(self):
+        limiter = RateLimiter(50)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.wait('a')
+        limiter.wait('b')
+        self.assertGreaterEqual(time.monotonic() - start, 5 * 0.02 - 0.005)
+
+    def test_bounded_concurrency_on_pooled_connections(self):
+        with StubServer(delay=0.05) as server:
+            with Fetcher(workers=4, rate=0) as fetcher:
+                urls = [server.url + '/auto/params-carIds-x-%d' % i for i in range(1, 21)]
+                self.assertEqual(len(list(fetcher.map(fetcher.get, urls))), 20)
+            self.assertLessEqual(server.maxActive, 4)
+            self.assertGreater(server.maxActive, 1)
+            # 连接被复用, 不是每个请求一个新连接
+            self.assertLessEqual(len(server.connections), 4)
+
+    def test_imap_reads_input_lazily(self):
+        pulled = []
+
+        def items():
+            for i in range(100):
+                pulled.append(i)
+                yield i
+
+        with Fetcher(workers=2, rate=0) as fetcher:
+            results = fetcher.imap(lambda i: i * 2, items(), window=3)
+            self.assertEqual(next(results), 0)
+            self.assertEqual(len(pulled), 3)
+            self.assertEqual(list(results), [i * 2 for i in range(1, 100)])
+
+
+class SpiderCrawlTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+        self.spiders = loadSpiders()
+
+    def crawl(self, server, **attributes):
+        spiderObj = self.spiders.spider()
+        # 只写 CSV, 不入库
+        spiderObj.writeCsv = True
+        spiderObj.saveToDatabase = False
+        spiderObj.__dict__.update(attributes)
+        spiderObj.spiderUrl = server.url + '/rank?count=10'
+        spiderObj.detailUrl = server.url + '/auto/params-carIds-x-%s'
+        spiderObj.rate = 0
+        spiderObj.backoff = 0.01
+        spiderObj.init()
+        with mock.patch('builtins.print'):
+            spiderObj.main()
+        with open('temp.csv', encoding='utf-8') as f:
+            return list(csv.reader(f))[1:]
+
+    def detailHits(self, server):
+        return sorted(int(path.rpartition('-')[2]) for _, path, _ in server.hits if path.startswith('/auto/'))
+
+    def test_crawl_stops_at_empty_page(self):
+        with StubServer(cars=25, failures={'/auto/params-carIds-x-12': 1}) as server:
+            rows = self.crawl(server)
+        self.assertEqual([row[1] for row in rows], ['车型%d' % i for i in range(1, 26)])
+        self.assertEqual(rows[0][7:], ['紧凑型SUV', '汽油', '2025.01', '3年或10万公里'])
+        with CheckpointStore('crawlCheckpoint.sqlite3') as store:
+            self.assertEqual(store.nextOffset(), 25)
+            self.assertEqual(store.counts(), {STORED: 25})
+
+    def test_failed_detail_is_retried_on_next_run(self):
+        with StubServer(cars=10, missing={3}) as server:
+            rows = self.crawl(server)
+        self.assertEqual(len(rows), 9)
+        self.assertNotIn('车型3', [row[1] for row in rows])
+        with StubServer(cars=10) as server:
+            rows = self.crawl(server)
+            self.assertEqual(self.detailHits(server), [3])
+        self.assertEqual(sorted(row[1] for row in rows), sorted('车型%d' % i for i in range(1, 11)))
+
+    def test_resumes_after_crash_without_refetching(self):
+        saveToCsv = self.spiders.spider.save_to_csv
+        saved = []
+
+        def crashingSave(spiderObj, carData):
+            if len(saved) == 13:
+                raise KeyboardInterrupt
+            saved.append(carData)
+            saveToCsv(spiderObj, carData)
+
+        with StubServer(cars=25) as server:
+            with mock.patch.object(self.spiders.spider, 'save_to_csv', crashingSave):
+                with self.assertRaises(KeyboardInterrupt):
+                    self.crawl(server)
+            firstHits = self.detailHits(server)
+            server.hits.clear()
+            rows = self.crawl(server)
+            secondHits = self.detailHits(server)
+        self.assertEqual([row[1] for row in rows], ['车型%d' % i for i in range(1, 26)])
+        # 第二页的第 4 辆车已解析但未写入, 不需要重新请求
+        self.assertNotIn(14, secondHits)
+        self.assertFalse(set(range(1, 14)) & set(secondHits))
+        self.assertEqual(sorted(set(firstHits + secondHits)), list(range(1, 26)))
+
+    def test_same_month_resumes_and_new_month_starts_over(self):
+        with StubServer(cars=15) as server:
+            self.crawl(server, rankMonth='2025-10')
+        with StubServer(cars=15) as server:
+            self.assertEqual(self.crawl(server, rankMonth='2025-10')[15:], [])
+            self.assertEqual(self.detailHits(server), [])
+        with StubServer(cars=15) as server:
+            rows = self.crawl(server, rankMonth='2025-11')
+        self.assertEqual([row[1] for row in rows[15:]], ['车型%d' % i for i in range(1, 16)])
+        with CheckpointStore('crawlCheckpoint.sqlite3') as store:
+            self.assertEqual((store.get('rankMonth'), store.nextOffset()), ('2025-11', 15))
+
+    def test_continues_from_legacy_page_file(self):
+        with open('spiderPage.txt', 'w') as f:
+            f.write('0\n10\n20')
+        with StubServer(cars=25) as server:
+            rows = self.crawl(server)
+        self.assertEqual([row[1] for row in rows], ['车型%d' % i for i in range(21, 26)])
+
+    def test_recrawl_only_fetches_new_series(self):
+        with StubServer(cars=25) as server:
+            self.crawl(server, rankMonth='2025-10')
+        # 下个月的排行榜多了 5 个车系; 断点随月份自动清空, 详情页来自缓存
+        with StubServer(cars=30) as server:
+            rows = self.crawl(server, rankMonth='2025-11')
+            self.assertEqual(self.detailHits(server), list(range(26, 31)))
+        self.assertEqual(len(rows), 55)
+        self.assertEqual(rows[-1][7:], ['紧凑型SUV', '汽油', '2025.01', '3年或10万公里'])
+
+    def test_expired_pages_are_revalidated(self):
+        with StubServer(cars=10) as server:
+            self.crawl(server, pageCacheTtl=0)
+        with StubServer(cars=10) as server:
+            rows = self.crawl(server, pageCacheTtl=0, restart=True)
+            statuses = [status for _, path, status in server.hits if path.startswith('/auto/')]
+        self.assertEqual(statuses, [304] * 10)
+        self.assertEqual(rows[-1][7:], ['紧凑型SUV', '汽油', '2025.01', '3年或10万公里'])
+
+
+
+@override_settings(DASHBOARD_READ_DATABASE=None)
+class SpiderPipelineTests(TransactionTestCase):
+    """边爬边入库: 数据不经过 temp.csv, 每批写入后大屏即可看到"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+        self.spiders = loadSpiders()
+
+    def crawl(self, server, **attributes):
+        spiderObj = self.spiders.spider()
+        spiderObj.spiderUrl = server.url + '/rank?count=10'
+        spiderObj.detailUrl = server.url + '/auto/params-carIds-x-%s'
+        spiderObj.rate = 0
+        spiderObj.backoff = 0.01
+        spiderObj.rankMonth = '2025-10'
+        spiderObj.__dict__.update(attributes)
+        with mock.patch('builtins.print'):
+            spiderObj.main()
+
+    def test_rows_are_stored_while_crawling(self):
+        upsertCars = self.spiders.upsertCars
+        detailHits = []
+
+        def recordingUpsert(rows, **kwargs):
+            detailHits.append(len([hit for hit in server.hits if hit[1].startswith('/auto/')]))
+            return upsertCars(rows, **kwargs)
+
+        with StubServer(cars=25, delay=0.02) as server:
+            with mock.patch.object(self.spiders, 'upsertCars', recordingUpsert), \
+                    mock.patch.object(self.spiders, 'rebuildDashboard', wraps=self.spiders.rebuildDashboard) as rebuild:
+                self.crawl(server, workers=2, loadBatchSize=5)
+        self.assertEqual(len(detailHits), 5)
+        # 不再每批重建, 只在结束时重建一次
+        self.assertEqual(rebuild.call_count, 1)
+        # 第一批写入时还有详情页没有请求
+        self.assertLess(detailHits[0], 25)
+        self.assertFalse(os.path.exists('temp.csv'))
+        self.assertEqual(sorted(CarInfomation.objects.values_list('rank', flat=True)), list(range(1, 26)))
+        self.assertEqual(set(CarInfomation.objects.values_list('rankMonth', flat=True)), {'2025-10'})
+        self.assertEqual(DashboardSnapshot.objects.get().version, getDataVersion())
+        self.assertEqual(checkAggregates(), [])
+        with CheckpointStore('crawlCheckpoint.sqlite3') as store:
+            self.assertEqual(store.counts(), {STORED: 25})
+
+    def test_recrawl_updates_rows_and_optional_csv(self):
+        with StubServer(cars=12) as server:
+            self.crawl(server)
+        with StubServer(cars=15) as server:
+            self.crawl(server, writeCsv=True, restart=True)
+        self.assertEqual(CarInfomation.objects.count(), 15)
+        with open('temp.csv', encoding='utf-8') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0][1], 'carName')
+        self.assertEqual([row[1] for row in rows[1:]], ['车型%d' % i for i in range(1, 16)])
+
+    def test_duplicate_names_are_stored_once(self):
+        # 排行榜中 8 号以后的车系车名都是 "车型8"
+        def rankCarWithDuplicates(seriesId, rankCar=rankCar):
+            return dict(rankCar(seriesId), series_name='车型%d' % min(seriesId, 8))
+
+        with mock.patch(__name__ + '.rankCar', rankCarWithDuplicates):
+            with StubServer(cars=10) as server:
+                self.crawl(server)
+        self.assertEqual(CarInfomation.objects.count(), 8)
+        self.assertEqual(CarInfomation.objects.get(carName='车型8').rank, 8)
+        with CheckpointStore('crawlCheckpoint.sqlite3') as store:
+            self.assertEqual(store.counts(), {STORED: 10})
+
+    def test_dashboard_is_rebuilt_after_parquet_sync(self):
+        calls = mock.Mock()
+        with StubServer(cars=25, delay=0.02) as server:
+            with mock.patch.object(self.spiders, 'syncParquet', wraps=self.spiders.syncParquet) as syncParquet, \
+                    mock.patch.object(self.spiders, 'rebuildDashboard', wraps=self.spiders.rebuildDashboard) as rebuild:
+                calls.attach_mock(syncParquet, 'syncParquet')
+                calls.attach_mock(rebuild, 'rebuildDashboard')
+                self.crawl(server, workers=2, loadBatchSize=5)
+        # 爬取期间不重建, 结束时先同步 Parquet 再重建, 大屏不会读到旧的导出
+        self.assertEqual([call[0] for call in calls.mock_calls], ['syncParquet', 'rebuildDashboard'])
+        self.assertEqual(syncParquet.call_args[0][1:], (5, 0))
+
+    def runScript(self, *args):
+        with mock.patch('sys.argv', ['spiders.py', *args]), mock.patch('builtins.print'), \
+                mock.patch('myApp.utils.carLoader.upsertCars') as upsertCars, \
+                mock.patch('myApp.utils.dashboardSnapshot.rebuildDashboard'), \
+                mock.patch('myApp.utils.crawlCheckpoint.CheckpointStore', side_effect=RuntimeError('crawl')):
+            runpy.run_path(os.path.join(settings.BASE_DIR, 'spiderMan', 'spiders.py'), run_name='__main__')
+        return upsertCars
+
+    def test_script_loads_csv_by_default(self):
+        with open('temp.csv', 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows([['brand', 'carName'], ['品牌', '车型1']])
+        self.assertEqual(self.runScript().call_count, 1)
+        self.assertRaisesMessage(RuntimeError, 'crawl', self.runScript, 'crawl')
+
+
+class PipelineTests(SimpleTestCase):
+
+    def test_backpressure_bounds_items_in_flight(self):
+        produced = []
+        lead = []
+
+        def produce(_):
+            for i in range(200):
+                produced.append(i)
+                yield i
+
+        def consume(items):
+            for count, item in enumerate(items, 1):
+                lead.append(len(produced) - count)
+                time.sleep(0.001)
+                yield item
+
+        stats = Pipeline(queueSize=4).add('produce', produce).add('consume', consume).run()
+        self.assertEqual([stage.items for stage in stats], [200, 200])
+        # 队列中的 4 条加上生产者手里等待放入的 1 条
+        self.assertLessEqual(max(lead), 5)
+        self.assertGreater(stats[0].waitOut, 0)
+
+    def test_error_stops_all_stages(self):
+        def produce(_):
+            i = 0
+            while True:
+                i += 1
+                yield i
+
+        def fail(items):
+            for item in items:
+                if item == 50:
+                    raise ValueError(item)
+                yield item
+
+        pipeline = Pipeline(queueSize=8).add('produce', produce).add('fail', fail).add('drain', lambda items: items)
+        with self.assertRaises(ValueError):
+            pipeline.run()
+        self.assertEqual(pipeline.stats[1].items, 49)
+
+    def test_batched_and_dedupe(self):
+        self.assertEqual(list(batched(range(7), 3)), [[0, 1, 2], [3, 4, 5], [6]])
+
+        def slow():
+            yield 1
+            time.sleep(0.05)
+            yield 2
+            yield 3
+
+        self.assertEqual(list(batched(slow(), 10, interval=0.01)), [[1, 2], [3]])
+        skipped = []
+        items = ['a', 'b', 'a', 'c', 'd', 'b', 'a']
+        self.assertEqual(list(dedupe(items, key=str, window=2, skipped=skipped.append)), ['a', 'b', 'c', 'd', 'b', 'a'])
+        self.assertEqual(skipped, ['a'])
+
+class PageCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_identical_pages_are_stored_once(self):
+        with PageCache(self.directory) as cache:
+            cache.store(1, detailPage(1))
+            cache.store(2, detailPage(1))
+            self.assertEqual(cache.lookup(1).digest, cache.lookup(2).digest)
+            self.assertEqual(cache.read(cache.lookup(2)), detailPage(1))
+            self.assertLess(cache.totalBytes, len(detailPage(1).encode('utf-8')))
+
+    def test_evicts_least_recently_used(self):
+        pages = {i: detailPage(i, carModel='车型' * i) for i in range(1, 5)}
+        with PageCache(self.directory) as cache:
+            cache.store(1, pages[1])
+            size = cache.totalBytes
+            cache.maxBytes = size * 3 + size // 2
+            cache.store(2, pages[2])
+            cache.store(3, pages[3])
+            cache.touch(1)
+            cache.store(4, pages[4])
+            self.assertIsNone(cache.lookup(2))
+            self.assertEqual(cache.read(cache.lookup(1)), pages[1])
+            self.assertLessEqual(cache.totalBytes, cache.maxBytes)
+            totalBytes = cache.totalBytes
+        with PageCache(self.directory) as cache:
+            # 重新打开后仍是这三页, 被淘汰的文件已删除
+            self.assertEqual(cache.totalBytes, totalBytes)
+            self.assertEqual([cache.read(cache.lookup(i)) for i in (1, 3, 4)], [pages[1], pages[3], pages[4]])
+            files = [name for _, _, names in os.walk(os.path.join(self.directory, 'objects')) for name in names]
+            self.assertEqual(len(files), 3)
+
+
+class DetailExtractorTests(SimpleTestCase):
+    """myApp/testdata/detailPages 中的样例页面, 期望结果见 expected.json"""
+
+    def setUp(self):
+        with open(os.path.join(FIXTURE_DIR, 'expected.json'), encoding='utf-8') as f:
+            self.expected = json.load(f)
+
+    def page(self, name):
+        with open(os.path.join(FIXTURE_DIR, name), encoding='utf-8') as f:
+            return f.read()
+
+    def test_fixtures(self):
+        for name, expected in self.expected.items():
+            with self.subTest(name=name):
+                html = self.page(name)
+                if expected is None:
+                    self.assertRaises(ValueError, extractDetail, html)
+                    self.assertRaises(IndexError, legacyExtract, html)
+                else:
+                    self.assertEqual(extractDetail(html), expected)
+                    # 与改造前逐个 xpath 的结果相同
+                    self.assertEqual(extractFromDom(html), legacyExtract(html))
+
+    def test_saved_real_pages(self):
+        # 真实页面由 bench_extract --cache spiderMan/pageCache --save 从详情页缓存中保存
+        pages = list(fixturePages(REAL_PAGE_DIR)) if os.path.isdir(REAL_PAGE_DIR) else []
+        if not pages:
+            self.skipTest('%s 中没有保存的真实详情页' % REAL_PAGE_DIR)
+        for index, html in enumerate(pages):
+            with self.subTest(page=index):
+                values = extractFromState(html)
+                self.assertIsNotNone(values)
+                self.assertEqual(values, extractFromDom(html))
+                self.assertEqual(values, legacyExtract(html))
+
+    def withState(self, html, state):
+        return html.replace('</body>', '<script id="__NEXT_DATA__" type="application/json">%s</script></body>'
+                            % json.dumps(state, ensure_ascii=False), 1)
+
+    def test_embedded_state_is_preferred(self):
+        html = self.page('suv_gasoline.html')
+        self.assertIsNone(extractFromState(html))
+        info = {'jb': {'value': '紧凑型SUV'}, 'fuel_form': {'value': '汽油'}, 'market_time': {'value': '2023.03'},
+                'period': {'text': '三年或10万公里'}}
+        html = self.withState(html, {'props': {'pageProps': {'rawData': {'car_info': [{'info': info}]}}}})
+        self.assertEqual(extractDetail(html), ['紧凑型SUV', '汽油', '2023.03', '三年或10万公里'])
+
+    def test_incomplete_state_falls_back_to_dom(self):
+        html = self.page('suv_gasoline.html')
+        for state in ({'car_info': [{'info': {'jb': '紧凑型SUV', 'fuel_form': '汽油', 'market_time': '2023.03'}}]},
+                      {'car_info': [{'info': {'jb': '紧凑型SUV', 'fuel_form': '汽油', 'market_time': '2023.03', 'period': ''}}]}):
+            with self.subTest(state=state):
+                page = self.withState(html, state)
+                self.assertIsNone(extractFromState(page))
+                self.assertEqual(extractDetail(page), extractFromDom(html))
+        page = html.replace('</body>', '<script id="__NEXT_DATA__" type="application/json">{</script></body>', 1)
+        self.assertEqual(extractDetail(page), extractFromDom(html))
+
+    def test_value_outside_fragment_falls_back_to_full_page(self):
+        # 片段中第一个保修行为空, 有文本的保修行在其他参数行之后
+        html = self.page('suv_gasoline.html')
+        html = html.replace('data-row-anchor="period"', 'data-row-anchor="period_old"', 1)
+        html = html.replace('</div></div><script', '<div data-row-anchor="period"><div>质保</div><div></div></div>'
+                            '<div data-row-anchor="period"><div>质保</div><div><div>终身质保</div></div></div></div></div><script', 1)
+        self.assertEqual(extractFromDom(html)[3], '终身质保')
+        self.assertEqual(extractFromDom(html), legacyExtract(html))
+
+    def test_empty_page(self):
+        self.assertRaises(ValueError, extractDetail, '')
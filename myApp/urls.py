@@ -1,11 +1,29 @@
+from django.conf import settings
 from django.urls import path
 from myApp import views
+from myApp import asyncViews
 
-urlpatterns = [
-    path("center/",views.center,name='center' ),
-    path("centerLeft/",views.centerLeft,name='centerLeft' ),
-    path("bottomLeft/", views.bottomLeft, name='bottomLeft'),
-    path("centerRight/", views.centerRight, name='centerRight'),
-    path("centerRightChange/<int:energyType>", views.centerRightChange, name='centerRightChange'),
-    path("bottomRight/", views.bottomRight, name='bottomRight')
-]
\ No newline at end of file
+#各面板的路由和视图函数名, views 和 asyncViews 中同名
+PANEL_ROUTES = [
+    ("dashboard/", 'dashboard'),
+    ("center/", 'center'),
+    ("centerLeft/", 'centerLeft'),
+    ("bottomLeft/", 'bottomLeft'),
+    ("centerRight/", 'centerRight'),
+    ("centerRightChange/<int:energyType>", 'centerRightChange'),
+    ("bottomRight/", 'bottomRight'),
+]
+
+def panelRoutes(prefix, module, namePrefix=''):
+    return [path(prefix + route, getattr(module, name), name=namePrefix + name) for route, name in PANEL_ROUTES]
+
+#以 ASGI 启动时 (见 asgi.py) 各面板路由使用异步视图
+panelViews = asyncViews if settings.DASHBOARD_ASYNC_VIEWS else views
+
+urlpatterns = panelRoutes("", panelViews) + [
+    path("dashboard/status/",views.dashboardStatus,name='dashboardStatus' ),
+    path("dashboard/stream/",views.dashboardStream,name='dashboardStream' ),
+    path("aggregate/",views.aggregate,name='aggregate' ),
+]
+#同步 / 异步两套视图始终都可以直接访问, 便于对比
+urlpatterns += panelRoutes("sync/", views, 'sync_') + panelRoutes("async/", asyncViews, 'async_')
@@ -0,0 +1,141 @@
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from myApp.models import CarAggregate
+from .carAggregates import DIMENSIONS
+from .carSnapshot import getSnapshot, topGroups
+from . import analytics
+
+# 可分组 / 可过滤的字段
+GROUP_FIELDS = ('brand', 'carModel', 'manufacturer', 'energyType')
+METRICS = ('count', 'sum', 'avg')
+# 可统计的数值字段, 价格按每辆车 (最低价 + 最高价) / 2 计
+METRIC_FIELDS = ('saleVolume', 'price')
+DEFAULT_TOP = 10
+MAX_TOP = 100
+
+# 查询计划: 参数校验、规整后的结果, 以及应该从哪里取数
+# source 为 'aggregate' 时直接读 CarAggregate 计数器 (ORDER BY ... LIMIT), 否则在列式快照上计算
+AggregatePlan = namedtuple('AggregatePlan', 'groupBy metric field filters top source')
+
+
+def parseMetric(metric):
+    """'count' / 'sum:saleVolume' / 'avg:price' 拆成 (metric, field)"""
+    name, _, field = (metric or 'count').partition(':')
+    if name not in METRICS:
+        raise ValueError('metric 只能是 %s' % ' / '.join(METRICS))
+    if name == 'count':
+        if field:
+            raise ValueError('count 不需要指定字段')
+        return name, None
+    if field not in METRIC_FIELDS:
+        raise ValueError('%s 的字段只能是 %s' % (name, ' / '.join(METRIC_FIELDS)))
+    return name, field
+
+
+def parseFilters(items):
+    """['energyType:汽油', 'brand:比亚迪,brand:特斯拉'] -> ((field, (value, ...)), ...)
+    同一字段的多个取值是"或", 不同字段之间是"且"
+    """
+    filters = {}
+    for item in items:
+        for part in item.split(','):
+            if not part:
+                continue
+            field, sep, value = part.partition(':')
+            if not sep or field not in GROUP_FIELDS:
+                raise ValueError('filter 格式为 字段:取值, 字段只能是 %s' % ' / '.join(GROUP_FIELDS))
+            filters.setdefault(field, set()).add(value)
+    return tuple(sorted((field, tuple(sorted(values))) for field, values in filters.items()))
+
+
+@lru_cache(maxsize=256)
+def compilePlan(groupBy, metric='count', filters=(), top=DEFAULT_TOP):
+    """校验参数并生成查询计划, 相同参数的计划直接复用"""
+    if groupBy not in GROUP_FIELDS:
+        raise ValueError('group_by 只能是 %s' % ' / '.join(GROUP_FIELDS))
+    metric, field = parseMetric(metric)
+    filters = parseFilters(filters)
+    top = int(top)
+    if not 0 < top <= MAX_TOP:
+        raise ValueError('top 必须在 1 到 %d 之间' % MAX_TOP)
+    # 计数器只维护了部分维度, 也没有记录有价格的车辆数, 所以均价仍走快照
+    useCounters = (not filters and groupBy in DIMENSIONS
+                   and (metric == 'count' or (metric == 'sum' and field == 'saleVolume')))
+    return AggregatePlan(groupBy, metric, field, filters, top, 'aggregate' if useCounters else 'snapshot')
+
+
+def counterQuery(plan):
+    """从 CarAggregate 取前 top 组, 与快照路径一样按 (值, 取值) 降序"""
+    column = 'count' if plan.metric == 'count' else 'volumeSum'
+    return (CarAggregate.objects.filter(dimension=plan.groupBy)
+            .order_by('-' + column, '-key')
+            .values_list('key', column)[:plan.top])
+
+
+def metricValues(snapshot, field):
+    if field == 'saleVolume':
+        return snapshot.saleVolume
+    return (snapshot.minPrice + snapshot.maxPrice) / 2
+
+
+def filterMask(snapshot, filters):
+    mask = np.ones(snapshot.size, dtype=bool)
+    for field, values in filters:
+        column = getattr(snapshot, field)
+        codes = [code for code in map(column.code, values) if code != -1]
+        mask &= np.isin(column.codes, codes)
+    return mask
+
+
+def snapshotGroups(snapshot, plan):
+    """在快照上按分组计算指标, 返回 (分组列, 每组的值); 没有数据的组值为 nan"""
+    column = getattr(snapshot, plan.groupBy)
+    codes = column.codes
+    weights = None
+    if plan.metric != 'count':
+        weights = metricValues(snapshot, plan.field)
+    if plan.filters:
+        mask = filterMask(snapshot, plan.filters)
+        codes = codes[mask]
+        if weights is not None:
+            weights = weights[mask]
+    if weights is not None:
+        # 没有价格的车不参与价格的合计和均值
+        valid = ~np.isnan(weights)
+        codes, weights = codes[valid], weights[valid]
+    counts = np.bincount(codes, minlength=len(column.labels))
+    if plan.metric == 'count':
+        values = counts.astype(np.float64)
+    else:
+        # 过滤后没有数据时 bincount 返回整数数组, 统一转成浮点
+        values = np.bincount(codes, weights=weights, minlength=len(column.labels)).astype(np.float64)
+        if plan.metric == 'avg':
+            values = values / np.maximum(counts, 1)
+    values[counts == 0] = np.nan
+    return column, values
+
+
+def formatValue(plan, value):
+    if plan.metric == 'count' or (plan.metric == 'sum' and plan.field == 'saleVolume'):
+        return int(value)
+    return round(float(value), 2)
+
+
+def runPlan(plan):
+    if plan.source == 'aggregate':
+        groups = counterQuery(plan)
+    elif analytics.enabled():
+        return analytics.runPlan(plan)
+    else:
+        column, values = snapshotGroups(getSnapshot(), plan)
+        # 堆取前 k 组, O(n log k)
+        groups = topGroups(column, values, plan.top)
+    return [{'name': name, 'value': formatValue(plan, value)} for name, value in groups]
+
+
+def getAggregate(groupBy, metric='count', filters=(), top=DEFAULT_TOP):
+    """通用的 "按 X 分组, 统计 Y, 取前 N" 查询, 返回 [{'name':..., 'value':...}, ...]"""
+    return runPlan(compilePlan(groupBy, metric, tuple(filters), top))
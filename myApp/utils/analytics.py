@@ -0,0 +1,372 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from myApp.models import CarInfomation
+from .dataVersion import getDataVersion
+from . import aggregateEngine
+from . import getBottomLeftData
+from . import getBottomRightData
+from . import getCenterData
+from . import getCenterRightData
+
+# DuckDB 是可选依赖, 只有 DASHBOARD_ANALYTICS_BACKEND = "duckdb" 时才需要
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 fcntl, 只在进程内串行导出
+    fcntl = None
+
+# 导出到 Parquet 的列
+EXPORT_FIELDS = ('id', 'brand', 'carName', 'carImg', 'sale_volume', 'min_price', 'max_price',
+                 'manufacturer', 'rank', 'carModel', 'energyType', 'marketTime', 'insure')
+# 每个分片的行数
+PART_ROWS = 500000
+MANIFEST = 'manifest.json'
+# 多个进程之间串行导出用的锁文件; 正在写的导出目录带这个前缀, 写完后整体改名
+LOCK_FILE = '.export.lock'
+TEMP_PREFIX = '.tmp-'
+# 与快照中按 float64 计算的价格一致
+PRICE_EXPR = {
+    'min': 'CAST(min_price AS DOUBLE)',
+    'avg': '(CAST(min_price AS DOUBLE) + CAST(max_price AS DOUBLE)) / 2',
+}
+
+_local = threading.local()
+# 同一进程内只有一个线程在导出, 可重入 (ensureExported -> exportParquet)
+_exportLock = threading.RLock()
+# 最近一次读到的 manifest: (路径, 文件标识, 内容); 文件没变时不再重新解析
+_manifest = None
+
+
+def enabled():
+    return getattr(settings, 'DASHBOARD_ANALYTICS_BACKEND', 'orm') == 'duckdb'
+
+
+def analyticsDir():
+    return str(getattr(settings, 'DASHBOARD_ANALYTICS_DIR', os.path.join(settings.BASE_DIR, 'analytics')))
+
+
+def requireDuckdb():
+    if duckdb is None:
+        raise ImproperlyConfigured('DASHBOARD_ANALYTICS_BACKEND = "duckdb" 需要先 pip install duckdb')
+
+
+def manifestPath():
+    return os.path.join(analyticsDir(), MANIFEST)
+
+
+def readManifest():
+    """当前的 manifest; 文件没有被替换过时直接返回内存中的副本, 只需一次 stat"""
+    global _manifest
+    path = manifestPath()
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    cached = _manifest
+    if cached is not None and cached[0] == path and cached[1] == key:
+        return cached[2]
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    _manifest = (path, key, manifest)
+    return manifest
+
+
+def writeManifest(manifest):
+    # 先写临时文件再替换, 读的一方不会看到写了一半的 manifest
+    path = manifestPath()
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(path + '.tmp', path)
+
+
+@contextmanager
+def exportLock():
+    """导出和追加都在这个锁内进行: 进程内的线程锁加上 analytics 目录下的文件锁, 多个进程也只有一个在导出"""
+    with _exportLock:
+        if getattr(_local, 'exporting', False):
+            yield
+            return
+        root = analyticsDir()
+        os.makedirs(root, exist_ok=True)
+        with open(os.path.join(root, LOCK_FILE), 'a') as lockFile:
+            if fcntl is not None:
+                fcntl.flock(lockFile, fcntl.LOCK_EX)
+            _local.exporting = True
+            try:
+                yield
+            finally:
+                _local.exporting = False
+                if fcntl is not None:
+                    fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+
+@contextmanager
+def pinVersion(version):
+    """with 块内的查询认定数据版本为 version, 不再逐次查询; rebuildDashboard 计算各面板时使用"""
+    previous = getattr(_local, 'version', None)
+    _local.version = version
+    try:
+        yield
+    finally:
+        _local.version = previous
+
+
+def sqlString(value):
+    return "'%s'" % value.replace("'", "''")
+
+
+def writePart(directory, index, rows):
+    """把一批 values_list 行写成一个 Parquet 分片, 返回文件名"""
+    import pandas as pd
+
+    columns = dict(zip(EXPORT_FIELDS, zip(*rows))) if rows else {field: () for field in EXPORT_FIELDS}
+    frame = pd.DataFrame({field: list(columns[field]) for field in EXPORT_FIELDS})
+    for field in ('min_price', 'max_price'):
+        # 没有价格的保持为 NULL, 不能变成 NaN
+        frame[field] = pd.array([None if value is None else float(value) for value in columns[field]], dtype='Float64')
+    for field in ('id', 'sale_volume', 'rank'):
+        frame[field] = frame[field].astype('int64')
+    name = 'part-%05d.parquet' % index
+    connection = duckdb.connect()
+    try:
+        connection.register('frame', frame)
+        connection.execute(
+            'COPY (SELECT * REPLACE (CAST(min_price AS DECIMAL(10, 2)) AS min_price,'
+            ' CAST(max_price AS DECIMAL(10, 2)) AS max_price) FROM frame)'
+            ' TO %s (FORMAT PARQUET, COMPRESSION ZSTD)' % sqlString(os.path.join(directory, name)))
+    finally:
+        connection.close()
+    return name
+
+
+def writeParts(directory, cars, start=0):
+    """按 PART_ROWS 分批写出, 返回 (分片文件名列表, 最大 id)"""
+    rows = cars.order_by('id').values_list(*EXPORT_FIELDS).iterator(chunk_size=10000)
+    parts = []
+    maxId = 0
+    while True:
+        batch = list(islice(rows, PART_ROWS))
+        if batch:
+            parts.append(writePart(directory, start + len(parts), batch))
+            maxId = batch[-1][0]
+        if len(batch) < PART_ROWS:
+            return parts, maxId
+
+
+def exportParquet(version=None):
+    """把 CarInfomation 全量导出为一组新的 Parquet 分片, 写完后切换 manifest
+
+    在主库事务内读取, 导出的数据与记录的版本号一致; 先写到临时目录, 写完后整体改名, 再切换 manifest;
+    旧目录保留一份, 正在查询的线程不受影响
+    """
+    requireDuckdb()
+    with exportLock():
+        root = analyticsDir()
+        with transaction.atomic():
+            if version is None:
+                version = getDataVersion()
+            name = 'cars-%d-%s' % (version, uuid.uuid4().hex[:8])
+            with tempDirectory(root) as temp:
+                parts, maxId = writeParts(temp, CarInfomation.objects.all())
+                if not parts:
+                    # 空表也写一个只有表结构的分片, 查询才有 cars 视图可用
+                    parts = [writePart(temp, 0, [])]
+                os.rename(temp, os.path.join(root, name))
+        previous = readManifest()
+        manifest = {'version': version, 'maxId': maxId, 'directory': name, 'parts': parts}
+        writeManifest(manifest)
+        removeStaleExports(keep={name, previous and previous['directory']})
+    return manifest
+
+
+def appendParquet(before, loads=1):
+    """入库后调用; 如果已导出的正好是入库前的版本 before, 且期间只有这 loads 次入库, 只把新增的行追加为新分片
+
+    新分片先写到临时目录, 写完后逐个改名移入当前导出目录, 再切换 manifest
+    """
+    requireDuckdb()
+    with exportLock():
+        manifest = readManifest()
+        with transaction.atomic():
+            version = getDataVersion()
+            if manifest is None or manifest['version'] != before or version != before + loads:
+                return exportParquet(version)
+            directory = os.path.join(analyticsDir(), manifest['directory'])
+            newCars = CarInfomation.objects.filter(id__gt=manifest['maxId'])
+            with tempDirectory(analyticsDir()) as temp:
+                parts, maxId = writeParts(temp, newCars, start=len(manifest['parts']))
+                for part in parts:
+                    os.replace(os.path.join(temp, part), os.path.join(directory, part))
+        manifest = dict(manifest, version=version, maxId=max(maxId, manifest['maxId']),
+                        parts=manifest['parts'] + parts)
+        writeManifest(manifest)
+    return manifest
+
+
+@contextmanager
+def tempDirectory(root):
+    """在 root 下建一个临时目录, 结束时如果还在 (出错或内容已移走) 就删除"""
+    temp = os.path.join(root, TEMP_PREFIX + uuid.uuid4().hex[:8])
+    os.makedirs(temp)
+    try:
+        yield temp
+    finally:
+        shutil.rmtree(temp, ignore_errors=True)
+
+
+def removeStaleExports(keep):
+    """在导出锁内调用: 删除不再使用的导出目录, 以及中途退出的进程留下的临时目录"""
+    root = analyticsDir()
+    for name in os.listdir(root):
+        if (name.startswith('cars-') and name not in keep) or name.startswith(TEMP_PREFIX):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def ensureExported():
+    """导出的版本落后于当前数据版本时 (例如后台修改过数据) 重新全量导出
+
+    当前数据版本优先取 pinVersion 设定的值; 并发的请求在导出锁上等待, 拿到锁后已经导出过的直接返回, 不重复导出
+    """
+    version = getattr(_local, 'version', None)
+    if version is None:
+        version = getDataVersion()
+    manifest = readManifest()
+    if manifest is not None and manifest['version'] >= version:
+        return manifest
+    with exportLock():
+        manifest = readManifest()
+        if manifest is None or manifest['version'] < version:
+            manifest = exportParquet()
+    return manifest
+
+
+def cursor():
+    """本线程的 DuckDB 连接, 其中的 cars 视图指向 manifest 里的全部分片"""
+    requireDuckdb()
+    manifest = ensureExported()
+    connection = getattr(_local, 'connection', None)
+    if connection is None:
+        connection = _local.connection = duckdb.connect()
+        _local.viewKey = None
+    viewKey = (manifest['directory'], tuple(manifest['parts']))
+    if _local.viewKey != viewKey:
+        files = [os.path.join(analyticsDir(), manifest['directory'], part) for part in manifest['parts']]
+        connection.execute('CREATE OR REPLACE VIEW cars AS SELECT * FROM read_parquet([%s])'
+                           % ', '.join(map(sqlString, files)))
+        _local.viewKey = viewKey
+    return connection
+
+
+def fetchDicts(sql, params=()):
+    result = cursor().execute(sql, list(params))
+    names = [column[0] for column in result.description]
+    return [dict(zip(names, row)) for row in result.fetchall()]
+
+
+def fetchRow(sql, params=()):
+    rows = fetchDicts(sql, params)
+    return rows[0] if rows else None
+
+
+# 以下函数与 myApp/utils 中同名函数的返回值完全相同, 由 dashboardSnapshot.panelSource() 选用
+
+def totalRow():
+    return fetchRow('SELECT count(*) AS count, coalesce(sum(min_price), 0) + coalesce(sum(max_price), 0) AS priceSum'
+                    ' FROM cars')
+
+
+def mostCommonRow(field):
+    # 出现次数最多的取值, 并列时取最先出现的
+    return fetchRow('SELECT %s AS key, count(*) AS count FROM cars GROUP BY %s ORDER BY count DESC, min(id) LIMIT 1'
+                    % (field, field))
+
+
+def getBaseData():
+    return getCenterData.baseData(totalRow(),
+                                  fetchRow('SELECT carName, sale_volume FROM cars ORDER BY id LIMIT 1'),
+                                  mostCommonRow('carModel'),
+                                  mostCommonRow('brand'))
+
+
+def getRollData():
+    return getCenterData.rollData(fetchDicts(
+        'SELECT brand AS key, count(*) AS count FROM cars GROUP BY brand ORDER BY count DESC, key DESC LIMIT 10'))
+
+
+def getTypeRate():
+    rows = fetchDicts("SELECT energyType, count(*) AS count FROM cars WHERE energyType IN ('汽油', '纯电动')"
+                      ' GROUP BY energyType')
+    carTypes = {row['energyType']: row['count'] for row in rows}
+    return getCenterData.typeRate(carTypes, getCenterData.totalCount(totalRow()))
+
+
+def getPieBrand():
+    rows = fetchDicts('SELECT brand AS name, sum(sale_volume) AS value FROM cars'
+                      ' GROUP BY brand ORDER BY value DESC, name DESC LIMIT 10')
+    return [{'name': row['name'], 'value': int(row['value'])} for row in rows]
+
+
+def getSquareData():
+    rows = fetchDicts('SELECT carName, sum(sale_volume) AS volume FROM cars'
+                      ' GROUP BY carName ORDER BY volume DESC, min(id) LIMIT 20')
+    prices = [row['price'] for row in fetchDicts('SELECT CAST(min_price AS DOUBLE) AS price FROM cars ORDER BY id LIMIT 20')]
+    return ([row['carName'] for row in rows],
+            [int(row['volume']) for row in rows],
+            getBottomLeftData.truncatePrices(np.array(prices, dtype=np.float64)))
+
+
+def getPriceSortDate(edges=None, mode='min'):
+    edges, labels = getCenterRightData.priceBins(edges, mode)
+    price = PRICE_EXPR[mode]
+    # 每个分界以下的数量, 相邻相减即各区间的数量; 没有价格的计入最后一档
+    sql = 'SELECT %s, count(*) FROM cars' % ', '.join(['count(*) FILTER (WHERE %s < ?)' % price] * len(edges))
+    row = cursor().execute(sql, [float(edge) for edge in edges]).fetchone()
+    return getCenterRightData.histogramData(labels, np.diff((0,) + tuple(row)))
+
+
+def getCircleData():
+    sql = 'SELECT carName, sale_volume FROM cars WHERE energyType = ? ORDER BY id LIMIT 10'
+    return tuple(
+        [[row['carName'], str(row['sale_volume']), energyType] for row in fetchDicts(sql, [energyType])]
+        for energyType in ('汽油', '纯电动')
+    )
+
+
+def getRankData():
+    rows = fetchDicts('SELECT %s FROM cars ORDER BY id' % ', '.join(getBottomRightData.RANK_FIELDS))
+    return [getBottomRightData.rankRow(row) for row in rows]
+
+
+def runPlan(plan):
+    """在 DuckDB 上执行 aggregateEngine 的查询计划, 结果与快照路径相同"""
+    if plan.metric == 'count':
+        value, having = 'count(*)', ''
+    elif plan.field == 'saleVolume':
+        value, having = '%s(sale_volume)' % plan.metric, ''
+    else:
+        price = PRICE_EXPR['avg']
+        value, having = '%s(%s)' % (plan.metric, price), ' HAVING count(%s) > 0' % price
+    where, params = [], []
+    for field, values in plan.filters:
+        where.append('%s IN (%s)' % (field, ', '.join('?' * len(values))))
+        params.extend(values)
+    sql = 'SELECT %s AS name, %s AS value FROM cars%s GROUP BY %s%s ORDER BY value DESC, name DESC LIMIT %d' % (
+        plan.groupBy, value, ' WHERE ' + ' AND '.join(where) if where else '', plan.groupBy, having, plan.top)
+    return [{'name': row['name'], 'value': aggregateEngine.formatValue(plan, row['value'])}
+            for row in fetchDicts(sql, params)]
@@ -0,0 +1,63 @@
+from asgiref.sync import sync_to_async
+
+from myApp.models import DataVersion
+from . import getBottomRightData
+from .dashboardSnapshot import PANEL_NAMES, currentPanels, panelRows, rebuildDashboard
+from .dataVersion import VERSION_ID, getDataVersion, getDataVersionMeta
+
+
+async def alist(queryset):
+    return [row async for row in queryset]
+
+
+async def agetDataVersion():
+    version = await DataVersion.objects.filter(pk=VERSION_ID).values_list('version', flat=True).afirst()
+    if version is None:
+        version = await sync_to_async(getDataVersion)()
+    return version
+
+
+async def arebuildDashboard():
+    """重建在一个主库事务内完成, 版本和所有面板读的是同一个状态, 不混用从库上的结果
+
+    django 4.2 的异步 ORM 经 sync_to_async(thread_sensitive=True) 在同一个线程中依次执行查询,
+    几条统计查询并发 await 也不会真正并行, 所以这里整体交给同步的 rebuildDashboard
+    """
+    return await sync_to_async(rebuildDashboard)()
+
+
+async def agetDashboardMeta(request=None):
+    meta = getattr(request, '_dashboardMeta', None)
+    if meta is None:
+        meta = await DataVersion.objects.filter(pk=VERSION_ID).values('version', 'updateTime').afirst()
+        if meta is None:
+            meta = await sync_to_async(getDataVersionMeta)()
+        if request is not None:
+            request._dashboardMeta = meta
+            request._dataVersion = meta['version']
+    return meta
+
+
+async def agetPanels(names=None):
+    version = await agetDataVersion()
+    panels = currentPanels(await alist(panelRows(names)), version, names)
+    if panels is None:
+        snapshot = await arebuildDashboard()
+        version = snapshot.version
+        panels = {name: snapshot.panels[name] for name in (PANEL_NAMES if names is None else names)}
+    return version, panels
+
+
+async def agetPanel(name):
+    return (await agetPanels([name]))[1][name]
+
+
+async def agetRankPage(after=None, afterId=None, limit=getBottomRightData.DEFAULT_LIMIT):
+    limit = getBottomRightData.pageLimit(limit)
+    cars = [car async for car in getBottomRightData.rankQuery(after, afterId)[:limit + 1]]
+    return getBottomRightData.rankPage(cars, limit)
+
+
+async def aiterRankData(after=None, afterId=None, chunkSize=getBottomRightData.CHUNK_SIZE):
+    async for car in getBottomRightData.rankQuery(after, afterId).aiterator(chunk_size=chunkSize):
+        yield getBottomRightData.rankRow(car)
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .dashboardSnapshot import getPanels
+from .dataVersion import getDataVersion
+
+logger = logging.getLogger(__name__)
+
+
+def formatEvent(event, data):
+    return 'event: %s\ndata: %s\n\n' % (event, json.dumps(data, ensure_ascii=False))
+
+
+class Broadcaster(object):
+    """进程内的推送中心: 只有一个协程轮询数据版本, 变化时把变动的面板广播给所有订阅者"""
+
+    def __init__(self, interval=None, queueSize=4):
+        self.interval = interval
+        self.queueSize = queueSize
+        self.subscribers = set()
+        self.version = None
+        self.panels = None
+        self.task = None
+
+    def getInterval(self):
+        if self.interval is not None:
+            return self.interval
+        return getattr(settings, 'DASHBOARD_PUSH_INTERVAL', 5)
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.queueSize)
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.watch())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, event):
+        for queue in list(self.subscribers):
+            # 慢的订阅者只保留最新的消息
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def refresh(self):
+        """检查一次数据版本, 有变化时计算差异并广播"""
+        version = await sync_to_async(getDataVersion)()
+        if version == self.version:
+            return
+        version, panels = await sync_to_async(getPanels)()
+        previous = self.panels
+        self.version, self.panels = version, panels
+        if previous is None:
+            return
+        # 不在快照中的排行榜等数据也可能变了, 版本变化时总要通知, panels 只带变动的面板
+        delta = {name: value for name, value in panels.items() if previous.get(name) != value}
+        self.publish(formatEvent('delta', {'version': version, 'panels': delta}))
+
+    async def watch(self):
+        while self.subscribers:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception('dashboard broadcaster refresh failed')
+            await asyncio.sleep(self.getInterval())
+
+
+broadcaster = Broadcaster()
+
+
+async def eventStream(queue, heartbeat=15, maxAge=600):
+    """SSE 输出: 先发当前版本, 之后转发广播; 空闲时发心跳, 超过 maxAge 秒断开让客户端重连"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + maxAge
+    try:
+        if broadcaster.version is None:
+            await broadcaster.refresh()
+        yield 'retry: 5000\n' + formatEvent('version', {'version': broadcaster.version})
+        while loop.time() < deadline:
+            try:
+                yield await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+    finally:
+        broadcaster.unsubscribe(queue)
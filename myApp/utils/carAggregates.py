@@ -0,0 +1,194 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Min, Sum, Value, When
+from django.db.models.functions import Coalesce, Least
+
+from myApp.models import CarAggregate, CarInfomation
+from .dataVersion import batchUpdate
+
+# 需要维护分组统计的维度
+DIMENSIONS = ('brand', 'carModel', 'energyType')
+TOTAL = 'total'
+CENT = Decimal('0.01')
+# 按 id 读取更新前后的值时每次查询的 id 数
+CHUNK_SIZE = 900
+# 计算增量时需要的字段
+AGGREGATE_FIELDS = ('id', 'sale_volume', 'min_price', 'max_price') + DIMENSIONS
+
+
+def carValues(car):
+    """模型实例或 values() 字典统一成字典"""
+    if isinstance(car, dict):
+        return car
+    return {field: getattr(car, field) for field in AGGREGATE_FIELDS}
+
+
+class AggregateDelta(object):
+    """累积一批增删改对各分组的影响, 最后一次性写入 CarAggregate"""
+
+    def __init__(self):
+        # (dimension, key) -> [count, volumeSum, priceSum, firstId]
+        self.groups = defaultdict(lambda: [0, 0, Decimal(0), None])
+        # 被移出的 id, 如果正好是某组的 firstId 需要重新计算
+        self.removed = defaultdict(set)
+
+    def __bool__(self):
+        return bool(self.groups)
+
+    def add(self, car, sign=1):
+        car = carValues(car)
+        price = Decimal(car['min_price'] or 0) + Decimal(car['max_price'] or 0)
+        keys = [(dimension, car[dimension]) for dimension in DIMENSIONS] + [(TOTAL, '')]
+        for group in keys:
+            delta = self.groups[group]
+            delta[0] += sign
+            delta[1] += sign * (car['sale_volume'] or 0)
+            delta[2] += sign * price
+            if sign > 0 and car['id'] is not None:
+                delta[3] = car['id'] if delta[3] is None else min(delta[3], car['id'])
+                # 修改后仍留在同一组的行 (先移出再加回) 不影响该组的 firstId
+                if group in self.removed:
+                    self.removed[group].discard(car['id'])
+            elif sign < 0:
+                self.removed[group].add(car['id'])
+
+    def remove(self, car):
+        self.add(car, -1)
+
+    def merge(self, other):
+        """并入之后发生的另一批增量; 合并后多记的移出 id 只会让 firstId 多重新计算一次"""
+        for group, (count, volume, price, firstId) in other.groups.items():
+            delta = self.groups[group]
+            delta[0] += count
+            delta[1] += volume
+            delta[2] += price
+            if firstId is not None:
+                delta[3] = firstId if delta[3] is None else min(delta[3], firstId)
+        for group, ids in other.removed.items():
+            self.removed[group] |= ids
+
+    def apply(self):
+        """在一个事务内把累积的增量写入数据库"""
+        if not self:
+            return
+        with transaction.atomic():
+            for (dimension, key), (count, volume, price, firstId) in self.groups.items():
+                applyGroup(dimension, key, count, volume, price, firstId)
+            for (dimension, key), ids in self.removed.items():
+                if ids:
+                    refreshFirstId(dimension, key, ids)
+            CarAggregate.objects.filter(count__lte=0).exclude(dimension=TOTAL).delete()
+        self.groups.clear()
+        self.removed.clear()
+
+
+def applyGroup(dimension, key, count, volume, price, firstId):
+    updates = {
+        'count': F('count') + count,
+        'volumeSum': F('volumeSum') + volume,
+        'priceSum': F('priceSum') + price,
+    }
+    if firstId is not None:
+        # 空表时生成的合计行 firstId 为 0, 第一次写入时直接取新值
+        updates['firstId'] = Case(When(firstId__lte=0, then=Value(firstId)), default=Least('firstId', Value(firstId)))
+    group = CarAggregate.objects.filter(dimension=dimension, key=key)
+    if group.update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            CarAggregate.objects.create(dimension=dimension, key=key, count=count, volumeSum=volume,
+                                        priceSum=price, firstId=firstId or 0)
+    except IntegrityError:
+        # 并发写入时另一方已经建好了这一组
+        group.update(**updates)
+
+
+def refreshFirstId(dimension, key, removedIds):
+    group = CarAggregate.objects.filter(dimension=dimension, key=key, firstId__in=removedIds)
+    if not group.exists():
+        return
+    cars = CarInfomation.objects.all() if dimension == TOTAL else CarInfomation.objects.filter(**{dimension: key})
+    group.update(firstId=cars.aggregate(firstId=Coalesce(Min('id'), 0))['firstId'])
+
+
+def addCars(cars):
+    """批量入库后调用, 把新写入的数据一次性累加到分组统计"""
+    delta = AggregateDelta()
+    for car in cars:
+        delta.add(car)
+    delta.apply()
+
+
+def carsByIds(ids):
+    ids = iter(ids)
+    while True:
+        chunk = list(islice(ids, CHUNK_SIZE))
+        if not chunk:
+            return
+        yield from CarInfomation.objects.filter(id__in=chunk).values(*AGGREGATE_FIELDS)
+
+
+@contextmanager
+def trackedUpdate(queryset):
+    """with 块内对 queryset 中各行的 update() 同步到分组统计: 先减去更新前的值, 再加上更新后的值;
+    整个过程在一个事务内, 结束后数据版本只递增一次。CarInfomation.objects 的 update() 已经经过这里
+    """
+    with batchUpdate():
+        # 更新后 queryset 的条件可能不再匹配, 先记下 id
+        ids = list(queryset.order_by().values_list('id', flat=True))
+        delta = AggregateDelta()
+        for car in carsByIds(ids):
+            delta.remove(car)
+        yield
+        for car in carsByIds(ids):
+            delta.add(car)
+        delta.apply()
+
+
+def computeAggregates():
+    """从 CarInfomation 全量计算各分组统计, 返回 {(dimension, key): (count, volumeSum, priceSum, firstId)}"""
+    stats = dict(count=Count('id'), volumeSum=Coalesce(Sum('sale_volume'), 0),
+                 minSum=Sum('min_price'), maxSum=Sum('max_price'), firstId=Coalesce(Min('id'), 0))
+    result = {}
+    for dimension in DIMENSIONS:
+        for row in CarInfomation.objects.values(dimension).annotate(**stats).order_by():
+            result[(dimension, row[dimension])] = groupStats(row)
+    result[(TOTAL, '')] = groupStats(CarInfomation.objects.aggregate(**stats))
+    return result
+
+
+def groupStats(row):
+    # SQLite 对小数求和会带浮点误差, 统一保留两位
+    price = (Decimal(row['minSum'] or 0) + Decimal(row['maxSum'] or 0)).quantize(CENT)
+    return row['count'], row['volumeSum'], price, row['firstId']
+
+
+def rebuildAggregates():
+    """全量重建 CarAggregate; 在主库事务内统计, 不读可能落后的从库"""
+    with transaction.atomic():
+        aggregates = computeAggregates()
+        CarAggregate.objects.all().delete()
+        CarAggregate.objects.bulk_create([
+            CarAggregate(dimension=dimension, key=key, count=count, volumeSum=volume, priceSum=price, firstId=firstId)
+            for (dimension, key), (count, volume, price, firstId) in aggregates.items()
+        ], batch_size=1000)
+    return len(aggregates)
+
+
+def checkAggregates():
+    """对比增量维护的结果与全量计算的结果, 返回不一致的分组列表"""
+    with transaction.atomic():
+        expected = computeAggregates()
+        stored = {
+            (row.dimension, row.key): (row.count, row.volumeSum, row.priceSum, row.firstId)
+            for row in CarAggregate.objects.all()
+        }
+    mismatches = []
+    for group in sorted(set(expected) | set(stored)):
+        if expected.get(group) != stored.get(group):
+            mismatches.append((group, stored.get(group), expected.get(group)))
+    return mismatches
@@ -0,0 +1,99 @@
+import json
+import re
+
+from lxml import etree
+
+# 详情页参数表中的行 (data-row-anchor) 与 CSV 列的对应关系, 按 CSV 中的顺序
+ANCHORS = (('jb', 'carModel'), ('fuel_form', 'energyType'), ('market_time', 'marketTime'), ('period', 'insure'))
+ANCHOR_NAMES = tuple(anchor for anchor, _ in ANCHORS)
+
+# 预编译的 XPath, 只取需要的四种行 (参数表有上百行, 不为其余的行创建 Python 对象);
+# smart_strings=False 返回普通字符串, 不会引用整棵 DOM
+ROWS = etree.XPath('//div[%s]' % ' or '.join('@data-row-anchor="%s"' % anchor for anchor in ANCHOR_NAMES))
+ROW_VALUE = etree.XPath('div[2]/div/text()', smart_strings=False)
+ANCHOR_MARKS = tuple('data-row-anchor="%s"' % anchor for anchor in ANCHOR_NAMES)
+# 页面内嵌的状态数据 (Next.js)
+NEXT_DATA = re.compile(r'<script[^>]*\bid="__NEXT_DATA__"[^>]*>(.*?)</script>', re.S)
+
+
+def stateValue(value):
+    """状态数据中的取值可能是字符串, 也可能是 {"value": ...} / {"text": ...}"""
+    if isinstance(value, dict):
+        value = value.get('value', value.get('text'))
+    if isinstance(value, (str, int, float)) and str(value).strip():
+        return str(value)
+    return None
+
+
+def extractFromState(html):
+    """从内嵌的 __NEXT_DATA__ 中找同时包含四个参数的对象 (第一款车型的参数); 没有时返回 None"""
+    # 先用子串查找, 大多数页面不必跑正则
+    position = html.find('__NEXT_DATA__')
+    match = None if position == -1 else NEXT_DATA.search(html, html.rfind('<script', 0, position))
+    if match is None:
+        return None
+    try:
+        pending = [json.loads(match.group(1))]
+    except ValueError:
+        return None
+    while pending:
+        node = pending.pop()
+        if isinstance(node, dict):
+            if all(anchor in node for anchor in ANCHOR_NAMES):
+                values = [stateValue(node[anchor]) for anchor in ANCHOR_NAMES]
+                if None not in values:
+                    return values
+            pending.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            pending.extend(reversed(node))
+    return None
+
+
+def rowsFragment(html):
+    """从第一个需要的行开始, 到最后一个需要的行的下一行之前为止的片段; 有行找不到时返回 None"""
+    positions = [html.find(mark) for mark in ANCHOR_MARKS]
+    if -1 in positions:
+        return None
+    start = html.rfind('<div', 0, min(positions))
+    if start == -1:
+        return None
+    nextRow = html.find('data-row-anchor=', max(positions) + 1)
+    end = len(html) if nextRow == -1 else html.rfind('<div', 0, nextRow)
+    return html[start:end]
+
+
+def rowValues(html):
+    """遍历一次参数表中需要的行; 每个参数取文档中第一个有文本的值"""
+    root = etree.HTML(html)
+    values = {}
+    if root is None:
+        return values
+    for row in ROWS(root):
+        anchor = row.get('data-row-anchor')
+        if anchor not in values:
+            texts = ROW_VALUE(row)
+            if texts:
+                values[anchor] = texts[0]
+                if len(values) == len(ANCHOR_NAMES):
+                    break
+    return values
+
+
+def extractFromDom(html):
+    """参数表中的 [车型, 能源类型, 上市时间, 保修期限]
+
+    结果与整页逐个 xpath(...)[0] 相同; 先只解析需要的几行所在的片段, 片段中取不全时再解析整页
+    """
+    fragment = rowsFragment(html)
+    values = {} if fragment is None else rowValues(fragment)
+    if len(values) < len(ANCHOR_NAMES):
+        values = rowValues(html)
+    missing = [anchor for anchor in ANCHOR_NAMES if anchor not in values]
+    if missing:
+        raise ValueError('详情页缺少参数: %s' % ', '.join(missing))
+    return [values[anchor] for anchor in ANCHOR_NAMES]
+
+
+def extractDetail(html):
+    """详情页中的 [车型, 能源类型, 上市时间, 保修期限]: 优先读内嵌的状态数据, 没有或取不全时解析参数表"""
+    return extractFromState(html) or extractFromDom(html)
@@ -0,0 +1,191 @@
+import os
+import tempfile
+import time
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from myApp.models import CarInfomation
+from . import analytics
+from .carAggregates import AGGREGATE_FIELDS, AggregateDelta
+from .dataVersion import batchUpdate, getDataVersion
+from .parseData import parseInt, parsePrice
+from .syntheticCars import CSV_FIELDS
+
+BATCH_SIZE = 2000
+# 自然键: 同一个月的排行榜中车名唯一
+UNIQUE_FIELDS = ['carName', 'rankMonth']
+# 再次入库同一车系时覆盖的列, 创建时间和 id 保持不变
+UPDATE_FIELDS = ['brand', 'carImg', 'saleVolume', 'price', 'manufacturer', 'rank', 'carModel', 'energyType',
+                 'marketTime', 'insure', 'sale_volume', 'min_price', 'max_price']
+# 写入的列, 每行按这个顺序组成元组
+INSERT_FIELDS = CSV_FIELDS + ['sale_volume', 'min_price', 'max_price', 'rankMonth', 'creteTime']
+CAR_NAME = INSERT_FIELDS.index('carName')
+INFILE_STAGING = 'CarInfomationLoad'
+
+
+class LoadResult(namedtuple('LoadResult', 'rows inserted updated seconds')):
+
+    @property
+    def rowsPerSecond(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return '写入 %d 行 (新增 %d, 更新 %d), 耗时 %.2f 秒, %.0f 行/秒' % (
+            self.rows, self.inserted, self.updated, self.seconds, self.rowsPerSecond)
+
+
+def currentRankMonth():
+    return date.today().strftime('%Y-%m')
+
+
+def column(name):
+    return connection.ops.quote_name(CarInfomation._meta.get_field(name).column)
+
+
+def prepare(name, value):
+    return CarInfomation._meta.get_field(name).get_db_prep_save(value, connection)
+
+
+def insertValues(row, rankMonth, created):
+    """爬虫输出的一行 (temp.csv 的列顺序) 转成 INSERT_FIELDS 顺序的数据库取值; 价格可以是 "[3.58, 4.68]" 文本或列表
+
+    不创建模型实例, 也不经过 ORM 逐个字段编译, 入库的值与 CarInfomation.objects.create 相同
+    """
+    brand, carName, carImg, saleVolume, price, manufacturer, rank, carModel, energyType, marketTime, insure = row
+    minPrice, maxPrice = parsePrice(price)
+    return (str(brand), str(carName), str(carImg), str(saleVolume), str(price), str(manufacturer), parseInt(rank),
+            str(carModel), str(energyType), str(marketTime), str(insure), parseInt(saleVolume),
+            prepare('min_price', minPrice), prepare('max_price', maxPrice), rankMonth, created)
+
+
+def uniqueRows(rows):
+    """同一批中车名重复时保留最后一行, 一条 upsert 语句里不能两次命中同一个键"""
+    return list({row[CAR_NAME]: row for row in rows}.values())
+
+
+def existingCars(names, rankMonth):
+    """本月已入库的这些车系, {车名: 统计用的字段}; 在入库事务内调用, 读的是主库
+
+    直接执行 SQL: 每批两千个车名的 IN 条件经过 ORM 逐个处理参数, 比查询本身还慢
+    """
+    fields = ('carName',) + AGGREGATE_FIELDS
+    sql = 'SELECT %s FROM %s WHERE %s = %%s AND %s IN (%s)' % (
+        ', '.join(map(column, fields)), connection.ops.quote_name(CarInfomation._meta.db_table),
+        column('rankMonth'), column('carName'), ', '.join(['%s'] * len(names)))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [rankMonth] + names)
+        cars = [dict(zip(fields, row)) for row in cursor.fetchall()]
+    for car in cars:
+        # SQLite 返回的价格是浮点数
+        for field in ('min_price', 'max_price'):
+            if car[field] is not None:
+                car[field] = Decimal(str(car[field]))
+    return {car['carName']: car for car in cars}
+
+
+def useInfile():
+    """MySQL 连接开启了 local_infile 时走 LOAD DATA LOCAL INFILE"""
+    return connection.vendor == 'mysql' and bool(connection.settings_dict['OPTIONS'].get('local_infile'))
+
+
+def bulkUpsert(rows):
+    """INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE, 冲突子句由数据库后端生成 (与 bulk_create(update_conflicts=True) 相同)
+
+    用 executemany 一次提交整批: SQLite 在 C 里逐行执行, pymysql 会改写成多行 VALUES
+    """
+    fields = [CarInfomation._meta.get_field(name) for name in INSERT_FIELDS]
+    suffix = connection.ops.on_conflict_suffix_sql(
+        fields, OnConflict.UPDATE,
+        [CarInfomation._meta.get_field(name).column for name in UPDATE_FIELDS],
+        [CarInfomation._meta.get_field(name).column for name in UNIQUE_FIELDS])
+    sql = 'INSERT INTO %s (%s) VALUES (%s) %s' % (
+        connection.ops.quote_name(CarInfomation._meta.db_table), ', '.join(map(column, INSERT_FIELDS)),
+        ', '.join(['%s'] * len(INSERT_FIELDS)), suffix)
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def infileValue(value):
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+def infileUpsert(rows):
+    """写成制表符分隔的临时文件, LOAD DATA LOCAL INFILE 到临时表, 再用一条 INSERT ... ON DUPLICATE KEY UPDATE 合并
+
+    只建、删临时表 (TEMPORARY) 不会隐式提交, 整个过程仍在入库事务内
+    """
+    table = connection.ops.quote_name(CarInfomation._meta.db_table)
+    staging = connection.ops.quote_name(INFILE_STAGING)
+    columns = ', '.join(map(column, INSERT_FIELDS))
+    updates = ', '.join('%s = VALUES(%s)' % (column(name), column(name)) for name in UPDATE_FIELDS)
+    with tempfile.NamedTemporaryFile('w', suffix='.tsv', encoding='utf-8', newline='', delete=False) as f:
+        for row in rows:
+            f.write('\t'.join(map(infileValue, row)) + '\n')
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TEMPORARY TABLE %s LIKE %s' % (staging, table))
+            try:
+                cursor.execute("LOAD DATA LOCAL INFILE %%s INTO TABLE %s CHARACTER SET utf8mb4 "
+                               "FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' (%s)" % (staging, columns),
+                               [f.name])
+                cursor.execute('INSERT INTO %s (%s) SELECT %s FROM %s ON DUPLICATE KEY UPDATE %s'
+                               % (table, columns, columns, staging, updates))
+            finally:
+                cursor.execute('DROP TEMPORARY TABLE %s' % staging)
+    finally:
+        os.remove(f.name)
+
+
+def syncParquet(before, loads=1, updated=0):
+    """启用 DuckDB 时同步 Parquet 导出: 从版本 before 起的 loads 次入库只有新增时追加, 有更新时重新导出"""
+    if not analytics.enabled():
+        return None
+    if updated:
+        return analytics.exportParquet()
+    return analytics.appendParquet(before, loads)
+
+
+def upsertCars(rows, rankMonth=None, batchSize=None, infile=None, syncAnalytics=True):
+    """把爬虫输出的行按 (车名, 排行月份) 写入 CarInfomation, 已有的车系更新、没有的新增, 返回 LoadResult
+
+    每 batchSize 行一条批量 upsert (或一次 LOAD DATA), 整个入库在一个事务内; 分组统计按每批的新旧值增量更新,
+    结束后只递增一次数据版本; syncAnalytics 为 True 时随后调用 syncParquet。连续多次入库 (如爬虫分批入库)
+    时传 False, 全部结束后调用一次 syncParquet(入库前的版本, 入库次数, 更新的行数)。
+    """
+    rankMonth = rankMonth or currentRankMonth()
+    batchSize = batchSize or getattr(settings, 'CAR_LOADER_BATCH_SIZE', BATCH_SIZE)
+    write = infileUpsert if (useInfile() if infile is None else infile) else bulkUpsert
+    created = prepare('creteTime', timezone.now())
+    rows = iter(rows)
+    inserted = updated = 0
+    delta = AggregateDelta()
+    start = time.perf_counter()
+    before = getDataVersion()
+    with batchUpdate():
+        while True:
+            batch = uniqueRows(insertValues(row, rankMonth, created) for row in islice(rows, batchSize))
+            if not batch:
+                break
+            names = [row[CAR_NAME] for row in batch]
+            old = existingCars(names, rankMonth)
+            write(batch)
+            # 先减去旧值再加上新值; id 由数据库生成, 写入后再读一次
+            for car in old.values():
+                delta.remove(car)
+            for car in existingCars(names, rankMonth).values():
+                delta.add(car)
+            inserted += len(batch) - len(old)
+            updated += len(old)
+        delta.apply()
+    if syncAnalytics:
+        syncParquet(before, updated=updated)
+    return LoadResult(inserted + updated, inserted, updated, time.perf_counter() - start)
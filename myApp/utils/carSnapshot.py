@@ -0,0 +1,135 @@
+import bisect
+import heapq
+import threading
+
+import numpy as np
+
+from myApp.models import CarInfomation
+from .dataVersion import getDataVersion
+from .parseData import formatPrice
+
+# 快照加载的字段顺序
+SNAPSHOT_FIELDS = ('brand', 'carName', 'carImg', 'sale_volume', 'min_price', 'max_price',
+                   'manufacturer', 'rank', 'carModel', 'energyType', 'marketTime', 'insure')
+
+
+class EncodedColumn(object):
+    """字典编码的字符串列: labels 为去重后的取值, codes 为每行对应的下标"""
+
+    def __init__(self, values):
+        labels, firstIndex, codes = np.unique(np.array(values, dtype=object),
+                                              return_index=True, return_inverse=True)
+        self.labels = labels.tolist()
+        self.firstIndex = firstIndex
+        self.codes = codes.astype(np.int32)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def value(self, row):
+        return self.labels[self.codes[row]]
+
+    def code(self, label):
+        """取值对应的编码, 不存在时返回 -1"""
+        pos = bisect.bisect_left(self.labels, label)
+        if pos < len(self.labels) and self.labels[pos] == label:
+            return int(pos)
+        return -1
+
+    def counts(self):
+        return np.bincount(self.codes, minlength=len(self.labels))
+
+    def sums(self, weights):
+        return np.bincount(self.codes, weights=weights, minlength=len(self.labels))
+
+    def countOf(self, label):
+        code = self.code(label)
+        if code == -1:
+            return 0
+        return int(np.count_nonzero(self.codes == code))
+
+    def rowsOf(self, label):
+        code = self.code(label)
+        if code == -1:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.codes == code)
+
+    def mostCommon(self):
+        """出现次数最多的取值, 并列时取最先出现的"""
+        counts = self.counts()
+        candidates = np.flatnonzero(counts == counts.max())
+        return self.labels[candidates[np.argmin(self.firstIndex[candidates])]]
+
+
+class CarSnapshot(object):
+    """CarInfomation 全表的列式快照, 按 id 顺序保存"""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.size = len(rows)
+        columns = list(zip(*rows)) if rows else [()] * len(SNAPSHOT_FIELDS)
+        col = dict(zip(SNAPSHOT_FIELDS, columns))
+
+        self.brand = EncodedColumn(col['brand'])
+        self.carName = EncodedColumn(col['carName'])
+        self.manufacturer = EncodedColumn(col['manufacturer'])
+        self.carModel = EncodedColumn(col['carModel'])
+        self.energyType = EncodedColumn(col['energyType'])
+        self.marketTime = EncodedColumn(col['marketTime'])
+        self.insure = EncodedColumn(col['insure'])
+        self.carImg = list(col['carImg'])
+        self.rank = list(col['rank'])
+        self.saleVolume = np.array(col['sale_volume'], dtype=np.int64)
+        self.minPrice = np.array(col['min_price'], dtype=np.float64)
+        self.maxPrice = np.array(col['max_price'], dtype=np.float64)
+        self.priceText = [formatPrice(low, high) for low, high in zip(col['min_price'], col['max_price'])]
+        self._sortedPrices = {}
+
+    def price(self, mode='min'):
+        """每辆车的价格: min 为最低价, avg 为 (最低价 + 最高价) / 2"""
+        if mode == 'min':
+            return self.minPrice
+        if mode == 'avg':
+            return (self.minPrice + self.maxPrice) / 2
+        raise ValueError('价格口径只能是 min / avg')
+
+    def sortedPrice(self, mode='min'):
+        """排好序的价格列, 每个快照只排一次; 没有价格的 nan 排在最后"""
+        prices = self._sortedPrices.get(mode)
+        if prices is None:
+            prices = self._sortedPrices[mode] = np.sort(self.price(mode))
+        return prices
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def getSnapshot():
+    """返回进程内共享的快照, 数据版本变化时才重新加载"""
+    global _snapshot
+    version = getDataVersion()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            rows = list(CarInfomation.objects.order_by('id').values_list(*SNAPSHOT_FIELDS))
+            _snapshot = CarSnapshot(version, rows)
+        return _snapshot
+
+
+def invalidate():
+    global _snapshot
+    with _lock:
+        _snapshot = None
+
+
+def topGroups(column, values, k):
+    """按 (值, 取值) 降序取前 k 组, 与 sorted(zip(values, keys), reverse=True)[:k] 的顺序一致
+    用堆代替全排序, 代价 O(n log k); 值为 nan 的组 (没有数据) 跳过
+    """
+    candidates = np.flatnonzero(~np.isnan(values)) if values.dtype.kind == 'f' else range(len(values))
+    labels = column.labels
+    order = heapq.nlargest(k, candidates, key=lambda i: (values[i], labels[i]))
+    return [(labels[i], values[i]) for i in order]
@@ -0,0 +1,160 @@
+import json
+import sqlite3
+import threading
+import time
+
+# 车系的状态, 依次推进: 已登记 -> 详情页已下载 -> 已解析 -> 已写入
+PENDING, FETCHED, PARSED, STORED = 'pending', 'fetched', 'parsed', 'stored'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS pages (
+    "offset" INTEGER PRIMARY KEY,
+    size INTEGER NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS series (
+    series_id INTEGER PRIMARY KEY,
+    "offset" INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    car TEXT NOT NULL,
+    data TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS series_status ON series (status);
+"""
+
+
+def legacyOffset(path):
+    """旧的 spiderPage.txt 最后一行记录的偏移量"""
+    try:
+        with open(path) as f:
+            lines = [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        return None
+    return int(lines[-1]) if lines else None
+
+
+class CheckpointStore(object):
+    """爬虫断点: 排行榜下一页的偏移量和每个车系的进度, 存在本地 SQLite 文件中
+
+    偏移量是 meta 表中的一行, 车系按 series_id 主键查找, 与历史记录的多少无关;
+    每次状态变化立即提交, 中途退出后从上次的位置继续, 已写入的车系不会再请求。
+    进度属于 rankMonth 这个月的排行榜: 打开时月份与记录的不同, 就清空进度从头开始。
+    """
+
+    def __init__(self, path, legacyPagePath=None, rankMonth=None):
+        self.lock = threading.Lock()
+        # 爬虫线程池中的线程也会更新状态, 由 self.lock 串行化
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+        if legacyPagePath and self.get('nextOffset') is None and self.get('rankMonth') is None:
+            # 第一次使用时沿用 spiderPage.txt 中的进度
+            offset = legacyOffset(legacyPagePath)
+            if offset is not None:
+                self.set('nextOffset', offset)
+        if rankMonth is not None:
+            self.useMonth(rankMonth)
+
+    def useMonth(self, rankMonth):
+        """记录的进度是其他月份的排行榜时清空; 没有记录月份的旧断点视为当月的"""
+        recorded = self.get('rankMonth')
+        if recorded is not None and recorded != rankMonth:
+            self.reset()
+        self.set('rankMonth', rankMonth)
+
+    def reset(self):
+        """清空偏移量和所有车系的进度, 下次从排行榜第一页开始; 记录的月份不变"""
+        with self.lock:
+            self.db.execute('BEGIN')
+            self.db.execute('DELETE FROM pages')
+            self.db.execute('DELETE FROM series')
+            self.db.execute("DELETE FROM meta WHERE key = 'nextOffset'")
+            self.db.execute('COMMIT')
+
+    def _get(self, key):
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def get(self, key):
+        with self.lock:
+            return self._get(key)
+
+    def set(self, key, value):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    def nextOffset(self):
+        offset = self.get('nextOffset')
+        return 0 if offset is None else offset
+
+    def startPage(self, offset, cars):
+        """登记一页排行榜中的车系; 已登记过的车系保留原来的进度"""
+        now = time.time()
+        with self.lock:
+            self.db.execute('BEGIN')
+            self.db.execute('INSERT OR IGNORE INTO pages ("offset", size, updated) VALUES (?, ?, ?)',
+                            (offset, len(cars), now))
+            self.db.executemany(
+                'INSERT OR IGNORE INTO series (series_id, "offset", status, car, updated) VALUES (?, ?, ?, ?, ?)',
+                [(car['series_id'], offset, PENDING, json.dumps(car, ensure_ascii=False), now) for car in cars])
+            self.db.execute('COMMIT')
+
+    def finishPage(self, offset, nextOffset):
+        """一页处理完, 在同一个事务里标记该页并推进偏移量"""
+        with self.lock:
+            self.db.execute('BEGIN')
+            self.db.execute('UPDATE pages SET done = 1, updated = ? WHERE "offset" = ?', (time.time(), offset))
+            self.db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                            ('nextOffset', json.dumps(nextOffset)))
+            self.db.execute('COMMIT')
+
+    def status(self, seriesId):
+        """(状态, 解析出的数据); 没有登记过时为 (None, None)"""
+        with self.lock:
+            row = self.db.execute('SELECT status, data FROM series WHERE series_id = ?', (seriesId,)).fetchone()
+        if row is None:
+            return None, None
+        return row[0], None if row[1] is None else json.loads(row[1])
+
+    def mark(self, seriesId, status, data=None):
+        with self.lock:
+            if data is None:
+                self.db.execute('UPDATE series SET status = ?, error = NULL, updated = ? WHERE series_id = ?',
+                                (status, time.time(), seriesId))
+            else:
+                self.db.execute('UPDATE series SET status = ?, data = ?, error = NULL, updated = ? WHERE series_id = ?',
+                                (status, json.dumps(data, ensure_ascii=False), time.time(), seriesId))
+
+    def fail(self, seriesId, error):
+        """记录失败原因, 状态不变, 下次运行时重试"""
+        with self.lock:
+            self.db.execute('UPDATE series SET error = ?, attempts = attempts + 1, updated = ? WHERE series_id = ?',
+                            (str(error), time.time(), seriesId))
+
+    def unfinished(self):
+        """所在页已处理完、但还没写入的车系 (之前失败的), 返回排行榜中的原始数据"""
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT car FROM series WHERE status != ? AND "offset" < ? ORDER BY "offset", series_id',
+                (STORED, self._get('nextOffset') or 0)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def counts(self):
+        """各状态的车系数量"""
+        with self.lock:
+            return dict(self.db.execute('SELECT status, count(*) FROM series GROUP BY status').fetchall())
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
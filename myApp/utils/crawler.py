@@ -0,0 +1,119 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 这些状态码视为临时错误, 退避后重试
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Retry-After 最多等待的秒数
+MAX_RETRY_AFTER = 60
+
+
+class RateLimiter(object):
+    """每个主机每秒最多 rate 个请求; 按主机预约下一个请求可以发出的时间, 多线程共用"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.nextTimes = {}
+
+    def wait(self, host):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            at = max(now, self.nextTimes.get(host, now))
+            self.nextTimes[host] = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def retryAfter(response):
+    """响应头 Retry-After 的秒数, 没有或不是秒数时为 0"""
+    try:
+        return min(float(response.headers.get('Retry-After', 0)), MAX_RETRY_AFTER)
+    except ValueError:
+        return 0.0
+
+
+class Fetcher(object):
+    """爬虫共用的 HTTP 客户端
+
+    所有线程共用一个带连接池的 requests.Session; 并发数不超过 workers,
+    每个主机按 rate 限速, 连接错误、超时和 RETRY_STATUSES 按指数退避重试 retries 次。
+    """
+
+    def __init__(self, headers=None, workers=8, rate=5.0, retries=3, backoff=0.5, timeout=10):
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update(headers or {})
+        self.limiter = RateLimiter(rate)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='crawler')
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0}
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def backoffDelay(self, attempt):
+        # 加一点随机抖动, 避免多个线程同时重试
+        return self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+
+    def get(self, url, **kwargs):
+        """GET 并在临时错误时重试; 最终失败时抛出 requests.RequestException"""
+        host = urlsplit(url).netloc
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.retries + 1):
+            self.limiter.wait(host)
+            self.count('requests')
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                delay = self.backoffDelay(attempt)
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    response.raise_for_status()
+                    return response
+                delay = max(self.backoffDelay(attempt), retryAfter(response))
+                response.close()
+            self.count('retries')
+            time.sleep(delay)
+
+    def map(self, func, items):
+        """在线程池中并发执行 func, 按 items 的顺序返回结果"""
+        return self.executor.map(func, items)
+
+    def imap(self, func, items, window=None):
+        """与 map 相同, 但边读取 items 边提交, 在途的任务最多 window 个 (默认为 workers 的两倍), 适合很长的输入"""
+        window = window or self.workers * 2
+        pending = deque()
+        for item in items:
+            pending.append(self.executor.submit(func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,168 @@
+from types import SimpleNamespace
+
+from django.db import transaction
+
+from myApp.models import DashboardPanel, DashboardSnapshot
+from .dataVersion import getDataVersion, getDataVersionMeta
+from .fastResponse import representation
+from . import getCenterData
+from . import getCenterLeftData
+from . import getBottomLeftData
+from . import getCenterRightData
+from . import getCenterChangeData
+from . import getBottomRightData
+from . import analytics
+
+# 全局只有一行快照版本记录
+SNAPSHOT_ID = 1
+# 快照中的面板; bottomRight 是整张排行表, 随数据量增长, 不放进快照, 由视图分页或流式读取
+PANEL_NAMES = ('center', 'centerLeft', 'bottomLeft', 'centerRight', 'centerRightChange')
+
+
+def centerPanel(baseData, lastSortList, rates):
+    sumCar, highVolume, topCar, mostModdel, mostBrand, averagePrices = baseData
+    oilRate, electricRate, mixRate = rates
+    return {
+        'sumCar': sumCar,
+        'highVolume': highVolume,
+        'topCar': topCar,
+        'mostModdel': mostModdel,
+        'mostBrand': mostBrand,
+        'averagePrices': averagePrices,
+        'oilRate': oilRate,
+        'lastSortList': lastSortList,
+        'electricRate': electricRate,
+        'mixRate': mixRate,
+    }
+
+
+# 默认的计算方式: 数据库中的分组计数器 + 进程内的列式快照
+ORM_SOURCE = SimpleNamespace(
+    getBaseData=getCenterData.getBaseData,
+    getRollData=getCenterData.getRollData,
+    getTypeRate=getCenterData.getTypeRate,
+    getPieBrand=getCenterLeftData.getPieBrand,
+    getSquareData=getBottomLeftData.getSquareData,
+    getPriceSortDate=getCenterRightData.getPriceSortDate,
+    getCircleData=getCenterChangeData.getCircleData,
+    getRankData=getBottomRightData.getRankData,
+)
+
+
+def panelSource():
+    """各面板统计的计算方式; DASHBOARD_ANALYTICS_BACKEND = "duckdb" 时改由导出的 Parquet + DuckDB 计算"""
+    return analytics if analytics.enabled() else ORM_SOURCE
+
+
+def buildPanels(source=None):
+    """一次性计算快照中所有面板的返回值, {面板名: 数据}"""
+    if source is None:
+        source = panelSource()
+    center = centerPanel(source.getBaseData(), source.getRollData(), source.getTypeRate())
+    brandList, volumeList, priceList = source.getSquareData()
+    oilData, eletricdatas = source.getCircleData()
+    return {
+        'center': center,
+        'centerLeft': {
+            'lastPeiList': source.getPieBrand(),
+        },
+        'bottomLeft': {
+            'brandList': brandList,
+            'volumeList': volumeList,
+            'priceList': priceList,
+        },
+        'centerRight': {
+            'realData': source.getPriceSortDate(),
+        },
+        'centerRightChange': {
+            'oil': {'realData': oilData},
+            'electric': {'realData': eletricdatas},
+        },
+    }
+
+
+def rebuildDashboard(version=None, force=False):
+    """在一个事务内重新计算并写入各面板, 并发重建时按快照记录的行锁串行; 快照版本即计算时的数据版本
+
+    拿到锁后如果主库上的快照已经不旧于要求的版本 (其他请求刚重建过, 或从库还没同步到), 直接返回, 不重复计算;
+    返回的快照记录带有 panels 属性, 即该版本的 {面板名: 数据}
+    """
+    with transaction.atomic():
+        snapshot = DashboardSnapshot.objects.select_for_update().filter(pk=SNAPSHOT_ID).first()
+        if version is None:
+            version = getDataVersion()
+        if snapshot is None:
+            snapshot = DashboardSnapshot(id=SNAPSHOT_ID)
+        elif snapshot.version >= version and not force:
+            # 事务内读的是主库
+            snapshot.panels = dict(DashboardPanel.objects.values_list('name', 'payload'))
+            if set(PANEL_NAMES) <= set(snapshot.panels):
+                return snapshot
+        snapshot.version = version
+        # DuckDB 后端按这个版本检查导出, 各面板的查询不再逐次读取数据版本
+        with analytics.pinVersion(version):
+            snapshot.panels = buildPanels()
+        DashboardPanel.objects.all().delete()
+        DashboardPanel.objects.bulk_create([
+            DashboardPanel(name=name, version=version, payload=payload) for name, payload in snapshot.panels.items()
+        ])
+        snapshot.save()
+    return snapshot
+
+
+def panelRows(names=None):
+    rows = DashboardPanel.objects.values('name', 'version', 'payload')
+    return rows.filter(name__in=names) if names is not None else rows
+
+
+def currentPanels(rows, version, names=None):
+    """rows 中的面板都存在且是当前版本时返回 {面板名: 数据}, 否则返回 None"""
+    panels = {row['name']: row for row in rows}
+    names = PANEL_NAMES if names is None else names
+    if any(name not in panels or panels[name]['version'] != version for name in names):
+        return None
+    return {name: panels[name]['payload'] for name in names}
+
+
+def getDashboardMeta(request=None):
+    """条件请求的 ETag / Last-Modified 取自数据版本号和它的更新时间, 同一请求内只查一次
+
+    只读版本记录, 不重建快照: 304 的请求不做任何面板计算, 需要返回数据时视图再按版本取快照
+    """
+    meta = getattr(request, '_dashboardMeta', None)
+    if meta is None:
+        meta = getDataVersionMeta()
+        if request is not None:
+            request._dashboardMeta = meta
+            request._dataVersion = meta['version']
+    return meta
+
+
+def representationEtag(request, version):
+    """同一版本的 JSON / 列式 / MessagePack 和 identity / gzip / br 是不同的表示, ETag 各不相同,
+    缓存和 If-None-Match 不会把一种表示当成另一种; 响应同时带 Vary: Accept, Accept-Encoding"""
+    return 'dashboard-%d-%s-%s' % ((version,) + representation(request))
+
+
+def dashboardEtag(request, *args, **kwargs):
+    return representationEtag(request, getDashboardMeta(request)['version'])
+
+
+def dashboardLastModified(request, *args, **kwargs):
+    return getDashboardMeta(request)['updateTime']
+
+
+def getPanels(names=None):
+    """读取快照中的面板 (默认全部), 返回 (版本, {面板名: 数据}); 还没有生成过或数据版本已变化时就地重建一次"""
+    version = getDataVersion()
+    panels = currentPanels(panelRows(names), version, names)
+    if panels is None:
+        snapshot = rebuildDashboard()
+        version = snapshot.version
+        panels = {name: snapshot.panels[name] for name in (PANEL_NAMES if names is None else names)}
+    return version, panels
+
+
+def getPanel(name):
+    """按主键只读取一个面板的数据"""
+    return getPanels([name])[1][name]
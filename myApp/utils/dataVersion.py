@@ -0,0 +1,80 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from myApp.models import DataVersion
+
+# 全局只有一行版本记录
+VERSION_ID = 1
+
+_local = threading.local()
+# batchUpdate 每一层结束时依次调用 hook(depth, ok): depth 为结束的这一层 (0 为最外层), ok 为 with 块是否正常结束
+_batchHooks = []
+
+
+def getDataVersion():
+    """当前数据版本号, 一次主键查询"""
+    version = DataVersion.objects.filter(pk=VERSION_ID).values_list('version', flat=True).first()
+    if version is None:
+        version = DataVersion.objects.get_or_create(pk=VERSION_ID)[0].version
+    return version
+
+
+def getDataVersionMeta():
+    """当前数据版本号和最后一次递增的时间, {'version': ..., 'updateTime': ...}"""
+    meta = DataVersion.objects.filter(pk=VERSION_ID).values('version', 'updateTime').first()
+    if meta is None:
+        row = DataVersion.objects.get_or_create(pk=VERSION_ID)[0]
+        meta = {'version': row.version, 'updateTime': row.updateTime}
+    return meta
+
+
+def bumpDataVersion():
+    """数据发生变化后递增版本号, 之前按版本缓存的结果随之失效; 在事务内执行, 返回的是主库上的新版本"""
+    with transaction.atomic():
+        updated = DataVersion.objects.filter(pk=VERSION_ID).update(version=F('version') + 1, updateTime=timezone.now())
+        if not updated:
+            DataVersion.objects.get_or_create(pk=VERSION_ID)
+            DataVersion.objects.filter(pk=VERSION_ID).update(version=F('version') + 1, updateTime=timezone.now())
+        return getDataVersion()
+
+
+def registerBatchHook(hook):
+    if hook not in _batchHooks:
+        _batchHooks.append(hook)
+
+
+def batchDepth():
+    return getattr(_local, 'depth', 0)
+
+
+def inBatchUpdate():
+    return batchDepth() > 0
+
+
+@contextmanager
+def batchUpdate():
+    """批量写入期间暂停逐行递增版本号, 全部写完后只递增一次
+
+    整个 with 块在一个事务 (嵌套时为保存点) 内: 正常结束时在同一个事务内写入累积的统计并递增版本, 与数据一起提交;
+    块内出错时数据回滚, 这一层累积的统计随之丢弃, 版本不变
+    """
+    depth = batchDepth()
+    _local.depth = depth + 1
+    try:
+        with transaction.atomic():
+            try:
+                yield
+            finally:
+                _local.depth = depth
+            for hook in _batchHooks:
+                hook(depth, True)
+            if depth == 0:
+                bumpDataVersion()
+    except BaseException:
+        for hook in _batchHooks:
+            hook(depth, False)
+        raise
@@ -1,27 +1,21 @@
 import json
 import time
 from  .getPublicData import *
-import re
+import numpy as np
 def getSquareData():
-    cars= list(getAllCars())
-    carsVolume={}
-    for i in cars:
-        if carsVolume.get(i.carName,-1)==-1:
-            carsVolume[str(i.carName)]=int(i.saleVolume)
-        else:
-            carsVolume[str(i.carName)]+=int(i.saleVolume)
-
-    carSortVolume=sorted(carsVolume.items(),key=lambda x:x[1],reverse=True)[:20]
+    snapshot=getCarSnapshot()
+    carsVolume=snapshot.carName.sums(snapshot.saleVolume)
+    #销量降序, 并列时按首次出现的顺序
+    carSortVolume=np.lexsort((snapshot.carName.firstIndex,-carsVolume))[:20]
     brandList=[]
     volumeList=[]
-    priceList=[]
     for i in carSortVolume:
-        brandList.append(i[0])
-        volumeList.append(i[1])
-    for i in cars[:20]:
-        i.price=re.findall('\d+\.\d',i.price)
-        i.price=i.price[0]
-        priceList.append(float(i.price))
+        brandList.append(snapshot.carName.labels[i])
+        volumeList.append(int(carsVolume[i]))
+    priceList=truncatePrices(snapshot.minPrice[:20])
     return brandList,volumeList,priceList
 
-
+def truncatePrices(prices):
+    #前20辆车的最低价, 保留一位小数(截断); 没有报价的车为 None, nan 不能写入 JSON 列
+    prices=np.floor(np.round(np.asarray(prices,dtype=np.float64)*10,6))/10
+    return [None if np.isnan(i) else i for i in prices.tolist()]
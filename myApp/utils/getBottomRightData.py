@@ -1,23 +1,72 @@
 import json
 import time
 from  .getPublicData import *
-import re
+
+#排名列表只需要的字段
+RANK_FIELDS=('id','brand','rank','carImg','manufacturer','carModel','min_price','max_price',
+             'sale_volume','marketTime','insure')
+DEFAULT_LIMIT=50
+MAX_LIMIT=500
+CHUNK_SIZE=2000
 
 def getRankData():
-    cars=list(getAllCars())
+    snapshot=getCarSnapshot()
     carData=[]
-    for car in cars:
-        car.price=re.findall('\d+\.\d+',car.price)
-        car.price='-'.join(car.price)
+    for i in range(snapshot.size):
         carData.append({
-            'brand':car.brand,
-            'rank': car.rank,
-            'carImg': car.carImg,
-            'manufacturer': car.manufacturer,
-            'carModel': car.carModel,
-            'price': car.price,
-            'saleVolume': car.saleVolume,
-            'marketTime': car.marketTime,
-            'insure': car.insure,
+            'brand':snapshot.brand.value(i),
+            'rank': str(snapshot.rank[i]),
+            'carImg': snapshot.carImg[i],
+            'manufacturer': snapshot.manufacturer.value(i),
+            'carModel': snapshot.carModel.value(i),
+            'price': snapshot.priceText[i],
+            'saleVolume': str(snapshot.saleVolume[i]),
+            'marketTime': snapshot.marketTime.value(i),
+            'insure': snapshot.insure.value(i),
         })
-    return  carData
\ No newline at end of file
+    return  carData
+
+def rankRow(car):
+    #与 getRankData 返回的单条格式保持一致
+    return {
+        'brand':car['brand'],
+        'rank': str(car['rank']),
+        'carImg': car['carImg'],
+        'manufacturer': car['manufacturer'],
+        'carModel': car['carModel'],
+        'price': formatPrice(car['min_price'],car['max_price']),
+        'saleVolume': str(car['sale_volume']),
+        'marketTime': car['marketTime'],
+        'insure': car['insure'],
+    }
+
+def rankQuery(after=None,afterId=None):
+    #按 (rank, id) 排序, 游标之后的数据
+    cars=CarInfomation.objects.order_by('rank','id').values(*RANK_FIELDS)
+    if after is not None:
+        if afterId is None:
+            cars=cars.filter(rank__gt=after)
+        else:
+            cars=cars.filter(Q(rank__gt=after)|Q(rank=after,id__gt=afterId))
+    return cars
+
+def pageLimit(limit):
+    return max(1,min(limit,MAX_LIMIT))
+
+def rankPage(cars,limit):
+    #cars 多取了一条, 用来判断是否还有下一页
+    nextCursor=None
+    if len(cars)>limit:
+        cars=cars[:limit]
+        nextCursor={'after':cars[-1]['rank'],'afterId':cars[-1]['id']}
+    return [rankRow(car) for car in cars],nextCursor
+
+def getRankPage(after=None,afterId=None,limit=DEFAULT_LIMIT):
+    """按排名分页, 返回 (本页数据, 下一页游标); 没有下一页时游标为 None"""
+    limit=pageLimit(limit)
+    return rankPage(list(rankQuery(after,afterId)[:limit+1]),limit)
+
+def iterRankData(after=None,afterId=None,chunkSize=CHUNK_SIZE):
+    """逐块从数据库读取排名数据, 不把整张表放进内存"""
+    for car in rankQuery(after,afterId).iterator(chunk_size=chunkSize):
+        yield rankRow(car)
@@ -1,16 +1,13 @@
 import json
 import time
 from  .getPublicData import *
-import re
+
 def getCircleData():
-    cars=list(getAllCars())
+    snapshot=getCarSnapshot()
     oilData=[]
     eletricdatas=[]
-    for i in cars:
-        if i.energyType=='汽油':
-            oilData.append([i.carName,i.saleVolume,i.energyType])
-        elif i.energyType=='纯电动':
-            eletricdatas.append([i.carName,i.saleVolume,i.energyType])
-    oilData=oilData[:10]
-    eletricdatas=eletricdatas[:10]
-    return oilData,eletricdatas
\ No newline at end of file
+    for i in snapshot.energyType.rowsOf('汽油')[:10]:
+        oilData.append([snapshot.carName.value(i),str(snapshot.saleVolume[i]),'汽油'])
+    for i in snapshot.energyType.rowsOf('纯电动')[:10]:
+        eletricdatas.append([snapshot.carName.value(i),str(snapshot.saleVolume[i]),'纯电动'])
+    return oilData,eletricdatas
@@ -1,85 +1,76 @@
 import json
 import time
 from  .getPublicData import *
-def getBaseData():
-    cars=list(getAllCars())
-    sumCar=len(cars)
 
-    highVolume=cars[0].saleVolume
-    topCar=cars[0].carName
-    #车型
-    carModels={}
-    maxModel=0
-    mostModdel=''
-    for i in cars:
-        if carModels.get(i.carModel,-1) ==-1:
-            carModels[str(i.carModel)] =1
-        else:
-            carModels[str(i.carModel)] +=1
+#以下 *Query 只构造查询, 同步和异步视图共用, 分别用 first()/afirst() 等执行
+#统计数据来自增量维护的 CarAggregate, 查询代价只与分组数有关, 与总行数无关
 
-    carModels=sorted(carModels.items(),key=lambda x:x[1],reverse=True)
-    mostModdel=carModels[0][0]
-    #品牌
-    carBrands={}
-    maxBrand=0
-    mostBrand=''
-    for i in cars:
-        if carBrands.get(i.brand,-1)==-1:
-            carBrands[str(i.brand)]=1
-        else:
-            carBrands[str(i.brand)]+=1
+def mostCommonQuery(field):
+    #出现次数最多的取值, 并列时取最先出现的
+    return (CarAggregate.objects.filter(dimension=field)
+            .order_by('-count','firstId')
+            .values('key','count'))
 
+def firstCarQuery():
+    return CarInfomation.objects.order_by('id').values('carName','sale_volume')
 
+def totalQuery():
+    return CarAggregate.objects.filter(dimension='total').values('count','priceSum')
 
-    for k,v in carBrands.items():
-        if v>maxBrand:
-            maxBrand=v
-            mostBrand=k
+def rollQuery():
+    return (CarAggregate.objects.filter(dimension='brand')
+            .order_by('-count','-key')
+            .values('key','count')[:10])
 
-    carPrices={}
-    averagePrices=0
-    sumPrice=0
-    for i in cars:
-        x=json.loads(i.price)[0]+json.loads(i.price)[1]
-        sumPrice+=x
-    averagePrices=sumPrice/(sumCar*2)
-    averagePrices=round(averagePrices,2)
-    return  sumCar,highVolume,topCar,mostModdel ,mostBrand,averagePrices
+def typeRateQuery():
+    return (CarAggregate.objects.filter(dimension='energyType',key__in=['汽油','纯电动'])
+            .values_list('key','count'))
 
-def getRollData():
-    cars=list(getAllCars())
+def baseData(total,firstCar,modelRow,brandRow):
+    sumCar=total['count'] if total else 0
+    #空表时没有第一辆车, 各项指标为 0 或空
+    highVolume=str(firstCar['sale_volume']) if firstCar else '0'
+    topCar=firstCar['carName'] if firstCar else ''
+    #车型
+    mostModdel=modelRow['key'] if modelRow else ''
+    #品牌
+    mostBrand=brandRow['key'] if brandRow else ''
 
-    carBrands={}
-    for i in cars:
-        if carBrands.get(i.brand,-1)==-1:
-            carBrands[str(i.brand)]=1
-        else:
-            carBrands[str(i.brand)]+=1
-    brandList=[(value,key) for key,value in carBrands.items()]
-    brandList=sorted(brandList,reverse=True)[:10]
-    sortDict={i[1]:i[0] for i in brandList}
+    averagePrices=total['priceSum']/(sumCar*2) if sumCar else 0
+    averagePrices=round(float(averagePrices),2)
+    return  sumCar,highVolume,topCar,mostModdel ,mostBrand,averagePrices
+
+def rollData(carBrands):
     lastSortList=[]
-    for k,v in sortDict.items():
+    for i in carBrands:
         lastSortList.append({
-            'name':k,
-            'value':v,
+            'name':i['key'],
+            'value':i['count'],
         })
     return lastSortList
 
-def  getTypeRate():
-    cars=list(getAllCars())
-    #能源类型
-    carTypes={}
-    for i in cars:
-        if carTypes.get(i.energyType, -1) == -1:
-            carTypes[str(i.energyType)] = 1
-        else:
-            carTypes[str(i.energyType)] += 1
-    oilRate=round(carTypes['汽油']/1234 *100,2)
-    electricRate=round(carTypes['纯电动']/1234 *100,2)
-    mixRate=round(((1234-carTypes['汽油']-carTypes['纯电动'])/1234*100),2)
+def typeRate(carTypes,sumCar):
+    #能源类型, 按实际总数计算占比
+    if not sumCar:
+        return 0,0,0
+    oilCount=carTypes.get('汽油',0)
+    electricCount=carTypes.get('纯电动',0)
+    oilRate=round(oilCount/sumCar *100,2)
+    electricRate=round(electricCount/sumCar *100,2)
+    mixRate=round(((sumCar-oilCount-electricCount)/sumCar*100),2)
     return oilRate,electricRate,mixRate
 
+def totalCount(total):
+    return total['count'] if total else 0
 
+def getBaseData():
+    return baseData(totalQuery().first(),
+                    firstCarQuery().first(),
+                    mostCommonQuery('carModel').first(),
+                    mostCommonQuery('brand').first())
 
+def getRollData():
+    return rollData(rollQuery())
 
+def  getTypeRate():
+    return typeRate(dict(typeRateQuery()),totalCount(totalQuery().first()))
@@ -3,20 +3,14 @@ import time
 from  .getPublicData import *
 
 def getPieBrand():
-    cars=list(getAllCars())
-    carsVolume={}
-    for i in cars:
-        if carsVolume.get(i.brand,-1) ==-1:
-            carsVolume[str(i.brand)] =int(i.saleVolume)
-        else:
-            carsVolume[str(i.brand)] +=int(i.saleVolume)
-
-    carsVolume=sorted(zip(carsVolume.values(),carsVolume.keys()),reverse=True)
-    sortDict = {i[1]: i[0] for i in carsVolume}
+    #品牌销量合计由 CarAggregate 增量维护
+    carsVolume=(CarAggregate.objects.filter(dimension='brand')
+                .order_by('-volumeSum','-key')
+                .values('key','volumeSum')[:10])
     lastPeiList = []
-    for k, v in sortDict.items():
+    for i in carsVolume:
         lastPeiList.append({
-            'name': k,
-            'value': v,
+            'name': i['key'],
+            'value': i['volumeSum'],
         })
-    return lastPeiList[:10]
\ No newline at end of file
+    return lastPeiList
@@ -1,27 +1,64 @@
 import json
+import math
 import time
 from  .getPublicData import *
-import re
-
-def getPriceSortDate():
-    cars=list(getAllCars())
-    priceSortList={'0-5w':0,'5-10w':0,'10-20w':0,'20-30w':0,'30w以上':0,}
-    for i in cars:
-        s= [json.loads(i.price)[0]][0]
-        if s<5:
-            priceSortList['0-5w']+=1
-        elif s>=5 and s<10:
-            priceSortList['5-10w']+=1
-        elif s>=10and s<20:
-            priceSortList['10-20w']+=1
-        elif s>=20 and s<30:
-            priceSortList['20-30w']+=1
-        else:
-            priceSortList['30w以上'] += 1
+import numpy as np
+
+#价格区间的分界(万元), 与下面的区间名一一对应
+PRICE_EDGES=[5,10,20,30]
+PRICE_LABELS=['0-5w','5-10w','10-20w','20-30w','30w以上']
+PRICE_MODES=('min','avg')
+MAX_BINS=50
+
+def formatEdge(edge):
+    return '%g'%edge
+
+def binLabels(edges):
+    #区间名: 0-5w, 5-10w, ..., 30w以上
+    bounds=[0]+list(edges)
+    labels=['%s-%sw'%(formatEdge(low),formatEdge(high)) for low,high in zip(bounds,bounds[1:])]
+    labels.append('%sw以上'%formatEdge(edges[-1]))
+    return labels
+
+def parseBins(text):
+    #?bins=5,10,20,30 -> [5.0,10.0,20.0,30.0], 必须是递增的正数
+    try:
+        edges=[float(i) for i in text.split(',') if i.strip()]
+    except ValueError:
+        raise ValueError('bins 必须是逗号分隔的数字')
+    #float() 也接受 nan / inf, 它们与任何数比较都不成立, 会绕过下面的递增检查
+    if not all(math.isfinite(i) for i in edges):
+        raise ValueError('bins 必须是有限的数字')
+    if not edges or len(edges)>MAX_BINS:
+        raise ValueError('bins 需要 1 到 %d 个分界'%MAX_BINS)
+    if edges[0]<=0 or any(a>=b for a,b in zip(edges,edges[1:])):
+        raise ValueError('bins 必须是递增的正数')
+    return edges
+
+def priceHistogram(snapshot,edges,mode='min'):
+    #区间 i 为 [edges[i-1], edges[i]), 没有价格的车与原来一样计入最后一档
+    #在排好序的价格列上二分查找每个分界, 代价只和分界数有关
+    prices=snapshot.sortedPrice(mode)
+    below=np.searchsorted(prices,edges,side='left')
+    return np.diff(np.concatenate(([0],below,[len(prices)])))
+
+def priceBins(edges,mode):
+    #校验口径, 返回 (分界, 区间名); 不传分界时用默认的五档
+    if mode not in PRICE_MODES:
+        raise ValueError('mode 只能是 %s'%' / '.join(PRICE_MODES))
+    if edges is None:
+        return PRICE_EDGES,PRICE_LABELS
+    return edges,binLabels(edges)
+
+def getPriceSortDate(edges=None,mode='min'):
+    edges,labels=priceBins(edges,mode)
+    return histogramData(labels,priceHistogram(getCarSnapshot(),edges,mode))
+
+def histogramData(labels,counts):
     realData=[]
-    for k,v in priceSortList.items():
+    for k,v in zip(labels,counts):
         realData.append({
             'name':k,
-            'value':v
+            'value':int(v)
         })
-    return realData
\ No newline at end of file
+    return realData
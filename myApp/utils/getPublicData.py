@@ -1,4 +1,10 @@
 from myApp.models import *
+from django.db.models import Q
+from .carSnapshot import getSnapshot, topGroups
+from .parseData import parsePrice, parseInt, formatPrice
 
 def getAllCars():
-    return CarInfomation.objects.all()
\ No newline at end of file
+    return CarInfomation.objects.all()
+
+def getCarSnapshot():
+    return getSnapshot()
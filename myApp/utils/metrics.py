@@ -0,0 +1,131 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+
+# 请求耗时直方图的上界(秒)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 当前请求的统计; sync_to_async 会把上下文带到执行查询的线程里
+currentStats = ContextVar('requestStats', default=None)
+
+
+class RequestStats(object):
+    __slots__ = ('start', 'sqlCount', 'sqlSeconds')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sqlCount = 0
+        self.sqlSeconds = 0.0
+
+
+def sqlTimer(execute, sql, params, many, context):
+    """connection.execute_wrapper: 把每条 SQL 的耗时记到当前请求上"""
+    stats = currentStats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.sqlCount += 1
+        stats.sqlSeconds += time.perf_counter() - start
+
+
+def trackQueries(connection, **kwargs):
+    if sqlTimer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sqlTimer)
+
+
+# 每个线程的数据库连接建立时挂上计时器
+connection_created.connect(trackQueries, dispatch_uid='myApp.metrics.trackQueries')
+
+
+class Histogram(object):
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry(object):
+    """进程内的指标; 多进程部署时每个进程各自统计, 由 Prometheus 按实例汇总"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {}
+        self.requests = {}
+        self.sqlQueries = {}
+        self.sqlSeconds = {}
+        self.responseBytes = {}
+        self.cache = {}
+
+    def record(self, view, status, seconds, stats, size, cacheResult):
+        with self.lock:
+            histogram = self.latency.get(view)
+            if histogram is None:
+                histogram = self.latency[view] = Histogram()
+            histogram.observe(seconds)
+            key = (view, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.sqlQueries[view] = self.sqlQueries.get(view, 0) + stats.sqlCount
+            self.sqlSeconds[view] = self.sqlSeconds.get(view, 0.0) + stats.sqlSeconds
+            if size is not None:
+                self.responseBytes[view] = self.responseBytes.get(view, 0) + size
+            if cacheResult:
+                key = (view, cacheResult.lower())
+                self.cache[key] = self.cache.get(key, 0) + 1
+
+    def render(self):
+        """Prometheus 文本格式"""
+        lines = []
+
+        def family(name, kind, help):
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, kind))
+
+        with self.lock:
+            family('dashboard_request_duration_seconds', 'histogram', 'Request latency by view')
+            for view, histogram in sorted(self.latency.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append('dashboard_request_duration_seconds_bucket{view="%s",le="%s"} %d'
+                                 % (escape(view), bound, cumulative))
+                lines.append('dashboard_request_duration_seconds_sum{view="%s"} %.6f' % (escape(view), histogram.sum))
+                lines.append('dashboard_request_duration_seconds_count{view="%s"} %d' % (escape(view), histogram.count))
+            family('dashboard_requests_total', 'counter', 'Requests by view and status')
+            for (view, status), value in sorted(self.requests.items()):
+                lines.append('dashboard_requests_total{view="%s",status="%s"} %d' % (escape(view), status, value))
+            family('dashboard_sql_queries_total', 'counter', 'SQL statements executed by view')
+            for view, value in sorted(self.sqlQueries.items()):
+                lines.append('dashboard_sql_queries_total{view="%s"} %d' % (escape(view), value))
+            family('dashboard_sql_seconds_total', 'counter', 'Time spent in SQL by view')
+            for view, value in sorted(self.sqlSeconds.items()):
+                lines.append('dashboard_sql_seconds_total{view="%s"} %.6f' % (escape(view), value))
+            family('dashboard_response_bytes_total', 'counter', 'Response body bytes by view (streaming excluded)')
+            for view, value in sorted(self.responseBytes.items()):
+                lines.append('dashboard_response_bytes_total{view="%s"} %d' % (escape(view), value))
+            family('dashboard_cache_total', 'counter', 'Response cache hits and misses by view')
+            for (view, result), value in sorted(self.cache.items()):
+                lines.append('dashboard_cache_total{view="%s",result="%s"} %d' % (escape(view), result, value))
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self.lock:
+            for table in (self.latency, self.requests, self.sqlQueries, self.sqlSeconds, self.responseBytes, self.cache):
+                table.clear()
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
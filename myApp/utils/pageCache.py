@@ -0,0 +1,166 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+DEFAULT_TTL = 30 * 24 * 3600
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_used ON pages (used);
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    refs INTEGER NOT NULL
+);
+"""
+
+CachedPage = namedtuple('CachedPage', 'key digest etag lastModified fetched')
+
+
+class PageCache(object):
+    """详情页的磁盘缓存
+
+    页面内容按 sha256 存成 zlib 压缩的文件 (内容相同的页面只存一份), 索引按 key (车系 id) 记在 SQLite 中。
+    缓存在 ttl 秒内直接使用; 过期后带 If-None-Match / If-Modified-Since 重新请求, 304 时继续使用旧内容。
+    压缩后的总大小超过 maxBytes 时按最近使用时间淘汰。
+    """
+
+    def __init__(self, directory, ttl=DEFAULT_TTL, maxBytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.maxBytes = maxBytes
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(directory, 'index.sqlite3'), check_same_thread=False,
+                                  isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+        self.totalBytes = self.db.execute('SELECT coalesce(sum(size), 0) FROM blobs').fetchone()[0]
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'evicted': 0}
+
+    def blobPath(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], digest[2:])
+
+    def lookup(self, key):
+        with self.lock:
+            row = self.db.execute('SELECT key, digest, etag, last_modified, fetched FROM pages WHERE key = ?',
+                                  (str(key),)).fetchone()
+        return None if row is None else CachedPage(*row)
+
+    def read(self, page):
+        try:
+            with open(self.blobPath(page.digest), 'rb') as f:
+                return zlib.decompress(f.read()).decode('utf-8')
+        except (OSError, zlib.error):
+            # 文件被删除或损坏时当作没有缓存
+            return None
+
+    def writeBlob(self, digest, data):
+        path = self.blobPath(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def store(self, key, text, etag=None, lastModified=None):
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        compressed = zlib.compress(data, 6)
+        now = time.time()
+        with self.lock:
+            # 在锁内写文件, 避免与淘汰同一内容的线程交错
+            self.writeBlob(digest, compressed)
+            self.db.execute('BEGIN')
+            old = self.db.execute('SELECT digest FROM pages WHERE key = ?', (str(key),)).fetchone()
+            if old is None or old[0] != digest:
+                if old is not None:
+                    self.release(old[0])
+                if self.db.execute('UPDATE blobs SET refs = refs + 1 WHERE digest = ?', (digest,)).rowcount == 0:
+                    self.db.execute('INSERT INTO blobs (digest, size, refs) VALUES (?, ?, 1)', (digest, len(compressed)))
+                    self.totalBytes += len(compressed)
+            self.db.execute('INSERT OR REPLACE INTO pages (key, digest, etag, last_modified, fetched, used)'
+                            ' VALUES (?, ?, ?, ?, ?, ?)', (str(key), digest, etag, lastModified, now, now))
+            self.evict()
+            self.db.execute('COMMIT')
+        return text
+
+    def release(self, digest):
+        """某个页面不再引用 digest; 没有页面引用时删除文件 (调用方持有 self.lock)"""
+        self.db.execute('UPDATE blobs SET refs = refs - 1 WHERE digest = ?', (digest,))
+        row = self.db.execute('SELECT size, refs FROM blobs WHERE digest = ?', (digest,)).fetchone()
+        if row is not None and row[1] <= 0:
+            self.db.execute('DELETE FROM blobs WHERE digest = ?', (digest,))
+            self.totalBytes -= row[0]
+            try:
+                os.remove(self.blobPath(digest))
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """超过 maxBytes 时从最久没用过的页面开始删除 (调用方持有 self.lock)"""
+        while self.totalBytes > self.maxBytes:
+            row = self.db.execute('SELECT key, digest FROM pages ORDER BY used LIMIT 1').fetchone()
+            if row is None:
+                break
+            self.db.execute('DELETE FROM pages WHERE key = ?', (row[0],))
+            self.release(row[1])
+            self.stats['evicted'] += 1
+
+    def touch(self, key, revalidated=False):
+        now = time.time()
+        with self.lock:
+            if revalidated:
+                self.db.execute('UPDATE pages SET fetched = ?, used = ? WHERE key = ?', (now, now, str(key)))
+            else:
+                self.db.execute('UPDATE pages SET used = ? WHERE key = ?', (now, str(key)))
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def fetch(self, fetcher, key, url):
+        """返回 url 的页面内容, 优先使用缓存"""
+        page = self.lookup(key)
+        text = None if page is None else self.read(page)
+        if text is not None and time.time() - page.fetched < self.ttl:
+            self.touch(key)
+            self.count('hits')
+            return text
+        headers = {}
+        if text is not None:
+            if page.etag:
+                headers['If-None-Match'] = page.etag
+            if page.lastModified:
+                headers['If-Modified-Since'] = page.lastModified
+        response = fetcher.get(url, headers=headers)
+        if response.status_code == 304 and text is not None:
+            self.touch(key, revalidated=True)
+            self.count('revalidated')
+            return text
+        self.count('misses')
+        return self.store(key, response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,23 @@
+import re
+from decimal import Decimal
+
+
+def parsePrice(price):
+    """把 "[3.58, 4.68]" 形式的价格解析为 (最低价, 最高价), 无法解析时返回 (None, None)"""
+    prices = re.findall(r'\d+(?:\.\d+)?', str(price))
+    if not prices:
+        return None, None
+    return Decimal(prices[0]), Decimal(prices[-1])
+
+
+def parseInt(value, default=0):
+    """把 "51743" / 51743.0 这类销量、排名文本转成整数"""
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def formatPrice(minPrice, maxPrice):
+    """把数值价格还原成 "3.58-4.68" 形式的展示文本"""
+    return '-'.join('{:f}'.format(Decimal(i).normalize()) for i in (minPrice, maxPrice) if i is not None)
@@ -0,0 +1,165 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from django.db import connections
+
+# 上游结束的标记
+END = object()
+
+
+class Stopped(Exception):
+    """其他阶段出错或被中断, 本阶段随之退出"""
+
+
+class StageStats(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        # 等待上游 (队列为空) 和等待下游 (队列已满, 即背压) 的秒数
+        self.waitIn = 0.0
+        self.waitOut = 0.0
+        self.start = self.end = None
+
+    @property
+    def seconds(self):
+        if self.start is None:
+            return 0.0
+        return (self.end or time.perf_counter()) - self.start
+
+    @property
+    def perSecond(self):
+        return self.items / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return '%-10s %8d 条 %10.1f 条/秒  等待上游 %6.1f 秒  等待下游 %6.1f 秒' % (
+            self.name, self.items, self.perSecond, self.waitIn, self.waitOut)
+
+
+class Pipeline(object):
+    """生成器流水线: 每个阶段是 func(items) -> 生成器, 在自己的线程中运行, 相邻阶段之间是长度为 queueSize 的队列
+
+    下游处理不过来时队列写满, 上游阻塞在 put 上 (背压), 在途的数据最多约 queueSize × 阶段数 条, 与总量无关;
+    任何一个阶段抛出异常 (包括 KeyboardInterrupt) 时其余阶段随之停止, run() 抛出该异常。
+    每个 Pipeline 只运行一次, 结束后各阶段的统计在 stats 中。
+    """
+
+    def __init__(self, queueSize=64, poll=0.1):
+        self.queueSize = queueSize
+        self.poll = poll
+        self.stages = []
+        self.stats = []
+        self.stopped = threading.Event()
+        self.errors = []
+
+    def add(self, name, func):
+        self.stages.append((name, func))
+        return self
+
+    def get(self, inbox, stats):
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    return inbox.get(timeout=self.poll)
+                except queue.Empty:
+                    if self.stopped.is_set():
+                        raise Stopped()
+        finally:
+            stats.waitIn += time.perf_counter() - start
+
+    def put(self, outbox, item, stats):
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    return outbox.put(item, timeout=self.poll)
+                except queue.Full:
+                    if self.stopped.is_set():
+                        raise Stopped()
+        finally:
+            stats.waitOut += time.perf_counter() - start
+
+    def receive(self, inbox, stats):
+        while True:
+            item = self.get(inbox, stats)
+            if item is END:
+                return
+            yield item
+
+    def runStage(self, func, items, outbox, stats):
+        stats.start = time.perf_counter()
+        try:
+            for item in func(items):
+                stats.items += 1
+                if outbox is not None:
+                    self.put(outbox, item, stats)
+            if outbox is not None:
+                self.put(outbox, END, stats)
+        except Stopped:
+            pass
+        except BaseException as e:
+            self.errors.append(e)
+            self.stopped.set()
+        finally:
+            stats.end = time.perf_counter()
+            # 线程中打开的数据库连接随线程结束关闭
+            connections.close_all()
+
+    def run(self, source=()):
+        """把 source 交给第一个阶段, 运行到最后一个阶段结束, 返回各阶段的统计"""
+        queues = [queue.Queue(self.queueSize) for _ in self.stages[1:]]
+        self.stats = [StageStats(name) for name, _ in self.stages]
+        # 每个阶段从上一个阶段的队列读取, 等待时间记在读取的阶段上
+        inputs = [iter(source)] + [self.receive(inbox, stats) for inbox, stats in zip(queues, self.stats[1:])]
+        threads = [
+            threading.Thread(target=self.runStage, args=(func, items, outbox, stats), name='pipeline-%s' % name,
+                             daemon=True)
+            for (name, func), items, outbox, stats in zip(self.stages, inputs, queues + [None], self.stats)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except BaseException:
+            self.stopped.set()
+            for thread in threads:
+                thread.join()
+            raise
+        if self.errors:
+            raise self.errors[0]
+        return self.stats
+
+
+def batched(items, size, interval=None):
+    """每 size 条合成一个列表; 设置了 interval 时, 一批从第一条起超过 interval 秒也会提前交出"""
+    batch = []
+    started = None
+    for item in items:
+        if not batch:
+            started = time.monotonic()
+        batch.append(item)
+        if len(batch) >= size or (interval is not None and time.monotonic() - started >= interval):
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def dedupe(items, key, window=100000, skipped=None):
+    """去掉最近 window 个不同的键中已经出现过的条目, 丢弃时调用 skipped(item); 只记最近的键, 内存不随数据量增长"""
+    seen = OrderedDict()
+    for item in items:
+        value = key(item)
+        if value in seen:
+            seen.move_to_end(value)
+            if skipped is not None:
+                skipped(item)
+            continue
+        seen[value] = None
+        if len(seen) > window:
+            seen.popitem(last=False)
+        yield item
@@ -0,0 +1,67 @@
+import json
+import os
+import pstats
+import time
+import uuid
+
+from django.conf import settings
+
+# 汇总时默认只看这些模块里的函数
+UTILS_PATTERN = os.path.join('myApp', 'utils', '')
+# 排序方式对应 functionRows 返回的列
+SORT_COLUMNS = {'calls': 0, 'tottime': 1, 'cumulative': 2}
+
+
+def profileDir():
+    return str(getattr(settings, 'DASHBOARD_PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles')))
+
+
+def newProfileId():
+    return '%s-%s' % (time.strftime('%Y%m%d-%H%M%S'), uuid.uuid4().hex[:8])
+
+
+def profilePath(profileId, suffix='.prof'):
+    # id 只允许由 newProfileId 生成的字符, 防止拼出目录外的路径
+    if not profileId or not all(c.isalnum() or c == '-' for c in profileId):
+        raise ValueError('无效的 profile id: %r' % profileId)
+    return os.path.join(profileDir(), profileId + suffix)
+
+
+def saveProfile(profileId, profiler, meta):
+    """写入 <id>.prof (pstats 格式) 和 <id>.json (请求信息)"""
+    os.makedirs(profileDir(), exist_ok=True)
+    profiler.dump_stats(profilePath(profileId))
+    with open(profilePath(profileId, '.json'), 'w', encoding='utf-8') as f:
+        json.dump(dict(meta, id=profileId), f, ensure_ascii=False)
+
+
+def listProfiles():
+    """按时间倒序返回已保存的 profile 信息"""
+    directory = profileDir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                profiles.append(json.load(f))
+    return sorted(profiles, key=lambda meta: meta['id'], reverse=True)
+
+
+def loadStats(profileIds):
+    """合并多个 profile 的统计"""
+    stats = pstats.Stats(profilePath(profileIds[0]))
+    for profileId in profileIds[1:]:
+        stats.add(profilePath(profileId))
+    return stats
+
+
+def functionRows(stats, pattern=UTILS_PATTERN, sort='cumulative', limit=20):
+    """(调用次数, 自身耗时, 累计耗时, 函数) 列表; pattern 为空时不过滤"""
+    rows = []
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        if pattern and pattern not in filename:
+            continue
+        rows.append((calls, tottime, cumtime, '%s:%d(%s)' % (filename, line, name)))
+    rows.sort(key=lambda row: row[SORT_COLUMNS[sort]], reverse=True)
+    return rows[:limit]
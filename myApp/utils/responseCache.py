@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .asyncData import agetDataVersion
+from .dataVersion import getDataVersion
+from .fastResponse import representation
+
+# 随响应一起缓存的头
+CACHED_HEADERS = ('Content-Type', 'Cache-Control', 'Content-Encoding', 'Vary')
+
+
+def getCache():
+    return caches[getattr(settings, 'DASHBOARD_CACHE_ALIAS', 'default')]
+
+
+def cacheKey(request, version):
+    """缓存键由数据版本、路由、排序后的查询参数和响应表示形式组成, 版本一变旧键自然失效"""
+    params = '&'.join('%s=%s' % (k, v) for k, v in sorted(request.GET.lists()))
+    fmt, encoding = representation(request)
+    digest = hashlib.md5(('%s?%s#%s;%s' % (request.path, params, fmt, encoding)).encode('utf-8')).hexdigest()
+    return 'myApp:view:%s:%s' % (version, digest)
+
+
+def cachedResponse(cached):
+    status, headers, content = cached
+    response = HttpResponse(content, status=status)
+    for name, value in headers.items():
+        response[name] = value
+    response['X-Cache'] = 'HIT'
+    return response
+
+
+def cacheEntry(response):
+    """可缓存时返回 (status, headers, content), 否则返回 None"""
+    if response is None or response.status_code != 200 or response.streaming:
+        return None
+    headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+    return response.status_code, headers, response.content
+
+
+def cacheTimeout(timeout):
+    return timeout if timeout is not None else getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 600)
+
+
+def cacheResponse(timeout=None):
+    """按数据版本缓存 GET 请求的完整响应, 同步和异步视图都可以用"""
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def asyncWrapper(request, *args, **kwargs):
+                if request.method != 'GET':
+                    return await view(request, *args, **kwargs)
+                cache = getCache()
+                version = getattr(request, '_dataVersion', None)
+                if version is None:
+                    version = await agetDataVersion()
+                key = cacheKey(request, version)
+                cached = await cache.aget(key)
+                if cached is not None:
+                    return cachedResponse(cached)
+                response = await view(request, *args, **kwargs)
+                entry = cacheEntry(response)
+                if entry is not None:
+                    await cache.aset(key, entry, cacheTimeout(timeout))
+                if response is not None:
+                    response['X-Cache'] = 'MISS'
+                return response
+            return asyncWrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            cache = getCache()
+            # 条件请求阶段已经查过版本时直接复用
+            version = getattr(request, '_dataVersion', None)
+            if version is None:
+                version = getDataVersion()
+            key = cacheKey(request, version)
+            cached = cache.get(key)
+            if cached is not None:
+                return cachedResponse(cached)
+            response = view(request, *args, **kwargs)
+            entry = cacheEntry(response)
+            if entry is not None:
+                cache.set(key, entry, cacheTimeout(timeout))
+            if response is not None:
+                response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
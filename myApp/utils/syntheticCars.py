@@ -0,0 +1,114 @@
+import csv
+from itertools import islice
+
+import numpy as np
+from django.db import connection, transaction
+
+from myApp.models import CarAggregate, CarInfomation, DashboardPanel, DashboardSnapshot
+from .carAggregates import rebuildAggregates
+from .dataVersion import bumpDataVersion
+from .parseData import parsePrice
+
+# 与 temp.csv 相同的列顺序
+CSV_FIELDS = ['brand', 'carName', 'carImg', 'saleVolume', 'price', 'manufacturer', 'rank',
+              'carModel', 'energyType', 'marketTime', 'insure']
+
+# (品牌, 厂商), 靠前的品牌车型更多 (按 Zipf 分布抽样)
+BRANDS = [
+    ('比亚迪', '比亚迪'), ('本田', '广汽本田'), ('大众', '一汽-大众'), ('丰田', '一汽丰田'), ('红旗', '一汽红旗'),
+    ('长安', '长安汽车'), ('五菱汽车', '上汽通用五菱'), ('领克', '领克汽车'), ('奥迪', '一汽-大众奥迪'),
+    ('荣威', '上汽集团'), ('吉利汽车', '吉利汽车'), ('吉利银河', '吉利汽车'), ('特斯拉', '特斯拉中国'),
+    ('零跑汽车', '零跑汽车'), ('日产', '东风日产'), ('奇瑞', '奇瑞汽车'), ('宝马', '华晨宝马'),
+    ('奔驰', '北京奔驰'), ('理想汽车', '理想汽车'), ('问界', '赛力斯汽车'), ('小鹏汽车', '小鹏汽车'),
+    ('哈弗', '长城汽车'), ('别克', '上汽通用别克'), ('蔚来', '蔚来'), ('小米汽车', '小米汽车'),
+    ('极氪', '极氪'), ('深蓝汽车', '长安汽车'), ('埃安', '广汽埃安'), ('传祺', '广汽传祺'), ('捷途', '奇瑞汽车'),
+]
+# 按 temp.csv 中的实际占比
+ENERGY_TYPES = [('汽油', 0.37), ('纯电动', 0.345), ('插电式混合动力', 0.172), ('增程式', 0.052),
+                ('48V轻混系统', 0.047), ('油电混合', 0.013), ('柴油', 0.001)]
+CAR_MODELS = [('紧凑型SUV', 127), ('中型SUV', 96), ('紧凑型车', 73), ('中大型SUV', 66), ('中型车', 61),
+              ('中大型车', 45), ('中大型MPV', 35), ('小型SUV', 31), ('微型车', 18), ('小型车', 17),
+              ('大型SUV', 13), ('紧凑型MPV', 12)]
+INSURES = [('3年或10万公里', 233), ('6年或15万公里', 90), ('4年或10万公里', 61), ('5年或10万公里', 38),
+           ('3年或12万公里', 37), ('5年或15万公里', 29), ('3年不限公里', 26), ('4年或15万公里', 18)]
+MARKET_TIMES = ['2024.%02d' % month for month in range(1, 13)] + ['2025.%02d' % month for month in range(1, 11)]
+CAR_IMG = 'https://p3-dcd.byteimg.com/tos-cn-i-dcdx/synthetic~tplv-resize:640:0.png'
+
+BATCH_SIZE = 5000
+
+
+def choices(rng, options, count):
+    """按 (取值, 权重) 抽样"""
+    labels = [label for label, _ in options]
+    weights = np.array([weight for _, weight in options], dtype=np.float64)
+    return np.array(labels, dtype=object)[rng.choice(len(labels), size=count, p=weights / weights.sum())]
+
+
+def generateCars(count, seed=0):
+    """生成 count 行与爬虫输出格式相同的合成数据, 逐行返回 CSV_FIELDS 顺序的列表
+
+    品牌服从 Zipf 分布, 能源类型 / 车型 / 质保按实际占比, 价格和销量为对数正态, 排名按销量降序
+    """
+    rng = np.random.default_rng(seed)
+    zipf = 1 / np.arange(1, len(BRANDS) + 1) ** 1.1
+    brandIndex = rng.choice(len(BRANDS), size=count, p=zipf / zipf.sum())
+    energyTypes = choices(rng, ENERGY_TYPES, count)
+    carModels = choices(rng, CAR_MODELS, count)
+    insures = choices(rng, INSURES, count)
+    marketTimes = np.array(MARKET_TIMES, dtype=object)[rng.integers(len(MARKET_TIMES), size=count)]
+    minPrices = np.round(np.clip(rng.lognormal(2.6, 0.6, count), 2.5, 300), 2)
+    maxPrices = np.round(minPrices * rng.uniform(1.05, 1.6, count), 2)
+    volumes = np.sort(np.maximum(rng.lognormal(7.5, 1.4, count).astype(np.int64), 1))[::-1]
+    for row in range(count):
+        brand, manufacturer = BRANDS[brandIndex[row]]
+        yield [
+            brand,
+            '%s %s%d' % (brand, carModels[row], row),
+            CAR_IMG,
+            int(volumes[row]),
+            '[%s, %s]' % (minPrices[row], maxPrices[row]),
+            manufacturer,
+            row + 1,
+            carModels[row],
+            energyTypes[row],
+            marketTimes[row],
+            insures[row],
+        ]
+
+
+def writeCsv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        writer.writerows(rows)
+
+
+def carFromRow(row):
+    car = dict(zip(CSV_FIELDS, row))
+    car['min_price'], car['max_price'] = parsePrice(car['price'])
+    car['sale_volume'] = car['saleVolume']
+    return CarInfomation(**car)
+
+
+def clearCars():
+    """清空车辆数据及由它派生的表; 直接执行 DELETE, 不逐行触发信号"""
+    with connection.cursor() as cursor:
+        for model in (CarInfomation, CarAggregate, DashboardSnapshot, DashboardPanel):
+            cursor.execute('DELETE FROM %s' % connection.ops.quote_name(model._meta.db_table))
+    bumpDataVersion()
+
+
+def loadCars(rows, batchSize=BATCH_SIZE):
+    """分批 bulk_create 写入, 写完后全量重建分组统计并递增数据版本"""
+    rows = iter(rows)
+    total = 0
+    with transaction.atomic():
+        while True:
+            batch = [carFromRow(row) for row in islice(rows, batchSize)]
+            if not batch:
+                break
+            CarInfomation.objects.bulk_create(batch)
+            total += len(batch)
+    rebuildAggregates()
+    bumpDataVersion()
+    return total
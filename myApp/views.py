@@ -1,79 +1,160 @@
-from django.shortcuts import render
-from django.http import JsonResponse,HttpResponse
+import json
+from django.http import JsonResponse,HttpResponse,StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
 # Create your views here.
-from  .utils import  getCenterData
-from  .utils import getPublicData
-from  .utils import getCenterLeftData
-from  .utils import  getBottomLeftData
 from  .utils import  getCenterRightData
-from .utils import  getCenterChangeData
 from .utils import getBottomRightData
+from .utils import aggregateEngine
+from .utils.dashboardSnapshot import getPanel, getPanels, dashboardEtag, dashboardLastModified, panelSource
+from .utils.responseCache import cacheResponse
+from .utils.dataVersion import getDataVersion
+from .utils.fastResponse import FastJsonResponse
+from .utils.broadcaster import broadcaster, eventStream
+from .utils.metrics import registry
+from django.conf import settings
 
-def center(request):
+def dashboardCondition(view):
+    #所有面板共用数据版本做条件请求, 数据没变时直接返回304; ETag 区分格式和压缩, 304 也带上 Vary
+    view=condition(etag_func=dashboardEtag,last_modified_func=dashboardLastModified)(view)
+    return vary_on_headers('Accept','Accept-Encoding')(view)
 
-    if request.method=='GET':
-        sumCar,highVolume,topCar,mostModdel ,mostBrand,averagePrices=getCenterData.getBaseData()
-        lastSortList= getCenterData.getRollData()
-        oilRate,electricRate,mixRate=getCenterData.getTypeRate()
-        return JsonResponse({
-            'sumCar':sumCar,
-            'highVolume':highVolume,
-            'topCar':topCar,
-            'mostModdel':mostModdel,
-            'mostBrand':mostBrand,
-            'averagePrices':averagePrices,
-            'oilRate':oilRate,
-            'lastSortList':lastSortList,
-            'electricRate': electricRate,
-            'mixRate': mixRate,
+def panelResponse(request,data):
+    response=FastJsonResponse(data,request)
+    #让浏览器每次都带上 If-None-Match 重新验证
+    patch_cache_control(response,no_cache=True)
+    return response
 
+@dashboardCondition
+@cacheResponse()
+def dashboard(request):
+    if request.method=='GET':
+        return panelResponse(request,getPanels()[1])
 
+@dashboardCondition
+@cacheResponse()
+def center(request):
 
-        })
+    if request.method=='GET':
+        return panelResponse(request,getPanel('center'))
 
+@dashboardCondition
+@cacheResponse()
 def centerLeft(request):
     if request.method=='GET':
-        lastPeiList=getCenterLeftData.getPieBrand()
-        return JsonResponse({
-                'lastPeiList':lastPeiList,
-
-
-
-        })
+        return panelResponse(request,getPanel('centerLeft'))
 
+@dashboardCondition
+@cacheResponse()
 def bottomLeft(request):
     if request.method == 'GET':
-        brandList,volumeList,priceList=getBottomLeftData.getSquareData()
-        return JsonResponse({
-        'brandList':brandList,
-        'volumeList':volumeList,
-        'priceList':priceList
-
-        })
+        return panelResponse(request,getPanel('bottomLeft'))
 
+@dashboardCondition
+@cacheResponse()
 def centerRight(request):
     if request.method == 'GET':
-        realData=getCenterRightData.getPriceSortDate()
-        return JsonResponse({
-            'realData':realData
-        })
+        #?bins=5,10,20,30 自定义价格分界, ?mode=avg 按均价分档
+        if 'bins' in request.GET or 'mode' in request.GET:
+            try:
+                realData=priceHistogramData(request)
+            except ValueError as e:
+                return JsonResponse({'error':str(e)},status=400)
+            return panelResponse(request,{'realData':realData})
+        return panelResponse(request,getPanel('centerRight'))
+
+def priceHistogramData(request):
+    edges=request.GET.get('bins')
+    if edges is not None:
+        edges=getCenterRightData.parseBins(edges)
+    return panelSource().getPriceSortDate(edges,request.GET.get('mode','min'))
 
+@dashboardCondition
+@cacheResponse()
 def centerRightChange(request,energyType):
     if request.method == 'GET':
-        oilData,eletricdatas=getCenterChangeData.getCircleData()
-        realData=[]
+        panels=getPanel('centerRightChange')
         if energyType==1:
-            realData=oilData
+            realData=panels['oil']
         else:
-            realData=eletricdatas
-        return JsonResponse({
-            'realData':realData,
-        })
+            realData=panels['electric']
+        return panelResponse(request,realData)
+
+def intParam(request,name,default=None):
+    value=request.GET.get(name)
+    if value in (None,''):
+        return default
+    return int(value)
 
+@dashboardCondition
+@cacheResponse()
 def bottomRight(request):
     if request.method == 'GET':
-        carData=getBottomRightData.getRankData()
+        #不带分页参数时保持原来的整表返回; 整表不放进快照, 直接计算, 同一版本内由响应缓存复用
+        if not any(name in request.GET for name in ('after','afterId','limit')) and request.GET.get('format')!='ndjson':
+            return panelResponse(request,{'carData':panelSource().getRankData()})
+        try:
+            after=intParam(request,'after')
+            afterId=intParam(request,'afterId')
+            limit=intParam(request,'limit',getBottomRightData.DEFAULT_LIMIT)
+        except ValueError:
+            return JsonResponse({'error':'after / afterId / limit 必须是整数'},status=400)
+        if request.GET.get('format')=='ndjson':
+            #逐行输出 NDJSON, 首字节不用等整张表查完
+            rows=(json.dumps(car,ensure_ascii=False)+'\n' for car in getBottomRightData.iterRankData(after,afterId))
+            return StreamingHttpResponse(rows,content_type='application/x-ndjson; charset=utf-8')
+        carData,nextCursor=getBottomRightData.getRankPage(after,afterId,limit)
+        return panelResponse(request,{
+            'carData':carData,
+            'next':nextCursor,
+        })
+
+@dashboardCondition
+@cacheResponse()
+def aggregate(request):
+    #通用统计: ?group_by=brand&metric=sum:saleVolume&filter=energyType:汽油&top=10
+    if request.method == 'GET':
+        try:
+            top=intParam(request,'top',aggregateEngine.DEFAULT_TOP)
+        except ValueError:
+            return JsonResponse({'error':'top 必须是整数'},status=400)
+        try:
+            data=aggregateEngine.getAggregate(request.GET.get('group_by'),
+                                             request.GET.get('metric','count'),
+                                             request.GET.getlist('filter'),
+                                             top)
+        except ValueError as e:
+            return JsonResponse({'error':str(e)},status=400)
+        return panelResponse(request,data)
+
+def dashboardStatus(request):
+    #前端据此选择推送还是轮询; 轮询时只查一次数据版本, 版本变了再取面板
+    response=JsonResponse({
+        'version':getDataVersion(),
+        'stream':settings.DASHBOARD_STREAM_ENABLED,
+        'pollInterval':getattr(settings,'DASHBOARD_POLL_INTERVAL',30),
+    })
+    patch_cache_control(response,no_cache=True)
+    return response
+
+async def dashboardStream(request):
+    #SSE 推送通道, 需要在 ASGI 下运行; 所有连接共用一个进程内的广播协程
+    if not settings.DASHBOARD_STREAM_ENABLED:
+        return JsonResponse({'error':'推送通道未开启, 请轮询 /myApp/dashboard/status/'},status=404)
+    queue=broadcaster.subscribe()
+    response=StreamingHttpResponse(
+        eventStream(queue,
+                    heartbeat=getattr(settings,'DASHBOARD_STREAM_HEARTBEAT',15),
+                    maxAge=getattr(settings,'DASHBOARD_STREAM_MAX_AGE',600)),
+        content_type='text/event-stream')
+    response['Cache-Control']='no-cache'
+    response['X-Accel-Buffering']='no'
+    return response
 
-        return JsonResponse({
-            'carData':carData
-        })
\ No newline at end of file
+def metrics(request):
+    #Prometheus 抓取接口, 只对 DASHBOARD_METRICS_ALLOWED_IPS 中的地址开放
+    allowed=getattr(settings,'DASHBOARD_METRICS_ALLOWED_IPS',None)
+    if allowed is not None and request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponse(status=403)
+    return HttpResponse(registry.render(),content_type='text/plain; version=0.0.4; charset=utf-8')
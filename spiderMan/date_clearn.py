@@ -1,29 +1,71 @@
+import argparse
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.model_selection import train_test_split
-from sklearn.neural_network import MLPRegressor, MLPClassifier
-from sklearn.ensemble import IsolationForest
-from sklearn.impute import SimpleImputer
-import tensorflow as tf
-from tensorflow import keras
-from tensorflow.keras import layers
 import re
 import warnings
 
+# sklearn / tensorflow / matplotlib 导入很慢且占内存, 只在用到它们的步骤里导入;
+# 只做价格、保修解析时 (--stages price,warranty,save) 不会加载
+
 warnings.filterwarnings('ignore')
 
+# run_complete_cleaning 的步骤及对应的方法, 按执行顺序; 加载数据总是最先执行
+STAGES = {
+    'explore': 'explore_data',
+    'price': 'preprocess_price',
+    'warranty': 'preprocess_warranty',
+    'missing': 'handle_missing_values_neural',
+    'validate': 'validate_and_correct_data',
+    'features': 'create_derived_features',
+    'model': 'build_validation_model',
+    'anomalies': 'predict_anomalies',
+    'report': 'generate_cleaning_report',
+    'visualize': 'visualize_cleaning_results',
+    'save': 'save_cleaned_data',
+}
+# 各步骤依赖的前置步骤 (用到了它们生成的列), 只选部分步骤时自动补上
+STAGE_REQUIRES = {
+    'missing': ['price'],
+    'validate': ['price'],
+    'features': ['price'],
+    'model': ['price'],
+    'anomalies': ['price', 'model'],
+    'visualize': ['price'],
+}
+
+
+def resolve_stages(stages=None):
+    """把选中的步骤补全依赖并按执行顺序排列; stages 为 None 时返回全部步骤"""
+    if stages is None:
+        return list(STAGES)
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        raise ValueError(f"未知的步骤: {', '.join(unknown)}, 可选: {', '.join(STAGES)}")
+    selected = set()
+    pending = list(stages)
+    while pending:
+        stage = pending.pop()
+        if stage not in selected:
+            selected.add(stage)
+            pending.extend(STAGE_REQUIRES.get(stage, []))
+    return [stage for stage in STAGES if stage in selected]
+
 
 class CarDataCleaner:
     def __init__(self, file_path):
         self.file_path = file_path
         self.df = None
         self.cleaned_df = None
-        self.scaler = StandardScaler()
+        self.scaler = None
         self.models = {}
 
+    def get_scaler(self):
+        """第一次用到时才创建 StandardScaler"""
+        if self.scaler is None:
+            from sklearn.preprocessing import StandardScaler
+            self.scaler = StandardScaler()
+        return self.scaler
+
     def load_data(self):
         """加载CSV数据"""
         try:
@@ -118,6 +160,8 @@ class CarDataCleaner:
     def detect_outliers_neural(self, features, contamination=0.05):
         """使用神经网络检测异常值"""
         print("\n使用神经网络检测异常值...")
+        from sklearn.ensemble import IsolationForest
+        from sklearn.impute import SimpleImputer
 
         # 使用 Isolation Forest（基于神经网络思想）
         iso_forest = IsolationForest(contamination=contamination, random_state=42)
@@ -127,7 +171,7 @@ class CarDataCleaner:
         features_imputed = imputer.fit_transform(features)
 
         # 标准化
-        features_scaled = self.scaler.fit_transform(features_imputed)
+        features_scaled = self.get_scaler().fit_transform(features_imputed)
 
         # 检测异常值
         outliers = iso_forest.fit_predict(features_scaled)
@@ -162,6 +206,7 @@ class CarDataCleaner:
                         X_pred = unknown_data[other_features]
 
                         # 使用神经网络回归预测缺失值
+                        from sklearn.neural_network import MLPRegressor
                         nn_model = MLPRegressor(hidden_layer_sizes=(50, 25), random_state=42, max_iter=1000)
                         nn_model.fit(X_train, y_train)
 
@@ -242,6 +287,8 @@ class CarDataCleaner:
     def build_validation_model(self):
         """构建数据验证神经网络模型"""
         print("\n构建数据验证神经网络模型...")
+        from tensorflow import keras
+        from tensorflow.keras import layers
 
         # 准备特征
         features = ['saleVolume', 'min_price', 'max_price', 'avg_price', 'rank']
@@ -251,7 +298,7 @@ class CarDataCleaner:
         data_for_model = data_for_model.fillna(data_for_model.median())
 
         # 标准化
-        X_scaled = self.scaler.fit_transform(data_for_model)
+        X_scaled = self.get_scaler().fit_transform(data_for_model)
 
         # 构建自编码器用于异常检测
         input_dim = X_scaled.shape[1]
@@ -357,6 +404,8 @@ class CarDataCleaner:
 
     def visualize_cleaning_results(self):
         """可视化清洗结果"""
+        import matplotlib.pyplot as plt
+
         fig, axes = plt.subplots(2, 2, figsize=(15, 12))
 
         # 1. 价格分布
@@ -387,58 +436,45 @@ class CarDataCleaner:
         plt.savefig('data_cleaning_visualization.png', dpi=300, bbox_inches='tight')
         plt.show()
 
-    def run_complete_cleaning(self):
-        """运行完整的数据清洗流程"""
+    def run_complete_cleaning(self, stages=None):
+        """运行数据清洗流程; stages 为要运行的步骤 (见 STAGES), 默认全部运行"""
+        stages = resolve_stages(stages)
         print("开始汽车数据清洗流程...")
 
-        # 1. 加载数据
         if not self.load_data():
             return None
 
-        # 2. 数据探索
-        self.explore_data()
-
-        # 3. 预处理价格数据
-        self.preprocess_price()
-
-        # 4. 预处理保修信息
-        self.preprocess_warranty()
-
-        # 5. 处理缺失值
-        self.handle_missing_values_neural()
-
-        # 6. 数据验证和修正
-        self.validate_and_correct_data()
+        for stage in stages:
+            getattr(self, STAGES[stage])()
 
-        # 7. 创建衍生特征
-        self.create_derived_features()
-
-        # 8. 构建验证模型
-        self.build_validation_model()
-
-        # 9. 检测异常值
-        self.predict_anomalies()
-
-        # 10. 生成报告
-        report = self.generate_cleaning_report()
-
-        # 11. 可视化结果
-        self.visualize_cleaning_results()
+        print("\n数据清洗流程完成!")
+        # 没有保存这一步时返回处理到当前步骤的数据
+        return self.cleaned_df if 'save' in stages else self.df
 
-        # 12. 保存清洗后的数据
-        cleaned_data = self.save_cleaned_data()
 
-        print("\n数据清洗流程完成!")
-        return cleaned_data
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='汽车数据清洗')
+    parser.add_argument('file_path', nargs='?', default='temp.csv', help='要清洗的 CSV 文件, 默认 temp.csv')
+    parser.add_argument('--stages', help=f"只运行这些步骤, 逗号分隔, 依赖的步骤会自动加上; 可选: {', '.join(STAGES)}")
+    args = parser.parse_args(argv)
+    if args.stages is not None:
+        args.stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+        try:
+            resolve_stages(args.stages)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
 
 
 # 使用示例
 if __name__ == "__main__":
+    args = parse_args()
+
     # 初始化数据清洗器
-    cleaner = CarDataCleaner('temp.csv')
+    cleaner = CarDataCleaner(args.file_path)
 
-    # 运行完整清洗流程
-    cleaned_data = cleaner.run_complete_cleaning()
+    # 运行清洗流程, 不指定 --stages 时运行全部步骤
+    cleaned_data = cleaner.run_complete_cleaning(args.stages)
 
     if cleaned_data is not None:
         print(f"\n清洗后的数据形状: {cleaned_data.shape}")
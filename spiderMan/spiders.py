@@ -1,15 +1,21 @@
 import requests
-from lxml import etree
 import csv
 import os
-import time
-import json
+import sys
 import pandas as pd
-import re
+from contextlib import nullcontext
+from functools import partial
 import django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE','车辆大屏可视化.settings')
 django.setup()
-from myApp.models import CarInfomation
+from myApp.utils.crawler import Fetcher
+from myApp.utils.crawlCheckpoint import CheckpointStore, FETCHED, PARSED, STORED
+from myApp.utils.pageCache import PageCache
+from myApp.utils.carExtractors import extractDetail
+from myApp.utils.dashboardSnapshot import rebuildDashboard
+from myApp.utils.carLoader import currentRankMonth, syncParquet, upsertCars
+from myApp.utils.dataVersion import getDataVersion
+from myApp.utils.pipeline import Pipeline, batched, dedupe
 class spider(object):
     def __init__(self):
         self.spiderUrl='https://www.dongchedi.com/motor/pc/car/rank_data?aid=1839&app_name=auto_web_pc&city_name=%E6%B5%B7%E5%8F%A3&count=10&month=&new_energy_type=&rank_data_type=11&brand_id=&price=&manufacturer=&series_type=&nation=0'
@@ -17,113 +23,227 @@ class spider(object):
             'User-Agent':'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36 Edg/140.0.0.0'
 
         }
+        self.detailUrl='https://www.dongchedi.com/auto/params-carIds-x-%s'
+        # 并发请求数、每个主机每秒的请求数、失败重试次数和首次重试前等待的秒数
+        self.workers=8
+        self.rate=5
+        self.retries=3
+        self.backoff=1
+        # 爬取进度 (排行榜偏移量和每个车系的状态)
+        self.checkpointPath='./crawlCheckpoint.sqlite3'
+        # 详情页缓存: 车型、能源类型等基本不变, ttl 内不再请求, 过期后按 ETag 重新验证; 目录为 None 时不缓存
+        self.pageCacheDir='./pageCache'
+        self.pageCacheTtl=30*24*3600
+        self.pageCacheMaxBytes=256*1024*1024
+        self.pageCache=None
+        # 入库时记录的排行榜月份 (YYYY-MM), None 为当月; 断点按月份记录, 换月后自动从头爬取
+        self.rankMonth=None
+        # 为 True 时清空本月的断点, 重新爬取整个排行榜 (已有的车系会被更新)
+        self.restart=False
+        # 爬取时每 loadBatchSize 条或每 loadInterval 秒写入一批; writeCsv 为 True 时同时追加到 csvPath
+        self.saveToDatabase=True
+        self.loadBatchSize=200
+        self.loadInterval=30
+        self.writeCsv=False
+        self.csvPath='./temp.csv'
+        self.csvWriter=None
+        # 流水线相邻阶段之间最多缓存的条数
+        self.queueSize=64
     def init(self):
-        if not os.path.exists('./temp.csv'):
-            with open('./temp.csv','a',newline='',encoding='utf-8') as wf:
+        if not os.path.exists(self.csvPath):
+            with open(self.csvPath,'a',newline='',encoding='utf-8') as wf:
                 write=csv.writer(wf)
                 write.writerow(["brand","carName","carImg","saleVolume","price","manufacturer","rank","carModel","energyType","marketTime","insure"])
 
-    def get_page(self):
-        with open("./spiderPage.txt",'r') as r_f:
-            return r_f.readlines()[-1].strip()
-
-    def set_page(self,newPage):
-        with open('./spiderPage.txt','a') as a_f:
-            a_f.write('\n'+str(newPage))
-
-    def main(self):
-        count=self.get_page()
-        params={
-            'offset':int(count)
-        }
-        print('数据从{}开始爬取'.format(int(count)+1))
-        pageJson=requests.get(self.spiderUrl,headers=self.headers,params=params).json()
-        pageJson=pageJson['data']['list']
+    def checkpoint(self):
+        # 断点文件不存在时沿用 spiderPage.txt 的进度; 要在同一个月重新爬一遍时设置 restart
+        store=CheckpointStore(self.checkpointPath,legacyPagePath='./spiderPage.txt',rankMonth=self.rankMonth or currentRankMonth())
+        if self.restart:
+            store.reset()
+        return store
+
+    def parse_car(self,car,html):
+        """排行榜中的一辆车加上详情页的信息, 返回 CSV 的一行"""
+        carData = []
+        # 品牌名
+        carData.append(car['brand_name'])
+        # 车名
+        carData.append(car['series_name'])
+        # 图片
+        carData.append(car['image'])
+        # 销量
+        carData.append(car['count'])
+        # 价格
+        price = []
+
+        price.append(car['min_price'])
+        price.append(car['max_price'])
+        carData.append(price)
+
+        # 厂商
+        carData.append(car['sub_brand_name'])
+        # 销量排名
+        carData.append(car['rank'])
+        # 第二个页面: 车型、能源类型、上市时间、保修期限
+        carData.extend(extractDetail(html))
+        return carData
+
+    def page_cache(self):
+        if self.pageCacheDir is None:
+            return nullcontext()
+        return PageCache(self.pageCacheDir,ttl=self.pageCacheTtl,maxBytes=self.pageCacheMaxBytes)
+
+    def fetch_detail(self,fetcher,seriesId):
+        url=self.detailUrl % seriesId
+        if self.pageCache is None:
+            return fetcher.get(url).text
+        return self.pageCache.fetch(fetcher,seriesId,url)
+
+    def fail(self,store,car,error):
+        # 单辆车失败 (重试后仍请求失败、详情页缺字段) 只跳过这一辆并记下原因, 下次运行时重试
+        print('爬取 %s 失败: %r' % (car.get('series_name',car['series_id']),error))
+        store.fail(car['series_id'],repr(error))
+
+    def rank_cars(self,fetcher,store):
+        """先是之前失败的车系, 然后从断点逐页读取排行榜直到空页; 已写入的车系跳过"""
+        yield from store.unfinished()
+        while True:
+            count=store.nextOffset()
+            params={
+                'offset':count
+            }
+            print('数据从{}开始爬取'.format(count+1))
+            pageJson=fetcher.get(self.spiderUrl,params=params).json()
+            pageJson=pageJson['data']['list']
+            if not pageJson:
+                print('排行榜已爬取完毕')
+                return
+            store.startPage(count,pageJson)
+            for car in pageJson:
+                if store.status(car['series_id'])[0]!=STORED:
+                    yield car
+            # 这一页已全部交给下游; 中途退出时还没写入的车系下次运行时由 unfinished 重试
+            store.finishPage(count,count+len(pageJson))
+
+    def fetch_page(self,fetcher,store,car):
+        """(车, 详情页, None); 已解析过的直接用断点里的数据 (车, None, 数据); 请求失败时返回 None"""
+        seriesId=car['series_id']
+        status,carData=store.status(seriesId)
+        if status==PARSED:
+            return car,None,carData
         try:
-            for index, car in enumerate(pageJson):
-                carData = []
-                print("正在爬取第%d" % (index + 1) + '数据')
-                # 品牌名
-                carData.append(car['brand_name'])
-                # 车名
-                carData.append(car['series_name'])
-                # 图片
-                carData.append(car['image'])
-                # 销量
-                carData.append(car['count'])
-                # 价格
-                price = []
-
-                price.append(car['min_price'])
-                price.append(car['max_price'])
-                carData.append(price)
-
-                # 厂商
-                carData.append(car['sub_brand_name'])
-                # 销量排名
-                carData.append(car['rank'])
-                # 第二个页面
-                carNumber = car['series_id']
-
-                infoHTML = requests.get('https://www.dongchedi.com/auto/params-carIds-x-%s' % carNumber,
-                                        headers=self.headers)
-                infoHTMLpath = etree.HTML(infoHTML.text)
-
-                # 车型
-                carModel = infoHTMLpath.xpath('//div[@data-row-anchor="jb"]/div[2]/div/text()')[0]
-                carData.append(carModel)
-
-                # 能源类型
-                energyType = infoHTMLpath.xpath('//div[@data-row-anchor="fuel_form"]/div[2]/div/text()')[0]
-                carData.append(energyType)
-                # 上市时间
-                marketTime = infoHTMLpath.xpath('//div[@data-row-anchor="market_time"]/div[2]/div/text()')[0]
-                carData.append(marketTime)
-                # 保修期限
-                insure = infoHTMLpath.xpath('//div[@data-row-anchor="period"]/div[2]/div/text()')[0]
-                carData.append(insure)
-                print(carData)
-                self.save_to_csv(carData)
-        except:
-            pass
-
-        self.set_page(int(count)+10)
-        self.main()
-
+            infoHTML=self.fetch_detail(fetcher,seriesId)
+        except requests.RequestException as e:
+            self.fail(store,car,e)
+            return None
+        store.mark(seriesId,FETCHED)
+        return car,infoHTML,None
+
+    def fetch_cars(self,fetcher,store,cars):
+        # 详情页在线程池中并发请求, 按排行顺序交给下游
+        for result in fetcher.imap(lambda car:self.fetch_page(fetcher,store,car),cars):
+            if result is not None:
+                yield result
+
+    def parse_cars(self,store,pages):
+        for car,infoHTML,carData in pages:
+            if carData is None:
+                try:
+                    carData=self.parse_car(car,infoHTML)
+                except (KeyError,IndexError,ValueError) as e:
+                    self.fail(store,car,e)
+                    continue
+                store.mark(car['series_id'],PARSED,carData)
+            yield car['series_id'],carData
+
+    def complete_cars(self,store,cars):
+        # 缺字段或没有车名 (入库的键) 的行不入库, 下次运行时重试; 图片链接等为空不影响
+        for seriesId,carData in cars:
+            if len(carData)!=11 or any(value is None for value in carData) or not str(carData[1]).strip():
+                print('数据不完整, 跳过: %s' % carData)
+                store.fail(seriesId,'数据不完整')
+                continue
+            yield seriesId,carData
+
+    def validate_cars(self,store,cars):
+        # 车名是入库的键, 重复的车名只写入第一行, 其余的视为已写入
+        return dedupe(self.complete_cars(store,cars),key=lambda item:item[1][1],skipped=lambda item:store.mark(item[0],STORED))
+
+    def store_cars(self,store,batches):
+        """每批写入数据库 (和 CSV) 后标记为已写入; 大屏在 finish_load 中重建"""
+        for batch in batches:
+            if self.saveToDatabase:
+                result=upsertCars([carData for _,carData in batch],rankMonth=self.rankMonth,syncAnalytics=False)
+                print(result)
+                self.loads+=1
+                self.updatedRows+=result.updated
+            for seriesId,carData in batch:
+                if self.writeCsv:
+                    self.save_to_csv(carData)
+                store.mark(seriesId,STORED)
+                yield seriesId
+
+    def finish_load(self):
+        # 整个爬取只同步一次 Parquet (只有新增时追加一个分片), 同步之后再重建一次大屏, 使用 DuckDB 时不会读到旧的导出;
+        # 中途出错时已写入的数据同样生效
+        if self.loads:
+            syncParquet(self.loadedFrom,self.loads,self.updatedRows)
+            rebuildDashboard()
+
+    def csv_sink(self):
+        if not self.writeCsv:
+            return nullcontext()
+        self.init()
+        return open(self.csvPath,'a',newline='',encoding='utf-8')
 
+    def main(self):
+        # 排行榜 -> 详情页 -> 解析 -> 校验去重 -> 分批 -> 入库, 各阶段在自己的线程中运行, 由有界队列连接:
+        # 下游慢时上游等待, 内存占用与爬取的总量无关; 进度记在断点中, 先重试之前失败的车系
+        with self.checkpoint() as store, self.page_cache() as self.pageCache, self.csv_sink() as csvFile, Fetcher(self.headers,workers=self.workers,rate=self.rate,retries=self.retries,backoff=self.backoff) as fetcher:
+            self.csvWriter=None if csvFile is None else csv.writer(csvFile)
+            pipeline=Pipeline(queueSize=self.queueSize)
+            pipeline.add('rank',lambda _:self.rank_cars(fetcher,store))
+            pipeline.add('fetch',partial(self.fetch_cars,fetcher,store))
+            pipeline.add('parse',partial(self.parse_cars,store))
+            pipeline.add('validate',partial(self.validate_cars,store))
+            pipeline.add('batch',lambda cars:batched(cars,self.loadBatchSize,self.loadInterval))
+            pipeline.add('store',partial(self.store_cars,store))
+            self.loadedFrom=getDataVersion() if self.saveToDatabase else None
+            self.loads=self.updatedRows=0
+            try:
+                pipeline.run()
+            finally:
+                self.finish_load()
+                # 各阶段的处理条数和速度; 等待下游的时间长说明瓶颈在下游
+                for stats in pipeline.stats:
+                    print(stats)
+            print('各状态的车系数量: %s' % store.counts())
+            if self.pageCache is not None:
+                print('详情页缓存: %s' % self.pageCache.stats)
 
     def save_to_csv(self,resultData):
-        with open('./temp.csv','a',newline='',encoding='utf-8')as f:
-            writer=csv.writer(f)
-            writer.writerow(resultData)
+        # 爬取期间 CSV 文件一直打开, 不再每行重新打开
+        self.csvWriter.writerow(resultData)
 
     def clear_csv(self):
-        df=pd.read_csv('./temp.csv')
+        df=pd.read_csv(self.csvPath)
         df.dropna(inplace=True)
         df.drop_duplicates(inplace=True)
         print('总数量为:%d'%df.shape[0])
         return df.values
 
     def save_to_sql(self):
+        # 按 (车名, 排行月份) 批量 upsert, 重复运行不会产生重复数据
         data=self.clear_csv()
-        for car in data:
-            CarInfomation.objects.create(
-                brand =car[0],
-                carName=car[1],
-                carImg=car[2],
-                saleVolume=car[3],
-                price=car[4],
-                manufacturer=car[5],
-                rank=car[6],
-                carModel=car[7],
-                energyType=car[8],
-                marketTime=car[9],
-                insure=car[10],
-            )
+        print(upsertCars(data,rankMonth=self.rankMonth))
+        rebuildDashboard()
 
 
 if __name__=='__main__':
     spiderObj=spider()
-    # spiderObj.init()
-    # spiderObj.main()
-    spiderObj.save_to_sql()
\ No newline at end of file
+    if sys.argv[1:]==['crawl']:
+        # python spiders.py crawl: 爬取并边爬边入库; 需要 temp.csv 时设置 spiderObj.writeCsv=True
+        spiderObj.main()
+    else:
+        # 把已有的 temp.csv 写入数据库
+        spiderObj.save_to_sql()
\ No newline at end of file
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "车辆大屏可视化.settings")
+# Serve the myApp dashboard panels with the async views (myApp/asyncViews.py).
+os.environ.setdefault("DASHBOARD_ASYNC_VIEWS", "1")
 
 application = get_asgi_application()
@@ -2,6 +2,7 @@
 Django settings for 车辆大屏可视化 project.
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -36,6 +37,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",  # 这个要放在最前面
+    "myApp.middleware.MetricsMiddleware",  # 请求耗时 / SQL 统计, 见 /metrics
+    "myApp.middleware.ProfilingMiddleware",  # 按需剖析单个请求, 默认关闭
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -103,10 +106,82 @@ DATABASES = {
         "PORT":'3306',
         'OPTIONS': {
             'charset': 'utf8mb4',
-        }
+        },
+        # 复用连接, 每次请求开始时先检查连接是否可用; ASGI 下各请求的线程不固定, 不保留连接
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", "0" if os.environ.get("DASHBOARD_ASYNC_VIEWS") == "1" else "60")),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# 配置了从库地址时, 大屏的读请求走从库 (见 myApp/routers.py), 入库等写操作仍走主库
+if os.environ.get("DB_REPLICA_HOST"):
+    DATABASES["replica"] = dict(
+        DATABASES["default"],
+        HOST=os.environ["DB_REPLICA_HOST"],
+        PORT=os.environ.get("DB_REPLICA_PORT", "3306"),
+    )
+
+# DB_LOCAL_INFILE=1 时允许 LOAD DATA LOCAL INFILE, 爬虫入库改走这条更快的路径 (MySQL 服务端也要开启 local_infile)
+if os.environ.get("DB_LOCAL_INFILE") == "1":
+    DATABASES["default"]["OPTIONS"]["local_infile"] = True
+
+DATABASE_ROUTERS = ["myApp.routers.DashboardRouter"]
+# 读库的别名; 不在 DATABASES 中时全部读主库
+DASHBOARD_READ_DATABASE = "replica"
+# 从库落后超过该秒数或连不上时退回主库; 每隔 DASHBOARD_REPLICA_CHECK_INTERVAL 秒检查一次
+DASHBOARD_REPLICA_MAX_LAG = 5
+DASHBOARD_REPLICA_CHECK_INTERVAL = 1
+
+# 缓存: 默认使用进程内 locmem; 多进程部署可换成 FileBasedCache 或 Redis 等共享后端
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "car-dashboard",
+    },
+    # "default": {
+    #     "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+    #     "LOCATION": BASE_DIR / "cache",
+    # },
+}
+
+# myApp 视图响应缓存使用的缓存别名和过期时间(秒); 键中带数据版本, 入库或后台修改后自动失效
+DASHBOARD_CACHE_ALIAS = "default"
+DASHBOARD_CACHE_TIMEOUT = 600
+
+# myApp 响应超过该字节数时按 Accept-Encoding 做 gzip / brotli 压缩
+DASHBOARD_COMPRESS_MIN_SIZE = 1024
+
+# /myApp/dashboard/stream/ 推送通道: 检查数据版本的间隔、心跳间隔和单个连接的最长时间(秒)
+DASHBOARD_PUSH_INTERVAL = 5
+DASHBOARD_STREAM_HEARTBEAT = 15
+DASHBOARD_STREAM_MAX_AGE = 600
+# 推送通道默认只在 ASGI 下开启 (asgi.py 会设置 DASHBOARD_ASYNC_VIEWS): WSGI / runserver 下每个连接会一直占住一个工作线程;
+# 关闭时前端每 DASHBOARD_POLL_INTERVAL 秒查询一次数据版本, 有变化时再取面板数据
+DASHBOARD_STREAM_ENABLED = os.environ.get("DASHBOARD_STREAM_ENABLED", os.environ.get("DASHBOARD_ASYNC_VIEWS", "0")) == "1"
+DASHBOARD_POLL_INTERVAL = 30
+
+# 为真时 myApp 的面板路由使用 asyncViews 中的异步视图; asgi.py 会默认打开
+DASHBOARD_ASYNC_VIEWS = os.environ.get("DASHBOARD_ASYNC_VIEWS") == "1"
+
+# /metrics 只允许这些地址访问 (Prometheus 所在机器); 设为 None 时不限制
+DASHBOARD_METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+
+# 打开后, 带 X-Profile 头或 ?_profile= 参数的请求会用 cProfile 剖析, 结果写入 DASHBOARD_PROFILE_DIR;
+# 设置了 DASHBOARD_PROFILE_TOKEN 时头 / 参数的值必须与之相同
+DASHBOARD_PROFILING = os.environ.get("DASHBOARD_PROFILING") == "1"
+DASHBOARD_PROFILE_TOKEN = os.environ.get("DASHBOARD_PROFILE_TOKEN")
+DASHBOARD_PROFILE_DIR = BASE_DIR / "profiles"
+
+# 面板统计的计算方式: "orm" 用数据库计数器和进程内快照; "duckdb" 把车辆数据导出为 Parquet 后由 DuckDB 计算,
+# 需要 pip install duckdb; 导出文件放在 DASHBOARD_ANALYTICS_DIR
+DASHBOARD_ANALYTICS_BACKEND = os.environ.get("DASHBOARD_ANALYTICS_BACKEND", "orm")
+DASHBOARD_ANALYTICS_DIR = BASE_DIR / "analytics"
+
+# 爬虫数据入库 (myApp/utils/carLoader.py) 每批写入的行数, 整个入库在一个事务内
+CAR_LOADER_BATCH_SIZE = 2000
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -0,0 +1,15 @@
+"""
+基准测试用的配置: 与 settings.py 相同, 只是数据库换成独立的 SQLite 文件, 不会动到 MySQL 里的数据
+
+python manage.py benchmark --settings=车辆大屏可视化.settings_bench
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ.get("BENCH_DB", str(BASE_DIR / "bench.sqlite3")),
+    }
+}
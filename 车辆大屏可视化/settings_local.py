@@ -0,0 +1,26 @@
+"""
+本地开发 / 测试用的配置: 主库和从库是两个 SQLite 文件, 不需要 MySQL
+
+python manage.py migrate --settings=车辆大屏可视化.settings_local
+python manage.py migrate --database replica --settings=车辆大屏可视化.settings_local
+python manage.py test myApp --settings=车辆大屏可视化.settings_local
+
+SQLite 之间没有复制, 可以把 local.sqlite3 复制为 local_replica.sqlite3 模拟同步;
+两者数据版本不一致超过 DASHBOARD_REPLICA_MAX_LAG 秒时读请求会自动退回主库。
+"""
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "local.sqlite3",
+        "CONN_MAX_AGE": 60,
+        "CONN_HEALTH_CHECKS": True,
+    },
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "local_replica.sqlite3",
+        "CONN_MAX_AGE": 60,
+        "CONN_HEALTH_CHECKS": True,
+    },
+}
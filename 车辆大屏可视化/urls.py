@@ -16,9 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path,include
+from myApp import views
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("myApp/",include('myApp.urls'))
+    path("myApp/",include('myApp.urls')),
+    path("metrics",views.metrics,name='metrics'),
 
 ]